@@ -0,0 +1,94 @@
+# coding: utf-8
+"""离线静态资源：echarts 与地图脚本只下载一次，按内容哈希存放
+
+pyecharts 默认让每个 html 在打开时去 assets.pyecharts.org 取 echarts 和地图脚本，
+该地址经常无法访问。vendor_assets 把所需脚本（从网络或本地的 pyecharts-assets
+目录）复制到 assets/ 下，文件名取内容哈希，并记录在 manifest.json 中；
+install 让 pyecharts 按哈希文件名生成引用，所有页面共用这一份脚本，离线即可打开；
+它返回的 restore 把 pyecharts 的文件名表恢复原样。
+"""
+
+import os
+import json
+import hashlib
+
+from render import ONLINE_HOST
+
+ASSET_DIR = 'assets'
+MANIFEST = 'manifest.json'
+DEPENDENCIES = ('echarts', 'china', 'world')
+
+
+def _read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_source(source, filename):
+    """从 URL 前缀或本地目录读取原始脚本"""
+    if source.startswith(('http://', 'https://')):
+        from fetch import TIMEOUT, get_session
+
+        response = get_session().get(source + filename, timeout=TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    with open(os.path.join(source, filename), 'rb') as f:
+        return f.read()
+
+
+def vendor_assets(deps=DEPENDENCIES, root=ASSET_DIR, source=ONLINE_HOST):
+    """确保 deps 对应的脚本已存放在 root 下，返回 {依赖名: 哈希文件名}
+
+    已在 manifest 中且文件存在的依赖不会重新下载。
+    """
+    from pyecharts.datasets import FILENAMES
+
+    os.makedirs(root, exist_ok=True)
+    manifest = _read_manifest(root)
+    for dep in deps:
+        entry = manifest.get(dep)
+        if entry and os.path.exists(os.path.join(root, entry['file'])):
+            continue
+        name, ext = FILENAMES[dep]
+        body = _read_source(source, '{}.{}'.format(name, ext))
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        filename = '{}.{}'.format(digest, ext)
+        path = os.path.join(root, filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(body)
+        manifest[dep] = {'file': filename, 'size': len(body), 'source': name}
+    with open(os.path.join(root, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return {dep: entry['file'] for dep, entry in manifest.items()}
+
+
+def install(root=ASSET_DIR):
+    """让 pyecharts 按 manifest 中的哈希文件名引用依赖，返回恢复原文件名的 restore()"""
+    from pyecharts.datasets import FILENAMES
+
+    manifest = _read_manifest(root)
+    if not manifest:
+        raise FileNotFoundError('{} 下没有离线资源，请先运行 vendor_assets'.format(root))
+    saved = {dep: FILENAMES[dep] for dep in manifest if dep in FILENAMES}
+
+    def restore():
+        for dep in manifest:
+            if dep in saved:
+                FILENAMES[dep] = saved[dep]
+            else:
+                FILENAMES.pop(dep, None)
+
+    for dep, entry in manifest.items():
+        name, ext = os.path.splitext(entry['file'])
+        FILENAMES[dep] = [name, ext[1:]]
+    return restore
+
+
+def js_host_for(path, root=ASSET_DIR):
+    """输出文件 path 引用 root 下资源时使用的相对地址"""
+    relative = os.path.relpath(os.path.abspath(root), os.path.dirname(os.path.abspath(path)))
+    return relative.replace(os.sep, '/') + '/'
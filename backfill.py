@@ -0,0 +1,307 @@
+# coding: utf-8
+"""批量回填：把目录中归档的原始接口数据并行写入快照库
+
+每个文件是一次 getOnsInfo 响应（响应体原文，或已解出的 data；可为 .gz）。
+文件分发到进程池，每个工作进程解析 JSON、按列提取、计算比率后直接写入
+SnapshotStore（disease_h5、disease_foreign 由 stream.py 边读边提取，不解析整棵对象树）。
+快照按类别、时间各自成文件（同一 lastUpdateTime 已存在时跳过），
+多个进程写同一个库不会冲突。
+
+第一轮之后，每份海外快照与不晚于它的最近一份国内快照配对，第二轮仍在进程池中
+拼出 world / world_enriched。吞吐量随 CPU 核数增长，结果汇总为 BackfillReport。
+
+除 disease_h5、disease_foreign 以外的 getOnsInfo 类 feed 用 register_feed
+注册提取函数；未注册的 feed 按通用规则提取：data 中每个由 dict 组成的列表
+各写成一类快照 <feed>.<字段名>。feed 名按内容识别，识别不了时取文件名中
+第一个 '-' 或 '.' 之前的部分（如 disease_other-20200301T100000.json）。
+注册表在启动进程池时显式传给每个工作进程，不依赖 fork 复制父进程的模块状态，
+因此注册的函数必须能被 pickle（模块级函数，不能是 lambda）。
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import bisect
+from itertools import chain
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+PATTERNS = ('*.json', '*.json.gz')
+# pyarrow 写不出的列（如混合类型的嵌套列）抛出 ArrowInvalid、ArrowTypeError、
+# ArrowNotImplementedError，分别是 ValueError、TypeError、NotImplementedError 的子类
+FILE_ERRORS = (OSError, ValueError, KeyError, TypeError, NotImplementedError)
+
+FileResult = namedtuple('FileResult', [
+    'path',
+    'feed',
+    'last_update_time',  # 字符串，与接口中的格式一致
+    'rows',  # 提取的行数（各类别合计，快照已存在时也计入）
+    'china_total',  # disease_h5：中国整体的 confirm/heal/dead，其余为 None
+    'error',
+])
+BackfillReport = namedtuple('BackfillReport', [
+    'files',  # 找到的归档文件数
+    'rows',  # 提取的行数（含 world）
+    'worlds',  # 拼出的 world 快照数
+    'seconds',
+    'errors',  # [(路径, 错误)]，出错的文件被跳过；拼 world 出错时为海外快照的文件路径
+    'processes',
+])
+
+_feeds = {}  # feed 名称 -> (识别函数, 提取函数)
+_streams = {}  # feed 名称 -> 流式提取函数
+
+
+def register_feed(name, extract, detect=None, stream=None):
+    """注册一个 feed：extract(data) 返回 {类别: DataFrame}，detect(data) 判断数据是否属于它
+
+    stream(records) 由逐条读出的记录（stream.RECORD_PATHS 中该 feed 的数组元素）
+    返回同样的 {类别: DataFrame}；给出时归档文件边读边提取，不解析整棵对象树。
+    三个函数都要能被 pickle，之后启动的 backfill 进程池会把它们传给工作进程。
+    """
+    _feeds[name] = (detect, extract)
+    if stream is None:
+        _streams.pop(name, None)
+    else:
+        _streams[name] = stream
+
+
+def _init_worker(feeds, streams):
+    """工作进程使用父进程的注册表（spawn 启动时模块是重新导入的）"""
+    _feeds.clear()
+    _feeds.update(feeds)
+    _streams.clear()
+    _streams.update(streams)
+
+
+def _is_domestic(data):
+    return 'areaTree' in data
+
+
+def _is_foreign(data):
+    return 'foreignList' in data
+
+
+def _extract_domestic(data):
+    return _stream_domestic(data['areaTree'][0]['children'])
+
+
+def _stream_domestic(records):
+    from extract import extract_domestic
+    from rates import rate_metrics
+
+    provinces, cities = extract_domestic(records)
+    china = provinces.to_frame('province')
+    return {'china': china, 'cities': cities.to_frame('city', 'province'),
+            'china_enriched': rate_metrics(china)}
+
+
+def _extract_foreign(data):
+    return _stream_foreign(data['foreignList'])
+
+
+def _stream_foreign(records):
+    from extract import extract_countries
+
+    return {'foreign': extract_countries(records).to_frame('country', 'continent')}
+
+
+register_feed('disease_h5', _extract_domestic, _is_domestic, _stream_domestic)
+register_feed('disease_foreign', _extract_foreign, _is_foreign, _stream_foreign)
+
+
+def extract_generic(name, data):
+    """data 中每个由 dict 组成的列表写成一类快照 <name>.<字段名>"""
+    import pandas as pd
+
+    frames = {}
+    for key, value in data.items():
+        if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+            frames['{}.{}'.format(name, key)] = pd.DataFrame.from_records(value)
+    return frames
+
+
+def extract(name, data):
+    """按 feed 提取各类快照：{类别: DataFrame}"""
+    if name in _feeds:
+        return _feeds[name][1](data)
+    return extract_generic(name, data)
+
+
+def detect_feed(data, path=''):
+    for name, (detect, _) in _feeds.items():
+        if detect is not None and detect(data):
+            return name
+    return re.split(r'[-.]', os.path.basename(path), 1)[0]
+
+
+def read_payload(path):
+    """读取一个归档文件，返回 data；响应体原文中的 data 字符串会被再解析一次"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        payload = json.loads(f.read())
+    if 'data' in payload and 'lastUpdateTime' not in payload:
+        from fetch import parse_payload
+
+        return parse_payload(payload)
+    return payload
+
+
+def _china_total(total):
+    return {key: total[key] for key in ('confirm', 'heal', 'dead')}
+
+
+def read_stream(path):
+    """边读边提取注册了流式提取函数的文件，返回 (feed, lastUpdateTime, 快照, 中国整体)
+
+    读到的第一条记录决定 feed；文件中没有 stream.RECORD_PATHS 中的数组，
+    或该 feed 没有流式提取函数时返回 None，由调用方整体解析。
+    """
+    from stream import CHINA_TOTAL, LAST_UPDATE_TIME, iter_feed_records, iter_file_chunks
+
+    captured = dict.fromkeys([LAST_UPDATE_TIME, CHINA_TOTAL])
+    records = iter_feed_records(iter_file_chunks(path), captured)
+    first = next(records, None)
+    if first is None or first[0] not in _streams:
+        records.close()
+        return None
+    feed = first[0]
+    frames = _streams[feed](record for _, record in chain([first], records))
+    if captured[LAST_UPDATE_TIME] is None:
+        raise KeyError('lastUpdateTime')
+    china_total = None
+    if feed == 'disease_h5':
+        if captured[CHINA_TOTAL] is None:
+            raise KeyError('total')
+        china_total = _china_total(captured[CHINA_TOTAL])
+    return feed, captured[LAST_UPDATE_TIME], frames, china_total
+
+
+def ingest_file(path, store_root, fmt='feather'):
+    """解析、提取一个文件并写入快照库（在工作进程中运行）"""
+    from store import SnapshotStore
+
+    try:
+        streamed = read_stream(path)
+        if streamed is not None:
+            feed, last_update_time, frames, china_total = streamed
+        else:
+            data = read_payload(path)
+            feed = detect_feed(data, path)
+            last_update_time = data['lastUpdateTime']
+            frames = extract(feed, data)
+            china_total = None
+            if feed == 'disease_h5':
+                china_total = _china_total(data['areaTree'][0]['total'])
+        store = SnapshotStore(store_root, fmt)
+        for kind, frame in frames.items():
+            store.write(kind, frame, last_update_time)
+        return FileResult(path, feed, last_update_time,
+                          sum(len(frame) for frame in frames.values()), china_total, None)
+    except FILE_ERRORS as exc:
+        return FileResult(path, None, None, 0, None, '{}: {}'.format(type(exc).__name__, exc))
+
+
+def ingest_world(foreign_time, china_total, store_root, fmt='feather'):
+    """由一份海外快照与中国整体数据拼出 world 与 world_enriched（在工作进程中运行）
+
+    返回 FileResult（path 为 None，feed 为 'world'），出错时 error 为错误信息。
+    """
+    from countries import load_country_index
+    from extract import extract_world
+    from rates import rate_metrics
+    from store import SnapshotStore
+
+    try:
+        store = SnapshotStore(store_root, fmt)
+        foreign = store.read('foreign', foreign_time)
+        if foreign is None:
+            raise KeyError('没有 {} 的 foreign 快照'.format(foreign_time))
+        foreign = foreign.rename(columns={'country': 'name'})
+        world = extract_world(foreign.to_dict('records'), [{'total': china_total}])
+        world = world.to_frame('country', 'continent')
+        store.write('world', world, foreign_time)
+        enriched, _ = load_country_index().translate(rate_metrics(world), column='country',
+                                                     target='英文')
+        store.write('world_enriched', enriched, foreign_time)
+        return FileResult(None, 'world', foreign_time, len(world), None, None)
+    except FILE_ERRORS as exc:
+        return FileResult(None, 'world', foreign_time, 0, None,
+                          '{}: {}'.format(type(exc).__name__, exc))
+
+
+def find_files(directory, patterns=PATTERNS):
+    """目录（含子目录）下的全部归档文件，按路径排序"""
+    import fnmatch
+
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names
+                     if any(fnmatch.fnmatch(name, pattern) for pattern in patterns))
+    return sorted(paths)
+
+
+def _pair_world(results):
+    """每份海外快照配对不晚于它的最近一份国内快照，返回 [(海外时间, 中国整体)]"""
+    from store import _parse_time
+
+    domestic = sorted(((_parse_time(r.last_update_time), r.china_total)
+                       for r in results if r.china_total is not None), key=lambda d: d[0])
+    stamps = [stamp for stamp, _ in domestic]
+    pairs = {}
+    for r in results:
+        if r.feed != 'disease_foreign':
+            continue
+        i = bisect.bisect_right(stamps, _parse_time(r.last_update_time)) - 1
+        if i >= 0:
+            pairs[r.last_update_time] = domestic[i][1]
+    return sorted(pairs.items())
+
+
+def _chunksize(n, processes):
+    return max(1, min(64, n // (processes * 4)))
+
+
+def backfill(directory, store_root='snapshots', processes=None, fmt='feather', world=True,
+             progress=None):
+    """并行回填 directory 下的全部归档文件，返回 BackfillReport
+
+    processes=1 时在当前进程内依次处理；progress(完成数, 总数) 在每个文件完成后调用。
+    """
+    start = time.perf_counter()
+    paths = find_files(directory)
+    processes = processes or os.cpu_count() or 1
+    results = []
+    worlds = []
+    rows = 0
+    pool = None
+    if processes > 1:
+        pool = ProcessPoolExecutor(processes, initializer=_init_worker,
+                                   initargs=(dict(_feeds), dict(_streams)))
+    try:
+        run = pool.map if pool is not None else map
+        options = {'chunksize': _chunksize(len(paths), processes)} if pool is not None else {}
+        for result in run(ingest_file, paths, [store_root] * len(paths), [fmt] * len(paths),
+                          **options):
+            results.append(result)
+            rows += result.rows
+            if progress is not None:
+                progress(len(results), len(paths))
+        pairs = _pair_world(results) if world else []
+        if pairs:
+            foreign_times, totals = zip(*pairs)
+            n = len(pairs)
+            options = {'chunksize': _chunksize(n, processes)} if pool is not None else {}
+            worlds = list(run(ingest_world, foreign_times, totals, [store_root] * n, [fmt] * n,
+                              **options))
+            rows += sum(w.rows for w in worlds)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    errors = [(r.path, r.error) for r in results if r.error]
+    foreign_paths = {r.last_update_time: r.path for r in results if r.feed == 'disease_foreign'}
+    errors.extend((foreign_paths[w.last_update_time], w.error) for w in worlds if w.error)
+    return BackfillReport(len(paths), rows, sum(not w.error for w in worlds),
+                          time.perf_counter() - start, errors, processes)
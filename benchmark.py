@@ -0,0 +1,1019 @@
+# coding: utf-8
+"""性能基准
+
+在本地桩服务器上模拟 getOnsInfo 接口，对比各阶段新旧实现的耗时。
+结果同时写入 bench_results/<提交>.json，可以与其他提交的结果对比：
+
+    python benchmark.py                        运行全部基准
+    python benchmark.py stages --scale 10      只运行逐阶段基准，数据放大 10 倍
+    python benchmark.py --compare a.json b.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+import requests
+import numpy as np
+import pandas as pd
+
+from tests.stubs import StubServer, make_domestic, make_oversea, wrap_payload
+
+
+def timeit(func, repeat=5):
+    """返回多次运行中的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+RESULTS = {}  # {标题: {名称: 数值}}，耗时为毫秒，体积、内存的单位写在名称里
+
+
+def record(title, name, value):
+    RESULTS.setdefault(title, {})[name] = round(value, 4)
+
+
+def report(title, rows):
+    print(title)
+    for name, seconds in rows:
+        print('  {:<28}{:>10.2f} ms'.format(name, seconds * 1000))
+        record(title, name, seconds * 1000)
+    print()
+
+
+# ## 各阶段基准
+
+def bench_fetch(latency=0.2):
+    """串行 requests.get 与并发 fetch_all 的墙钟时间对比"""
+    from fetch import fetch_all, fetch_results
+    from cache import ResponseCache
+
+    payloads = {
+        'disease_h5': wrap_payload(make_domestic()),
+        'disease_foreign': wrap_payload(make_oversea()),
+    }
+    names = list(payloads)
+    with StubServer(payloads, latency=latency, etag=True) as stub:
+        def serial():
+            for name in names:
+                response = requests.get(url=stub.base_url.format(name)).json()
+                json.loads(response['data'])
+
+        def concurrent():
+            fetch_all(names, base_url=stub.base_url)
+
+        with tempfile.TemporaryDirectory() as root:
+            cache = ResponseCache(root)
+            fetch_results(names, base_url=stub.base_url, cache=cache)
+
+            def cached():
+                fetch_results(names, base_url=stub.base_url, cache=cache)
+
+            report('fetch ({} feeds, {:.0f} ms latency)'.format(len(names), latency * 1000), [
+                ('serial requests.get', timeit(serial)),
+                ('fetch_all', timeit(concurrent)),
+                ('fetch_results + cache (304)', timeit(cached)),
+            ])
+
+
+def loop_extract_provinces(area_tree):
+    """demo.py 原来的逐行 dict 提取方式，作为对照"""
+    china_data = area_tree[0]['children']
+    china_list = []
+    for a in range(len(china_data)):
+        confirm = china_data[a]['total']['confirm']
+        heal = china_data[a]['total']['heal']
+        dead = china_data[a]['total']['dead']
+        china_list.append({
+            'province': china_data[a]['name'],
+            'nowConfirm': confirm - heal - dead,
+            'confirm': confirm,
+            'heal': heal,
+            'dead': dead,
+        })
+    return pd.DataFrame(china_list)
+
+
+def loop_extract_countries(foreign_list):
+    foreign = []
+    for a in range(len(foreign_list)):
+        foreign.append({
+            'country': foreign_list[a]['name'],
+            'nowConfirm': foreign_list[a]['nowConfirm'],
+            'confirm': foreign_list[a]['confirm'],
+            'dead': foreign_list[a]['dead'],
+            'heal': foreign_list[a]['heal'],
+        })
+    return pd.DataFrame(foreign)
+
+
+def domestic_frames(area_tree):
+    """extract_domestic 的表格形式：(省级, 市级)"""
+    from extract import extract_domestic
+
+    provinces, cities = extract_domestic(area_tree[0]['children'])
+    return provinces.to_frame('province'), cities.to_frame('city', 'province')
+
+
+def country_frame(foreign_list):
+    """extract_countries 的表格形式：continent, country, nowConfirm, confirm, heal, dead"""
+    from extract import extract_countries
+
+    return extract_countries(foreign_list).to_frame('country', 'continent')
+
+
+def bench_extract(scale=100):
+    """逐行 dict 循环与 extract_* 的对比，数据量为当前的 scale 倍"""
+    area_tree = make_domestic(n_provinces=34 * scale, n_cities=0)['areaTree']
+    foreign_list = make_oversea(n_countries=200 * scale)['foreignList']
+    report('extract ({}x: {} provinces, {} countries)'.format(
+        scale, 34 * scale, 200 * scale), [
+        ('loop provinces', timeit(lambda: loop_extract_provinces(area_tree))),
+        ('extract_domestic provinces', timeit(lambda: domestic_frames(area_tree)[0])),
+        ('loop countries', timeit(lambda: loop_extract_countries(foreign_list))),
+        ('extract_countries', timeit(lambda: country_frame(foreign_list))),
+    ])
+    rows = []
+    for n_provinces in (34, 340):
+        tree = make_domestic(n_provinces=n_provinces, n_cities=100)['areaTree']
+        rows.append(('extract_domestic {} cities'.format(n_provinces * 100),
+                     timeit(lambda: domestic_frames(tree))))
+    report('extract_domestic scaling', rows)
+
+
+def loop_rates(frame):
+    """demo.py 原来的逐元素赋值，作为对照（写入副本列，新版 pandas 下链式赋值不再生效）"""
+    frame = frame.copy()
+    frame['deadRate'] = [0.0 for _ in range(len(frame))]
+    frame['healRate'] = [0.0 for _ in range(len(frame))]
+    dead_rate, heal_rate = frame['deadRate'].copy(), frame['healRate'].copy()
+    for i in range(len(frame)):
+        dead_rate[i] = frame['dead'][i] / frame['confirm'][i]
+        heal_rate[i] = frame['heal'][i] / frame['confirm'][i]
+    frame['deadRate'], frame['healRate'] = dead_rate, heal_rate
+    return frame
+
+
+def bench_rates():
+    """逐元素循环与 rate_metrics 的对比"""
+    from rates import rate_metrics
+
+    provinces = domestic_frames(make_domestic()['areaTree'])[0]
+    countries = country_frame(make_oversea()['foreignList'])
+    report('rates ({} provinces, {} countries)'.format(len(provinces), len(countries)), [
+        ('loop provinces', timeit(lambda: loop_rates(provinces))),
+        ('rate_metrics provinces', timeit(lambda: rate_metrics(provinces))),
+        ('loop countries', timeit(lambda: loop_rates(countries))),
+        ('rate_metrics countries', timeit(lambda: rate_metrics(countries))),
+    ])
+
+
+def bench_store(scale=10):
+    """Excel 与 Feather/Parquet 快照的读写对比"""
+    from store import SnapshotStore
+
+    frame = country_frame(make_oversea(n_countries=200 * scale)['foreignList'])
+    stamp = '2020-11-25 10:00:00'
+    rows = []
+    with tempfile.TemporaryDirectory() as root:
+        xlsx = os.path.join(root, 'foreign.xlsx')
+        rows.append(('to_excel', timeit(lambda: frame.to_excel(xlsx, index=False), repeat=1)))
+        rows.append(('read_excel', timeit(lambda: pd.read_excel(xlsx), repeat=1)))
+        sizes = [('xlsx', os.path.getsize(xlsx))]
+        for fmt in ('feather', 'parquet'):
+            store = SnapshotStore(os.path.join(root, fmt), fmt=fmt)
+            rows.append(('write ' + fmt, timeit(
+                lambda: store.write('foreign', frame, stamp, overwrite=True))))
+            rows.append(('read ' + fmt, timeit(lambda: store.read('foreign', stamp))))
+            rows.append(('read {} [confirm]'.format(fmt), timeit(
+                lambda: store.read('foreign', stamp, columns=['confirm']))))
+            sizes.append((fmt, os.path.getsize(store.path('foreign', stamp))))
+    report('store ({} rows)'.format(len(frame)), rows)
+    print('  ' + ', '.join('{}: {:.0f} KB'.format(name, size / 1024) for name, size in sizes))
+    print()
+    for name, size in sizes:
+        record('store ({} rows)'.format(len(frame)), '{} KB'.format(name), size / 1024)
+
+
+def peak_memory(func):
+    """返回 (结果, tracemalloc 统计的峰值内存字节数)"""
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(scale=20):
+    """整体解析与流式解析的峰值内存和耗时对比"""
+    from fetch import get_session
+    from extract import extract_countries, extract_domestic
+    from stream import iter_records
+
+    payloads = {
+        'disease_h5': wrap_payload(make_domestic(n_provinces=34 * scale, n_cities=30)),
+        'disease_foreign': wrap_payload(make_oversea(n_countries=200 * scale)),
+    }
+    session = get_session()
+    with StubServer(payloads) as stub:
+        def full(name):
+            response = session.get(url=stub.base_url.format(name)).json()
+            data = json.loads(response['data'])
+            if name == 'disease_h5':
+                return extract_domestic(data['areaTree'][0]['children'])
+            return extract_countries(data['foreignList'])
+
+        def streamed(name):
+            records = iter_records(name, session=session, base_url=stub.base_url)
+            if name == 'disease_h5':
+                return extract_domestic(records)
+            return extract_countries(records)
+
+        print('stream (peak memory)')
+        for name, body in payloads.items():
+            for label, func in (('full parse', full), ('streaming', streamed)):
+                _, peak = peak_memory(lambda: func(name))
+                seconds = timeit(lambda: func(name), repeat=3)
+                print('  {:<16}{:<12}{:>10.1f} MB peak {:>10.2f} ms'.format(
+                    name, label, peak / 2 ** 20, seconds * 1000))
+                record('stream', '{} {} peak MB'.format(name, label), peak / 2 ** 20)
+                record('stream', '{} {}'.format(name, label), seconds * 1000)
+            print('  {:<16}{:<12}{:>10.1f} MB'.format(name, 'body', len(body) / 2 ** 20))
+        print()
+
+
+def bench_countries():
+    """每次重建 name_df 再 pd.merge 与预建索引一次查找的对比"""
+    from countries import CountryIndex, load_country_index
+
+    index = load_country_index()
+    name_dict = {en: zh for zh, en in index.names.items()}
+    zh_names = list(index.names)
+    world = pd.DataFrame({'country': zh_names * 2 + ['未知{}'.format(i) for i in range(20)]})
+
+    def merge():
+        name_df = pd.DataFrame(name_dict, index=[0]).T
+        name_df.columns = ['中文']
+        name_df.reset_index(inplace=True)
+        name_df.rename(columns={'index': '英文'}, inplace=True)
+        return pd.merge(world, name_df, left_on='country', right_on='中文', how='inner')
+
+    report('country names ({} rows)'.format(len(world)), [
+        ('name_df + pd.merge', timeit(merge)),
+        ('CountryIndex.from_file', timeit(CountryIndex.from_file)),
+        ('CountryIndex.translate', timeit(lambda: index.translate(world))),
+    ])
+
+
+def bench_render(n_charts=8):
+    """逐张渲染与进程池批量渲染的对比"""
+    from render import ChartSpec, render_charts
+
+    countries = make_oversea()['foreignList']
+    pieces = [{'min': 1000, 'label': '>1000'}, {'max': 999, 'label': '<1000'}]
+    with tempfile.TemporaryDirectory() as root:
+        specs = []
+        for i in range(n_charts):
+            path = os.path.join(root, 'chart{}.html'.format(i))
+            data = [(c['name'], c['nowConfirm']) for c in countries]
+            if i % 2:
+                specs.append(ChartSpec('bar', path, 'bar', data, width='3500px', x_rotate=90))
+            else:
+                specs.append(ChartSpec('map', path, 'map', data, maptype='world', pieces=pieces))
+        results = []
+        rows = [
+            ('serial', timeit(lambda: results.append(render_charts(specs, processes=1)),
+                              repeat=3)),
+            ('process pool', timeit(lambda: render_charts(specs), repeat=3)),
+        ]
+        report('render ({} charts)'.format(n_charts), rows)
+        print('  per chart: ' + ', '.join('{:.1f}'.format(r.seconds * 1000)
+                                          for r in results[-1]) + ' ms')
+        print()
+
+
+def bench_assets(n_pages=4):
+    """在线引用、逐页内嵌与离线共享资源的体积对比"""
+    from render import ChartSpec, render_charts
+
+    countries = make_oversea()['foreignList']
+    data = [(c['name'], c['nowConfirm']) for c in countries]
+    pieces = [{'min': 1000}, {'max': 999}]
+    with tempfile.TemporaryDirectory() as root:
+        source = os.path.join(root, 'source')
+        os.makedirs(os.path.join(source, 'maps'))
+        # 用与真实脚本量级相近的占位文件，避免基准依赖网络
+        for name, size in (('echarts.min.js', 1000), ('maps/world.js', 900)):
+            with open(os.path.join(source, name), 'wb') as f:
+                f.write(b'/*' + b'x' * (size * 1024) + b'*/')
+        from assets import vendor_assets
+
+        asset_root = os.path.join(root, 'assets')
+        vendor_assets(('echarts', 'world'), root=asset_root, source=source)
+        specs = [ChartSpec('map', os.path.join(root, 'out', 'p{}.html'.format(i)), 'map', data,
+                           maptype='world', pieces=pieces) for i in range(n_pages)]
+        render_charts(specs, processes=1, asset_root=asset_root)
+        pages = sum(os.path.getsize(spec.path) for spec in specs)
+        shared = sum(os.path.getsize(os.path.join(asset_root, f))
+                     for f in os.listdir(asset_root) if f.endswith('.js'))
+
+        def load():
+            # 模拟浏览器打开所有页面：读取 html 与其引用的本地脚本
+            for spec in specs:
+                with open(spec.path, encoding='utf-8') as f:
+                    html = f.read()
+                for src in re.findall(r'src="([^"]+)"', html):
+                    with open(os.path.join(os.path.dirname(spec.path), src), 'rb') as f:
+                        f.read()
+
+        title = 'assets ({} pages)'.format(n_pages)
+        seconds = timeit(load)
+        print(title)
+        print('  html total            {:>10.1f} KB'.format(pages / 1024))
+        print('  shared assets         {:>10.1f} KB'.format(shared / 1024))
+        print('  inlined per page      {:>10.1f} KB'.format((pages + shared * n_pages) / 1024))
+        print('  offline load (all)    {:>10.2f} ms'.format(seconds * 1000))
+        print()
+        record(title, 'html total KB', pages / 1024)
+        record(title, 'shared assets KB', shared / 1024)
+        record(title, 'offline load (all)', seconds * 1000)
+
+
+def loop_squares(frame, path, name_column, cols):
+    """demo.py 原来的逐子图画法（Agg 后端），作为对照"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+
+    n = len(frame)
+    fig = plt.figure(figsize=(25, 25))
+    for a in range(n):
+        c_confirm, c_heal, c_dead = (frame.iloc[a][k] for k in ('confirm', 'heal', 'dead'))
+        ax = fig.add_subplot(-(-n // cols), cols, a + 1, aspect='equal', facecolor='#fafaf0')
+        ax.set_xlim(-c_confirm / 2, c_confirm / 2)
+        ax.set_ylim(-c_confirm / 2, c_confirm / 2)
+        ax.set_xticks([])
+        ax.set_yticks([])
+        for value, color, label in ((c_confirm, '#29648c', 'confirm'),
+                                    (c_heal, '#69c864', 'heal'), (c_dead, 'black', 'dead')):
+            ax.add_patch(patches.Rectangle((-value / 2, -value / 2), width=value, height=value,
+                                           facecolor=color, label=label))
+        ax.set_title(frame.iloc[a][name_column], fontdict={'size': 20})
+        ax.legend(loc='best')
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def bench_squares():
+    """逐子图循环与 PolyCollection 小多图的对比"""
+    from squares import render_squares
+
+    frame = country_frame(make_oversea()['foreignList'])
+    rows = []
+    with tempfile.TemporaryDirectory() as root:
+        for n in (20, 200):
+            part = frame.head(n)
+            path = os.path.join(root, 'squares.png')
+            rows.append(('loop {} regions'.format(n),
+                         timeit(lambda: loop_squares(part, path, 'country', 4), repeat=1)))
+            rows.append(('render_squares {}'.format(n),
+                         timeit(lambda: render_squares(part, path, 'country', cols=10), repeat=1)))
+    report('squares', rows)
+
+
+def cjk_font():
+    """词云基准使用的中文字体，找不到时返回 None（词云基准跳过）"""
+    from clouds import find_font
+
+    try:
+        return find_font()
+    except FileNotFoundError as exc:
+        print('跳过词云基准：{}'.format(exc))
+        print()
+        return None
+
+
+def loop_wordcloud(frequencies, path, width=1000, height=600):
+    """demo.py 原来的写法：每次新建 WordCloud 并从头排版"""
+    from wordcloud import WordCloud
+    from clouds import find_font
+
+    word_cloud = WordCloud(font_path=find_font(), background_color='white',
+                           width=width, height=height)
+    word_cloud.generate_from_frequencies(frequencies)
+    word_cloud.to_file(path)
+
+
+def bench_wordcloud():
+    """词云：每次从头排版，与排版缓存的冷启动、热启动对比"""
+    from clouds import CloudOutput, WordCloudService
+
+    if cjk_font() is None:
+        return
+    frame = country_frame(make_oversea()['foreignList'])
+    frequencies = dict(zip(frame['country'], frame['confirm']))
+    # 每个国家的人数增加不到 1%，量化后与原词频相同
+    nudged = {name: int(value * 1.004) + 1 for name, value in frequencies.items()}
+    rows = []
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'cloud.png')
+        sizes = [CloudOutput(os.path.join(root, '{}.png'.format(width)), width, width * 3 // 5)
+                 for width in (500, 1000, 2000)]
+        rows.append(('new WordCloud per call',
+                     timeit(lambda: loop_wordcloud(frequencies, path), repeat=3)))
+        rows.append(('3 sizes, new WordCloud each',
+                     timeit(lambda: [loop_wordcloud(frequencies, *output[:3]) for output in sizes],
+                            repeat=1)))
+        cache_dir = os.path.join(root, 'cache')
+        service = WordCloudService(cache_dir=cache_dir)
+        rows.append(('service cold', timeit(lambda: service.generate(frequencies, path), repeat=1)))
+        rows.append(('service warm (memory)', timeit(lambda: service.generate(nudged, path))))
+        disk = WordCloudService(cache_dir=cache_dir)
+        rows.append(('service warm (disk)', timeit(lambda: disk.generate(nudged, path), repeat=1)))
+        rows.append(('3 sizes, one layout',
+                     timeit(lambda: WordCloudService(cache_dir=None).render(frequencies, sizes),
+                            repeat=1)))
+    report('wordcloud', rows)
+
+
+def bench_wordcloud_batch(n_groups=24):
+    """分组词云：逐个新建 WordCloud 与 render_batch（当前进程 / 进程池）对比"""
+    from clouds import CloudJob, CloudOutput, render_batch
+
+    if cjk_font() is None:
+        return
+    frame = domestic_frames(make_domestic(n_provinces=n_groups, n_cities=30)['areaTree'])[1]
+    groups = [(name, dict(zip(group['city'], group['confirm'])))
+              for name, group in frame.groupby('province', sort=False)]
+    rows = []
+    with tempfile.TemporaryDirectory() as root:
+        def jobs():
+            for name, frequencies in groups:
+                yield CloudJob(name, frequencies, [
+                    CloudOutput(os.path.join(root, '{}-{}.png'.format(name, width)), width, height)
+                    for width, height in ((800, 480), (400, 240))])
+
+        rows.append(('new WordCloud per output', timeit(lambda: [
+            loop_wordcloud(job.frequencies, *output[:3]) for job in jobs() for output in job.outputs
+        ], repeat=1)))
+        rows.append(('render_batch in-process',
+                     timeit(lambda: list(render_batch(jobs(), processes=1, cache_dir=None)),
+                            repeat=1)))
+        rows.append(('render_batch pool ({} cpu)'.format(os.cpu_count()),
+                     timeit(lambda: list(render_batch(jobs(), cache_dir=None)), repeat=1)))
+    report('wordcloud batch ({} groups x 2 sizes)'.format(n_groups), rows)
+
+
+def bench_regions(n_cities=100):
+    """整表提取与建索引的耗时，以及按路径查找时布尔筛选与索引的对比"""
+    from regions import RegionIndex
+
+    tree = make_domestic(n_provinces=34, n_cities=n_cities)['areaTree']
+    cities = domestic_frames(tree)[1]
+    index = RegionIndex(tree).expand_all()
+    paths = [('省份{}'.format(p), '城市{}_{}'.format(p, c))
+             for p in range(0, 34, 3) for c in range(0, n_cities, 7)]
+
+    def frame_lookups():
+        for province, city in paths:
+            cities[(cities['province'] == province) & (cities['city'] == city)]
+
+    report('regions ({} cities)'.format(34 * n_cities), [
+        ('extract_domestic', timeit(lambda: domestic_frames(tree))),
+        ('index, provinces only', timeit(lambda: RegionIndex(tree).frame('province'))),
+        ('index, provinces + cities',
+         timeit(lambda: RegionIndex(tree).frame('city'))),
+        ('{} lookups, boolean filter'.format(len(paths)), timeit(frame_lookups, repeat=3)),
+        ('{} lookups, find + rollup'.format(len(paths)),
+         timeit(lambda: [index.rollup(index.find(*path), 'province') for path in paths])),
+    ])
+
+
+def bench_regionstats(scale=10):
+    """build 阶段的各张表：逐行 dict + 多份 DataFrame 与 RegionStats 视图的内存对比"""
+    from extract import extract_domestic, extract_world
+
+    tree = make_domestic(n_provinces=34 * scale, n_cities=100)['areaTree']
+    foreign_list = make_oversea(n_countries=200 * scale)['foreignList']
+
+    def legacy():
+        china_data = loop_extract_provinces(tree)
+        city_list = []
+        for province in tree[0]['children']:
+            for city in province['children']:
+                total = city['total']
+                city_list.append({
+                    'province': province['name'], 'city': city['name'],
+                    'nowConfirm': total['confirm'] - total['heal'] - total['dead'],
+                    'confirm': total['confirm'], 'heal': total['heal'], 'dead': total['dead'],
+                })
+        city_data = pd.DataFrame(city_list)
+        foreign_data = loop_extract_countries(foreign_list)
+        total = tree[0]['total']
+        china = pd.DataFrame([{'country': '中国',
+                               'nowConfirm': total['confirm'] - total['heal'] - total['dead'],
+                               'confirm': total['confirm'], 'dead': total['dead'],
+                               'heal': total['heal']}])
+        world_data = pd.concat([foreign_data, china], ignore_index=True)
+        return china_data, city_data, foreign_data, world_data
+
+    def compact():
+        provinces, cities = extract_domestic(tree[0]['children'])
+        world = extract_world(foreign_list, tree)
+        return (provinces.to_frame('province'), cities.to_frame('city', 'province'),
+                world[:-1].to_frame('country', 'continent'),
+                world.to_frame('country', 'continent'))
+
+    def count_bytes(frames):
+        """各表数值列的字节数，共用同一块内存的列只计一次"""
+        buffers = {}
+        for frame in frames:
+            for column in ('nowConfirm', 'confirm', 'heal', 'dead'):
+                values = frame[column].to_numpy()
+                base = values
+                while base.base is not None and isinstance(base.base, np.ndarray):
+                    base = base.base
+                buffers[(base.__array_interface__['data'][0], base.nbytes)] = base.nbytes
+        return sum(buffers.values())
+
+    n = 34 * scale * 101 + 200 * scale
+    print('regionstats ({} regions)'.format(n))
+    for label, func in (('dict rows + DataFrames', legacy), ('RegionStats views', compact)):
+        tracemalloc.start()
+        try:
+            frames = func()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        seconds = timeit(func, repeat=3)
+        counts = count_bytes(frames)
+        print('  {:<24}{:>8.2f} MB peak {:>8.2f} MB retained {:>8.2f} MB counts {:>8.2f} ms'
+              .format(label, peak / 2 ** 20, retained / 2 ** 20, counts / 2 ** 20,
+                      seconds * 1000))
+        record('regionstats', '{} peak MB'.format(label), peak / 2 ** 20)
+        record('regionstats', '{} retained MB'.format(label), retained / 2 ** 20)
+        record('regionstats', '{} counts MB'.format(label), counts / 2 ** 20)
+        record('regionstats', label, seconds * 1000)
+    print()
+
+
+def bench_query(scale=50):
+    """反复 sort_values/reset_index/布尔切片与 Query 视图的耗时、峰值内存对比"""
+    from query import Query
+    from rates import rate_metrics
+
+    frame = rate_metrics(country_frame(make_oversea(n_countries=200 * scale)['foreignList']))
+    frame['英文'] = frame['country'].where(np.arange(len(frame)) % 5 != 0)
+
+    def legacy():
+        world = frame[frame['healRate'] < 0.90]
+        world = world[world['deadRate'] > 0.00]
+        world.sort_values("deadRate", ascending=False, inplace=True, kind='stable')
+        world.reset_index(drop=True, inplace=True)
+        bars = [(c, format(v, '.2f')) for c, v in zip(world['country'], world['deadRate'])]
+        clouds = {i: j for i, j in zip(world['country'], world['confirm'])}
+        mapped = frame[frame['英文'].notna()]
+        map_data = list(zip(list(mapped['英文']), list(mapped['nowConfirm'])))
+        world_t = frame.sort_values("confirm", ascending=False, kind='stable') \
+            .reset_index(drop=True).head(20)
+        top = world_t.assign(英文=world_t['英文'].fillna(world_t['country']))
+        return bars, clouds, map_data, list(top['英文']), top['confirm'].to_numpy()
+
+    def views():
+        world = Query(frame)
+        rates = world.where(world['healRate'] < 0.90, world['deadRate'] > 0.00) \
+            .sort("deadRate", ascending=False)
+        bars = rates.pairs('country', 'deadRate', '.2f')
+        clouds = rates.frequencies('country', 'confirm')
+        map_data = world.where(frame['英文'].notna().to_numpy()).pairs('英文', 'nowConfirm')
+        top = world.sort("confirm", ascending=False).head(20)
+        return bars, clouds, map_data, top.labels('英文', fallback='country'), top['confirm']
+
+    old, new = legacy(), views()
+    assert old[0] == new[0] and old[2] == new[2] and old[3] == new[3]
+    print('query ({} rows)'.format(len(frame)))
+    for label, func in (('sort/reset_index/slices', legacy), ('Query views', views)):
+        _, peak = peak_memory(func)
+        seconds = timeit(func, repeat=5)
+        print('  {:<28}{:>10.2f} ms {:>8.2f} MB peak'.format(label, seconds * 1000,
+                                                             peak / 2 ** 20))
+        record('query', label, seconds * 1000)
+        record('query', '{} peak MB'.format(label), peak / 2 ** 20)
+    print()
+
+
+def bench_ranking(n_countries=10000, changes=5, k=20):
+    """每轮只有少数地区变化时：整表重新排序取前 K 与增量排名索引的对比"""
+    from ranking import RankingIndex
+    from rates import rate_metrics
+
+    rng = np.random.default_rng(0)
+    base = rate_metrics(country_frame(make_oversea(n_countries=n_countries)['foreignList']))
+    frames = []
+    frame = base
+    for _ in range(20):
+        frame = frame.copy()
+        rows = rng.choice(len(frame), changes, replace=False)
+        frame.loc[rows, 'confirm'] += rng.integers(1, 1000, changes)
+        frames.append(rate_metrics(frame.drop(columns=['deadRate', 'healRate', 'activeRate'])))
+    metrics = ('confirm', 'nowConfirm', 'deadRate', 'healRate')
+
+    def resort():
+        for frame in frames:
+            for metric in metrics:
+                frame.sort_values(metric, ascending=False).head(k)
+
+    def incremental():
+        index = RankingIndex()
+        index.update(base, 'country')
+        for metric in metrics:
+            index.top(metric, k)
+        start = time.perf_counter()
+        for frame in frames:
+            index.update(frame, 'country')
+            for metric in metrics:
+                index.top_rows(metric, k)
+        return time.perf_counter() - start
+
+    index = RankingIndex()
+    index.update(frames[-1], 'country')
+    index.top('confirm', k)
+    per_refresh = len(frames)
+    report('ranking ({} regions, {} changed per refresh, top {})'.format(
+        n_countries, changes, k), [
+        ('sort_values per refresh', timeit(resort, repeat=3) / per_refresh),
+        ('update + top per refresh', min(incremental() for _ in range(3)) / per_refresh),
+        ('top {} only'.format(k), timeit(lambda: index.top_rows('confirm', k))),
+        ('rank of one region', timeit(lambda: index.rank('confirm', '国家7'))),
+    ])
+
+
+def bench_binning(n_regions=3400):
+    """按 nowConfirm 分布计算地图分段（缓存未命中）的耗时"""
+    import binning
+
+    values = make_domestic(n_provinces=34, n_cities=n_regions // 34)['areaTree'][0]['children']
+    values = np.array([city['total']['confirm'] - city['total']['heal'] - city['total']['dead']
+                       for province in values for city in province['children']])
+
+    def cold(method):
+        binning._cache.clear()
+        return binning.pieces(values, method)
+
+    rows = [('{} ({} regions)'.format(method, len(values)),
+             timeit(lambda: cold(method), repeat=20)) for method in binning.METHODS]
+    rows.append(('cached', timeit(lambda: binning.pieces(values, 'jenks'), repeat=20)))
+    report('binning', rows)
+
+
+def bench_backfill(n_snapshots=2000, processes=None):
+    """归档回填的吞吐量：n_snapshots 份国内、海外响应交替，单进程与进程池对比"""
+    import gzip
+    import shutil
+    from datetime import datetime, timedelta
+    from backfill import backfill
+
+    processes = processes or os.cpu_count() or 1
+    domestic = make_domestic(n_provinces=34, n_cities=10)
+    oversea = make_oversea()
+    start = datetime(2020, 3, 1)
+    with tempfile.TemporaryDirectory() as root:
+        archive = os.path.join(root, 'archive')
+        os.makedirs(archive)
+        for i in range(n_snapshots):
+            stamp = (start + timedelta(hours=i // 2)).strftime('%Y-%m-%d %H:%M:%S')
+            data, name = (domestic, 'disease_h5') if i % 2 == 0 else (oversea, 'disease_foreign')
+            data['lastUpdateTime'] = stamp
+            body = wrap_payload(data)
+            path = os.path.join(archive, '{}-{:05d}.json'.format(name, i))
+            if i % 4 == 1:
+                with gzip.open(path + '.gz', 'wb') as f:
+                    f.write(body)
+            else:
+                with open(path, 'wb') as f:
+                    f.write(body)
+
+        print('backfill ({} archived snapshots)'.format(n_snapshots))
+        for n in sorted({1, processes}):
+            store_root = os.path.join(root, 'store-{}'.format(n))
+            report = backfill(archive, store_root, processes=n)
+            shutil.rmtree(store_root)
+            assert not report.errors, report.errors[:3]
+            print('  {} process(es){:>10.1f} files/s {:>12.0f} rows/s {:>8.2f} s'.format(
+                n, report.files / report.seconds, report.rows / report.seconds, report.seconds))
+            record('backfill', '{} processes files/s'.format(n), report.files / report.seconds)
+            record('backfill', '{} processes rows/s'.format(n), report.rows / report.seconds)
+        print()
+
+
+def bench_stages(scale=1):
+    """当前流水线逐阶段耗时：抓取、JSON 解析、建表、比率、写文件、渲染、方寸间、词云
+
+    scale 同时放大省份、城市与国家的数量。
+    """
+    from fetch import FEEDS, fetch_results, parse_body
+    from rates import rate_metrics
+    from store import SnapshotStore, export_excel
+    from render import ChartSpec, render_charts
+    from squares import render_squares
+    from clouds import WordCloudService
+
+    domestic = make_domestic(n_provinces=34 * scale, n_cities=10 * scale)
+    oversea = make_oversea(n_countries=200 * scale)
+    payloads = {'disease_h5': wrap_payload(domestic), 'disease_foreign': wrap_payload(oversea)}
+    bodies = list(payloads.values())
+    stamp = domestic['lastUpdateTime']
+    rows = []
+    with StubServer(payloads) as stub:
+        rows.append(('fetch', timeit(lambda: fetch_results(FEEDS, base_url=stub.base_url))))
+    rows.append(('json decode', timeit(lambda: [parse_body(body) for body in bodies])))
+
+    def frames():
+        return domestic_frames(domestic['areaTree']) + (country_frame(oversea['foreignList']),)
+
+    rows.append(('dataframes', timeit(frames)))
+    china, cities, world = frames()
+    rows.append(('rates', timeit(lambda: (rate_metrics(china), rate_metrics(world)))))
+    with tempfile.TemporaryDirectory() as root:
+        rows.append(('excel', timeit(
+            lambda: export_excel(world, os.path.join(root, 'world.xlsx')), repeat=1)))
+        for fmt in ('parquet', 'feather'):
+            store = SnapshotStore(os.path.join(root, fmt), fmt=fmt)
+            rows.append((fmt, timeit(
+                lambda: [store.write(kind, frame, stamp, overwrite=True)
+                         for kind, frame in (('china', china), ('cities', cities),
+                                             ('world', world))])))
+        spec = ChartSpec('map', os.path.join(root, 'world.html'), 'world',
+                         list(zip(world['country'], world['nowConfirm'].tolist())),
+                         maptype='world', pieces=[{'min': 1000}, {'max': 999}])
+        rows.append(('pyecharts render', timeit(lambda: render_charts([spec], processes=1),
+                                                repeat=3)))
+        rows.append(('squares', timeit(lambda: render_squares(
+            world.head(20), os.path.join(root, 'squares.png'), 'country', cols=4), repeat=1)))
+        frequencies = dict(zip(world['country'], world['confirm']))
+        if cjk_font() is not None:
+            rows.append(('wordcloud', timeit(lambda: WordCloudService(cache_dir=None).generate(
+                frequencies, os.path.join(root, 'cloud.png')), repeat=1)))
+    report('stages (scale {}: {} provinces, {} cities, {} countries)'.format(
+        scale, len(china), len(cities), len(world)), rows)
+
+
+def bench_profiling(n=100000):
+    """profiling.stage 未启用与启用时每次进入、退出的开销"""
+    import profiling
+
+    def loop(profiler):
+        for _ in range(n):
+            with profiler.stage('x'):
+                pass
+
+    def bare():
+        for _ in range(n):
+            pass
+
+    report('profiling ({} stages)'.format(n), [
+        ('bare loop', timeit(bare)),
+        ('disabled', timeit(lambda: loop(profiling.Profiler(enabled=False)))),
+        ('enabled (timing + RSS)', timeit(lambda: loop(profiling.Profiler()), repeat=1)),
+    ])
+
+
+def bench_poller(cycles=300):
+    """常驻进程反复轮询（数据未变化）时每轮的耗时与 RSS 增长"""
+    from cache import ResponseCache
+    from fetch import FEEDS, fetch_results
+    from poller import AdaptiveInterval, Poller, current_rss
+
+    payloads = {'disease_h5': wrap_payload(make_domestic()),
+                'disease_foreign': wrap_payload(make_oversea())}
+    with StubServer(payloads, etag=True) as stub, tempfile.TemporaryDirectory() as root:
+        cache = ResponseCache(root)
+
+        def cycle():
+            fetch_results(FEEDS, cache=cache, base_url=stub.base_url)
+            return cache.meta('disease_h5')['lastUpdateTime']
+
+        poller = Poller(cycle, AdaptiveInterval(0, 0))
+        poller.run_once()
+        before = current_rss()
+        start = time.perf_counter()
+        for _ in range(cycles):
+            poller.run_once()
+        seconds = (time.perf_counter() - start) / cycles
+        growth = (current_rss() - before) / 1024
+    title = 'poller ({} cycles, unchanged data)'.format(cycles)
+    print(title)
+    print('  per cycle                   {:>10.2f} ms'.format(seconds * 1000))
+    print('  RSS growth                  {:>10.1f} KB'.format(growth))
+    print()
+    record(title, 'per cycle', seconds * 1000)
+    record(title, 'RSS growth KB', growth)
+
+
+def _run_api_server(root, ports):
+    import asyncio
+    from server import ApiServer
+
+    async def serve():
+        server = ApiServer(root, port=0, reload_seconds=0)
+        await server.start()
+        ports.put(server.port)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def _load(port, paths, concurrency, total):
+    """concurrency 个 keep-alive 连接轮流请求 paths，返回每个请求的耗时（秒）"""
+    import asyncio
+
+    latencies = []
+    per_client = total // concurrency
+
+    async def client(offset):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for i in range(per_client):
+            path = paths[(offset + i) % len(paths)]
+            start = time.perf_counter()
+            writer.write('GET {} HTTP/1.1\r\nHost: x\r\n\r\n'.format(path).encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int(re.search(rb'Content-Length: (\d+)', head).group(1))
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return latencies
+
+
+def bench_server(concurrency=32, total=6400):
+    """本地 HTTP 接口在并发负载下的延迟分布，对比每次查询都重新读快照、排序"""
+    import asyncio
+    import multiprocessing
+    from urllib.parse import quote
+    from rates import rate_metrics
+    from store import SnapshotStore
+
+    domestic = make_domestic()
+    china = rate_metrics(domestic_frames(domestic['areaTree'])[0])
+    world = rate_metrics(country_frame(make_oversea()['foreignList']))
+    paths = ['/api/china/top?n=10', '/api/world/top?metric=confirm&n=20',
+             '/api/world/filter?metric=deadRate&min=0.02&max=0.03',
+             '/api/world/region/' + quote('国家7'), '/healthz']
+    with tempfile.TemporaryDirectory() as root:
+        store = SnapshotStore(root)
+        store.write('china_enriched', china, domestic['lastUpdateTime'])
+        store.write('world_enriched', world, domestic['lastUpdateTime'])
+
+        def reread():
+            frame = store.read('world_enriched')
+            frame.sort_values('confirm', ascending=False).head(20).to_json(orient='records')
+
+        ports = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run_api_server, args=(root, ports), daemon=True)
+        process.start()
+        try:
+            port = ports.get(timeout=30)
+            asyncio.run(_load(port, paths, concurrency, concurrency * 4))  # 预热
+            start = time.perf_counter()
+            latencies = np.sort(asyncio.run(_load(port, paths, concurrency, total)))
+            seconds = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.join()
+        baseline = timeit(reread)
+    title = 'server ({} connections, {} requests)'.format(concurrency, len(latencies))
+    rows = [
+        ('re-read + sort per query', baseline),
+        ('p50', latencies[len(latencies) // 2]),
+        ('p99', latencies[int(len(latencies) * 0.99)]),
+        ('max', latencies[-1]),
+        ('wall time per request', seconds / len(latencies)),
+    ]
+    report(title, rows)
+
+
+BENCHMARKS = {
+    'stages': bench_stages,
+    'fetch': bench_fetch,
+    'extract': bench_extract,
+    'rates': bench_rates,
+    'store': bench_store,
+    'stream': bench_stream,
+    'countries': bench_countries,
+    'regions': bench_regions,
+    'regionstats': bench_regionstats,
+    'query': bench_query,
+    'ranking': bench_ranking,
+    'binning': bench_binning,
+    'backfill': bench_backfill,
+    'render': bench_render,
+    'squares': bench_squares,
+    'assets': bench_assets,
+    'wordcloud': bench_wordcloud,
+    'wordcloud_batch': bench_wordcloud_batch,
+    'profiling': bench_profiling,
+    'poller': bench_poller,
+    'server': bench_server,
+}
+
+
+def git_commit():
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=root, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def save_results(path, scale):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'scale': scale,
+            'results': RESULTS,
+        }, f, ensure_ascii=False, indent=1)
+    print('结果已写入 {}'.format(path))
+
+
+def compare(base_path, new_path, threshold=0.1):
+    """对比两次结果，返回变慢（或变大）超过 threshold 的条目数"""
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print('{} -> {}'.format(base['commit'], new['commit']))
+    regressions = 0
+    for title, rows in new['results'].items():
+        old_rows = base['results'].get(title, {})
+        shared = [name for name in rows if name in old_rows]
+        if not shared:
+            continue
+        print(title)
+        for name in shared:
+            old, value = old_rows[name], rows[name]
+            change = (value - old) / old if old else 0.0
+            flag = ''
+            if change > threshold:
+                flag = '  <-- 变慢'
+                regressions += 1
+            print('  {:<28}{:>10.2f}{:>10.2f}{:>+8.0%}{}'.format(name, old, value, change, flag))
+        print()
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='COVID-19 数据流水线性能基准')
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help='要运行的基准，默认全部：' + '、'.join(BENCHMARKS))
+    parser.add_argument('--scale', type=int, default=1, help='stages 基准的数据放大倍数')
+    parser.add_argument('--output', help='结果 JSON 路径，默认 bench_results/<提交>.json')
+    parser.add_argument('--compare', nargs='+', metavar='JSON',
+                        help='对比两份结果；只给一份时与本次运行的结果对比')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='变慢超过该比例时记为回归（默认 0.1）')
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('未知的基准：{}'.format('、'.join(sorted(unknown))))
+
+    if args.compare and len(args.compare) >= 2:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) else 0
+    for name in args.names or BENCHMARKS:
+        if name == 'stages':
+            bench_stages(args.scale)
+        else:
+            BENCHMARKS[name]()
+    output = args.output or os.path.join('bench_results', '{}.json'.format(git_commit()))
+    save_results(output, args.scale)
+    if args.compare:
+        return 1 if compare(args.compare[0], output, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# coding: utf-8
+"""地图分段配色的数据驱动分箱
+
+原来的 CHINA_PIECES、WORLD_PIECES 是手写的固定区间（>5000、1000-4999……），
+区间之间还有空隙（100 与 101、999 与 1000 之间的值不属于任何一段），人数变化
+之后分段也就失去了意义。这里按当前 nowConfirm 的分布计算分段边界：
+
+* quantile：正值的等频分位数；
+* log：从 1 到最大值的等比边界；
+* jenks：对数刻度上的自然断点（Fisher-Jenks 动态规划）。不同的值多于
+  JENKS_GROUPS 个时先在对数刻度上等宽聚合，DP 用矩阵运算完成，
+  城市级数千个地区也在 1 ms 以内。
+
+边界取两位有效数字，得到的 VisualMapOpts pieces 是首尾相接的整数区间，
+0（及以下）单独一段。同一份数据、同一方法的结果按内容哈希缓存。
+numpy 只在函数中导入，命令行解析 --binning 时导入本模块不会加载它。
+"""
+
+import hashlib
+from collections import OrderedDict
+
+METHODS = ('quantile', 'log', 'jenks')
+N_BINS = 6
+COLORS = ['#fff2d1', '#ffb248', '#ffA500', '#fb8146', '#ff585e', '#893448']  # 由浅到深
+ZERO_COLOR = '#ffffff'
+JENKS_GROUPS = 64
+CACHE_ITEMS = 64
+
+_cache = OrderedDict()  # (内容哈希, 方法, 段数) -> 边界
+
+
+def nice(values, digits=2):
+    """向下取 digits 位有效数字，如 4873 -> 4800"""
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** np.maximum(np.floor(np.log10(np.maximum(values, 1))) - digits + 1, 0)
+    return (np.floor(values / scale) * scale).astype(np.int64)
+
+
+def _quantile_edges(positive, n_bins):
+    import numpy as np
+
+    return np.quantile(positive, np.linspace(0, 1, n_bins + 1)[1:-1])
+
+
+def _log_edges(positive, n_bins):
+    import numpy as np
+
+    return np.logspace(0, np.log10(positive.max()), n_bins + 1)[1:-1]
+
+
+def _fisher_jenks(values, weights, n_bins):
+    """有序、带权的 values 分成 n_bins 类，返回第 2..n_bins 类的起始下标"""
+    import numpy as np
+
+    m = len(values)
+    w = np.concatenate([[0.0], np.cumsum(weights)])
+    s = np.concatenate([[0.0], np.cumsum(weights * values)])
+    q = np.concatenate([[0.0], np.cumsum(weights * values * values)])
+    a = np.arange(m)[:, None]
+    b = np.arange(m)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = s[b + 1] - s[a]
+        ssd = q[b + 1] - q[a] - total * total / (w[b + 1] - w[a])  # 第 a..b 个值为一类
+    ssd = np.where(a <= b, ssd, np.inf)
+    cost = ssd[0]
+    back = []
+    columns = np.arange(m)
+    for _ in range(n_bins - 1):
+        candidates = cost[:-1, None] + ssd[1:]  # 第 r 行：上一类止于 r，新类从 r+1 开始
+        start = np.argmin(candidates, axis=0)
+        cost = candidates[start, columns]
+        back.append(start + 1)
+    breaks = []
+    end = m - 1
+    for start in reversed(back):
+        end = start[end]
+        breaks.append(end)
+        end -= 1
+    return np.array(breaks[::-1], dtype=np.int64)
+
+
+def _jenks_edges(positive, n_bins, groups=JENKS_GROUPS):
+    import numpy as np
+
+    x, counts = np.unique(np.log(positive), return_counts=True)
+    starts = np.arange(len(x))
+    means, weights = x, counts.astype(np.float64)
+    if len(x) > groups:
+        # 分组不会被拆开，组内的平方差是常数，DP 只需各组的加权均值
+        group = np.searchsorted(np.linspace(x[0], x[-1], groups + 1)[1:-1], x, side='right')
+        starts = np.flatnonzero(np.diff(group, prepend=-1))
+        weights = np.add.reduceat(weights, starts)
+        means = np.add.reduceat(x * counts, starts) / weights
+    if len(means) <= n_bins:
+        return np.exp(x[starts[1:]])
+    return np.exp(x[starts[_fisher_jenks(means, weights, n_bins)]])
+
+
+_EDGES = {'quantile': _quantile_edges, 'log': _log_edges, 'jenks': _jenks_edges}
+
+
+def breaks(values, method='quantile', n_bins=N_BINS):
+    """各段（0 以外）的下界，升序整数元组，第一段总从 1 开始"""
+    import numpy as np
+
+    if method not in _EDGES:
+        raise ValueError('未知的分箱方法：{}'.format(method))
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    key = (hashlib.sha1(values.tobytes()).hexdigest(), method, n_bins)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    positive = values[values > 0]
+    edges = [1]
+    if len(positive) and n_bins > 1:
+        inner = nice(_EDGES[method](positive, n_bins))
+        edges += np.unique(inner[inner > 1]).tolist()
+    result = tuple(edges)
+    _cache[key] = result
+    while len(_cache) > CACHE_ITEMS:
+        _cache.popitem(last=False)
+    return result
+
+
+def palette(n, colors=COLORS):
+    """由浅到深的 n 种颜色，与 colors 数目不同时线性插值"""
+    import numpy as np
+
+    if n == len(colors):
+        return list(colors)
+    rgb = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=np.float64)
+    positions = np.linspace(0, len(colors) - 1, n)
+    channels = [np.interp(positions, np.arange(len(colors)), rgb[:, j]) for j in range(3)]
+    return ['#{:02x}{:02x}{:02x}'.format(*(int(round(c)) for c in color))
+            for color in zip(*channels)]
+
+
+def pieces(values, method='quantile', n_bins=N_BINS, colors=COLORS, zero_color=ZERO_COLOR):
+    """由数据分布得到的 VisualMapOpts pieces：首尾相接的整数区间，由深到浅排列"""
+    edges = breaks(values, method, n_bins)
+    result = []
+    for lo, hi, color in zip(edges, edges[1:] + (None,), palette(len(edges), colors)):
+        if hi is None:
+            result.append({"min": lo, "label": '≥{}'.format(lo), "color": color})
+        elif hi - 1 == lo:
+            result.append({"min": lo, "max": lo, "label": str(lo), "color": color})
+        else:
+            result.append({"min": lo, "max": hi - 1, "label": '{}-{}'.format(lo, hi - 1),
+                           "color": color})
+    result.append({"max": 0, "label": '0', "color": zero_color})
+    return result[-2::-1] + result[-1:]
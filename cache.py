@@ -0,0 +1,192 @@
+# coding: utf-8
+"""getOnsInfo 响应的磁盘缓存
+
+按 feed 名称缓存原始响应体及校验信息（ETag、Last-Modified、内容哈希、
+lastUpdateTime）。服务器支持条件请求时发送 If-None-Match/If-Modified-Since，
+否则用内容哈希加 lastUpdateTime 判断数据是否更新。
+
+超过 TTL 未校验的条目视为过期：下次抓取不再发送条件请求头，也不凭内容哈希
+判定未变化，但响应体保留到被新响应替换或按容量淘汰为止，离线时 build 仍能
+读取最近一次抓取的数据。
+"""
+
+import os
+import json
+import time
+import hashlib
+
+CACHE_DIR = '.cache'
+TTL = 24 * 3600  # 超过该秒数未校验的条目视为过期，下次抓取时重新完整校验
+MAX_BYTES = 64 * 1024 * 1024  # 缓存目录总大小上限
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+class ResponseCache:
+    """按 feed 名称组织的磁盘响应缓存，带 TTL 与容量淘汰"""
+
+    def __init__(self, root=CACHE_DIR, ttl=TTL, max_bytes=MAX_BYTES):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+        self._parsed = {}  # feed 名称 -> (内容哈希, 已解析数据)，避免重复解析
+        os.makedirs(root, exist_ok=True)
+
+    def _body_path(self, name):
+        return os.path.join(self.root, name + '.body')
+
+    def _meta_path(self, name):
+        return os.path.join(self.root, name + '.meta.json')
+
+    def meta(self, name):
+        """返回条目元数据；不存在时返回 None，过期条目照常返回"""
+        try:
+            with open(self._meta_path(name), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._body_path(name)):
+            self.evict(name)
+            return None
+        return meta
+
+    def expired(self, meta):
+        """条目是否已超过 TTL 未校验"""
+        return time.time() - meta['stored_at'] > self.ttl
+
+    def conditional_headers(self, name):
+        """根据缓存条目生成条件请求头；过期条目不发送，强制完整响应"""
+        meta = self.meta(name)
+        headers = {}
+        if meta and not self.expired(meta):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def body_path(self, name):
+        """缓存的响应体文件路径（供流式解析），没有该条目时返回 None"""
+        return self._body_path(name) if self.meta(name) is not None else None
+
+    def load(self, name, parse):
+        """读取缓存的响应体，并用 parse(bytes) 解析（同一内容只解析一次）"""
+        meta = self.meta(name)
+        if meta is None:
+            return None
+        digest, data = self._parsed.get(name, (None, None))
+        if digest != meta['sha256']:
+            with open(self._body_path(name), 'rb') as f:
+                data = parse(f.read())
+            self._parsed[name] = (meta['sha256'], data)
+        return data
+
+    def not_modified(self, name):
+        """服务器返回 304：刷新校验时间，计一次命中"""
+        meta = self.meta(name)
+        if meta is None:
+            return False
+        meta['stored_at'] = time.time()
+        self._write_meta(name, meta)
+        self.stats['hits'] += 1
+        self.stats['not_modified'] += 1
+        return True
+
+    def store(self, name, body, parse, headers=None):
+        """写入新响应，返回 (数据, 是否发生变化)
+
+        内容哈希与缓存一致时直接复用已解析数据，不再解析响应体；
+        过期条目不参与比较，新响应总是视为有变化。
+        """
+        headers = headers or {}
+        digest = content_hash(body)
+        old = self.meta(name)
+        if old is not None and self.expired(old):
+            old = None
+        if old is not None and old['sha256'] == digest:
+            data, changed = self.load(name, parse), False
+        else:
+            data = parse(body)
+            changed = not (
+                old is not None
+                and isinstance(data, dict) and data.get('lastUpdateTime') is not None
+                and old.get('lastUpdateTime') == data['lastUpdateTime'])
+        if changed:
+            self.stats['misses'] += 1
+            with open(self._body_path(name), 'wb') as f:
+                f.write(body)
+            self._parsed[name] = (digest, data)
+            meta = {
+                'sha256': digest,
+                'lastUpdateTime': data.get('lastUpdateTime') if isinstance(data, dict) else None,
+                'size': len(body),
+            }
+        else:
+            # lastUpdateTime 相同但内容略有差异时保留旧响应体
+            self.stats['hits'] += 1
+            meta = dict(old)
+        meta.update(etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'),
+                    stored_at=time.time())
+        self._write_meta(name, meta)
+        self._enforce_size(keep=name)
+        return data, changed
+
+    def _write_meta(self, name, meta):
+        tmp = self._meta_path(name) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, self._meta_path(name))
+
+    def evict(self, name):
+        removed = False
+        for path in (self._body_path(name), self._meta_path(name)):
+            try:
+                os.remove(path)
+                removed = True
+            except FileNotFoundError:
+                pass
+        self._parsed.pop(name, None)
+        if removed:
+            self.stats['evictions'] += 1
+
+    def _entries(self):
+        entries = []
+        for filename in os.listdir(self.root):
+            if filename.endswith('.meta.json'):
+                name = filename[:-len('.meta.json')]
+                try:
+                    with open(self._meta_path(name), encoding='utf-8') as f:
+                        entries.append((name, json.load(f)))
+                except (OSError, ValueError):
+                    continue
+        return entries
+
+    def _enforce_size(self, keep=None):
+        """按校验时间从旧到新淘汰，直到总大小不超过 max_bytes"""
+        entries = sorted(self._entries(), key=lambda item: item[1]['stored_at'])
+        total = sum(meta['size'] for _, meta in entries)
+        for name, meta in entries:
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self.evict(name)
+            total -= meta['size']
+
+    def metrics_text(self):
+        """Prometheus 文本格式的计数器"""
+        lines = []
+        for key, value in self.stats.items():
+            metric = 'covid_cache_{}_total'.format(key)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{} {}'.format(metric, value))
+        return '\n'.join(lines) + '\n'
+
+    def write_metrics(self, path=None):
+        path = path or os.path.join(self.root, 'metrics.prom')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.metrics_text())
+        return path
@@ -0,0 +1,269 @@
+# coding: utf-8
+"""词云图服务
+
+原来每张词云都新建 WordCloud、在 1000x600 的画布上从头排版，并且写死了
+Windows 字体路径。WordCloudService：
+
+* 排版结果按量化后的词频缓存在内存和 .cache/wordcloud/ 下，各地区人数小幅
+  变化时直接复用上次的排版，只重新绘制；
+* 同一份词频可一次输出多个尺寸（宽高比相同的输出共用一次排版，按比例放大绘制）
+  和多个蒙版（每个蒙版排版一次）；
+* 在 Linux 上无图形界面即可运行，字体依次取参数、环境变量 COVID_WORDCLOUD_FONT、
+  仓库 fonts/ 目录、系统中文字体；都没有时报错，而不是画出一片方框。
+
+大批量的词云（按大洲、省份分组，每组多个尺寸）用 render_batch 分发到进程池，
+每完成一组就写出文件并产出结果。
+"""
+
+import os
+import io
+import sys
+import json
+import glob
+import math
+import time
+import hashlib
+import multiprocessing
+from fractions import Fraction
+from functools import lru_cache
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+CACHE_DIR = os.path.join('.cache', 'wordcloud')
+FONT_ENV = 'COVID_WORDCLOUD_FONT'
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+FONT_CANDIDATES = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+    '/usr/share/fonts/wqy-microhei/wqy-microhei.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    'C:/Windows/Fonts/msyhbd.ttc',
+    'C:/Windows/Fonts/simhei.ttf',
+]
+QUANT_STEP = 0.05  # 词频取相对最大值的对数后量化，约 5% 以内的变化共用排版
+MAX_WORDS = 200
+MEMORY_ITEMS = 64
+MAX_TASKS_PER_CHILD = 20  # 工作进程处理这么多组后重启，释放排版缓存占用的内存
+
+CloudOutput = namedtuple('CloudOutput', [
+    'path',  # 输出图片路径，扩展名决定格式
+    'width',  # 有蒙版时按蒙版宽度等比缩放，height 不起作用
+    'height',
+    'mask',  # 蒙版图片路径，白色部分不放置文字
+])
+CloudOutput.__new__.__defaults__ = (1000, 600, None)
+
+CloudJob = namedtuple('CloudJob', [
+    'name',  # 分组名，如大洲或省份
+    'frequencies',  # {词: 频率}
+    'outputs',  # CloudOutput 列表
+])
+CloudResult = namedtuple('CloudResult', ['name', 'paths', 'seconds'])
+
+
+def find_font(path=None):
+    """词云使用的中文字体文件路径，找不到时抛出 FileNotFoundError"""
+    if path is not None:
+        if not os.path.exists(path):
+            raise FileNotFoundError('字体文件不存在：{}'.format(path))
+        return path
+    candidates = [os.environ.get(FONT_ENV)]
+    candidates += sorted(glob.glob(os.path.join(FONT_DIR, '*.[ot]t[fc]')))
+    candidates += FONT_CANDIDATES
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError('找不到中文字体：请用环境变量 {} 指定字体文件，或把字体放到 {}'
+                            .format(FONT_ENV, FONT_DIR))
+
+
+@lru_cache(maxsize=16)
+def _load_mask(path):
+    """蒙版数组与文件内容哈希"""
+    import numpy as np
+    from PIL import Image
+
+    with open(path, 'rb') as f:
+        body = f.read()
+    mask = np.array(Image.open(io.BytesIO(body)))
+    return mask, hashlib.sha256(body).hexdigest()
+
+
+def quantize(frequencies, step=QUANT_STEP, max_words=MAX_WORDS):
+    """按词频从高到低取前 max_words 个词，频率换成相对最大值的对数刻度整数"""
+    items = sorted(((word, float(freq)) for word, freq in frequencies.items() if freq > 0),
+                   key=lambda item: (-item[1], item[0]))[:max_words]
+    if not items:
+        raise ValueError('词云至少需要一个频率大于 0 的词')
+    top = items[0][1]
+    return tuple((word, round(math.log(freq / top) / math.log1p(step))) for word, freq in items)
+
+
+class WordCloudService:
+    def __init__(self, font_path=None, cache_dir=CACHE_DIR, step=QUANT_STEP,
+                 max_words=MAX_WORDS, background_color='white', random_state=0,
+                 memory_items=MEMORY_ITEMS):
+        self.font_path = find_font(font_path)
+        self.cache_dir = cache_dir
+        self.step = step
+        self.max_words = max_words
+        self.background_color = background_color
+        self.random_state = random_state
+        self.memory_items = memory_items
+        self._layouts = OrderedDict()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def _wordcloud(self, width, height, mask=None, scale=1):
+        from wordcloud import WordCloud
+
+        return WordCloud(font_path=self.font_path, width=width, height=height,
+                         mask=None if mask is None else _load_mask(mask)[0],
+                         scale=scale, max_words=self.max_words,
+                         background_color=self.background_color,
+                         random_state=self.random_state)
+
+    def _key(self, quantized, width, height, mask):
+        return hashlib.sha256(json.dumps([
+            quantized, width, height, mask and _load_mask(mask)[1],
+            os.path.basename(self.font_path), os.path.getsize(self.font_path),
+            self.step, self.max_words, self.random_state,
+        ], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _remember(self, key, layout):
+        self._layouts[key] = layout
+        self._layouts.move_to_end(key)
+        while len(self._layouts) > self.memory_items:
+            self._layouts.popitem(last=False)
+
+    def layout(self, frequencies, width=1000, height=600, mask=None):
+        """排版结果 [(词, 频率), 字号, 位置, 方向, 颜色]，量化后的词频相同时复用"""
+        from PIL import Image
+
+        quantized = quantize(frequencies, self.step, self.max_words)
+        key = self._key(quantized, width, height, mask)
+        if key in self._layouts:
+            self.stats['hits'] += 1
+            self._layouts.move_to_end(key)
+            return self._layouts[key]
+        path = self.cache_dir and os.path.join(self.cache_dir, key + '.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                rows = json.load(f)
+            self.stats['disk_hits'] += 1
+        except (TypeError, OSError, ValueError):
+            # 由量化后的词频排版，保证同一个键总是对应同一份排版
+            weights = {word: (1 + self.step) ** level for word, level in quantized}
+            wc = self._wordcloud(width, height, mask).generate_from_frequencies(weights)
+            rows = [[word, freq, size, [int(x), int(y)],
+                     None if orientation is None else int(orientation), color]
+                    for (word, freq), size, (x, y), orientation, color in wc.layout_]
+            self.stats['misses'] += 1
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = '{}.{}.tmp'.format(path, os.getpid())  # 多个工作进程可能同时写同一个键
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(rows, f, ensure_ascii=False)
+                os.replace(tmp, path)
+        layout = [((word, freq), size, tuple(position),
+                   None if orientation is None else Image.Transpose(orientation), color)
+                  for word, freq, size, position, orientation, color in rows]
+        self._remember(key, layout)
+        return layout
+
+    def render(self, frequencies, outputs):
+        """按 outputs（CloudOutput 列表）输出词云图，返回输出路径列表
+
+        没有蒙版且宽高比相同的输出共用一次排版：在其中最小的尺寸上排版，
+        其余尺寸按比例放大绘制。
+        """
+        from PIL import Image
+
+        outputs = [CloudOutput(*output) if isinstance(output, tuple) else CloudOutput(output)
+                   for output in outputs]
+        groups = OrderedDict()
+        for output in outputs:
+            if output.mask is None:
+                group = (None, Fraction(output.width, output.height))
+            else:
+                group = (output.mask, None)
+            groups.setdefault(group, []).append(output)
+        for (mask, _), members in groups.items():
+            if mask is None:
+                base = min(members, key=lambda output: output.width)
+                width, height = base.width, base.height
+            else:
+                height, width = _load_mask(mask)[0].shape[:2]
+            layout = self.layout(frequencies, width, height, mask)
+            for output in members:
+                wc = self._wordcloud(width, height, mask, scale=output.width / width)
+                wc.layout_ = layout
+                image = wc.to_image()
+                directory = os.path.dirname(output.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                ext = os.path.splitext(output.path)[1].lower()
+                tmp = output.path + '.tmp'
+                image.save(tmp, format=Image.registered_extensions()[ext], optimize=True)
+                os.replace(tmp, output.path)
+        return [output.path for output in outputs]
+
+    def generate(self, frequencies, path, width=1000, height=600, mask=None):
+        """输出单张词云图"""
+        return self.render(frequencies, [CloudOutput(path, width, height, mask)])[0]
+
+
+@lru_cache(maxsize=None)
+def get_service(font_path=None, cache_dir=CACHE_DIR):
+    """进程内共用的 WordCloudService"""
+    return WordCloudService(font_path, cache_dir)
+
+
+_service = None  # 工作进程内的 WordCloudService
+
+
+def _init_worker(font_path, cache_dir):
+    global _service
+    _service = WordCloudService(font_path, cache_dir)
+
+
+def _render_job(job):
+    start = time.perf_counter()
+    paths = _service.render(job.frequencies, job.outputs)
+    return CloudResult(job.name, paths, time.perf_counter() - start)
+
+
+def render_batch(jobs, processes=None, font_path=None, cache_dir=CACHE_DIR,
+                 max_tasks_per_child=MAX_TASKS_PER_CHILD):
+    """在进程池中生成多组词云（CloudJob），按完成顺序逐个产出 CloudResult
+
+    jobs 可以是生成器：同时提交给进程池的任务不超过工作进程数的两倍，
+    词频不会一次全部序列化到队列里。processes=1 时在当前进程内依次生成。
+    """
+    if processes == 1:
+        _init_worker(font_path, cache_dir)
+        for job in jobs:
+            yield _render_job(job)
+        return
+    workers = processes or os.cpu_count() or 1
+    options = {}
+    if max_tasks_per_child and sys.version_info >= (3, 11):
+        options['max_tasks_per_child'] = max_tasks_per_child
+    # 流水线在工作线程中调用本函数，fork 会复制其他线程持有的锁，改用 spawn
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(find_font(font_path), cache_dir),
+                             mp_context=multiprocessing.get_context('spawn'), **options) as pool:
+        pending = set()
+        for job in jobs:
+            pending.add(pool.submit(_render_job, job))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
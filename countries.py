@@ -0,0 +1,97 @@
+# coding: utf-8
+"""国家名称中英文映射
+
+映射表保存在 country_names.json（中文名 -> pyecharts 世界地图英文名，另有别名表），
+启动时读取一次并缓存。名称先做 NFKC 规范化（全角括号转半角、去空白），
+再用一次 Series.map 完成整列查找；仍未匹配且不短于 FUZZY_MIN_LENGTH 个字的名称
+会尝试近似匹配（两三个字的中文名差一个字就是另一个国家，如“刚果”），每个近似
+匹配都列在统计中以便核对。最终未匹配的名称计入每次调用返回的统计，而不是被
+inner join 悄悄丢掉。
+索引（含近似匹配缓存）在进程内共用，统计不跨调用累积。
+"""
+
+import os
+import json
+import difflib
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+NAMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'country_names.json')
+FUZZY_CUTOFF = 0.8
+FUZZY_MIN_LENGTH = 4  # 短于该字数的名称不做近似匹配
+
+
+def normalize(name):
+    return ''.join(unicodedata.normalize('NFKC', name).split())
+
+
+def _normalize_series(series):
+    return series.astype(str).str.normalize('NFKC').str.replace(r'\s+', '', regex=True)
+
+
+class CountryIndex:
+    """规范化中文名 -> 英文名的哈希索引"""
+
+    def __init__(self, names, aliases=None):
+        self.names = dict(names)
+        self.aliases = dict(aliases or {})
+        self.table = {normalize(zh): en for zh, en in self.names.items()}
+        for alias, zh in self.aliases.items():
+            self.table[normalize(alias)] = self.names[zh]
+        self._fuzzy = {}  # 近似匹配到的索引名称，None 表示无匹配
+
+    @classmethod
+    def from_file(cls, path=NAMES_FILE):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['names'], data.get('aliases'))
+
+    def save(self, path=NAMES_FILE):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'names': self.names, 'aliases': self.aliases}, f,
+                      ensure_ascii=False, separators=(',', ':'))
+
+    def _fuzzy_match(self, key):
+        """key 近似匹配到的索引名称，没有时返回 None"""
+        if len(key) < FUZZY_MIN_LENGTH:
+            return None
+        if key not in self._fuzzy:
+            match = difflib.get_close_matches(key, self.table, n=1, cutoff=FUZZY_CUTOFF)
+            self._fuzzy[key] = match[0] if match else None
+        return self._fuzzy[key]
+
+    def resolve(self, series):
+        """把中文国家名整列映射为英文名，返回 (结果, 统计)，未匹配的位置为 NaN
+
+        统计为 {'matched', 'fuzzy', 'fuzzy_names', 'unmatched', 'unmatched_names'}，
+        fuzzy_names 为 {原名称: 近似匹配到的索引名称}，unmatched_names 按出现次数排序。
+        """
+        keys = _normalize_series(series)
+        result = keys.map(self.table)
+        missing = result.isna()
+        fuzzy, fuzzy_names = 0, {}
+        if missing.any():
+            matches = {key: self._fuzzy_match(key) for key in keys[missing].unique()}
+            matched = keys[missing].map(matches)
+            result[missing] = matched.map(self.table)
+            fuzzy = int(matched.notna().sum())
+            for name, key in zip(series[missing], matched):
+                if isinstance(key, str):
+                    fuzzy_names[name] = key
+        unmatched = series[result.isna()]
+        report = {'matched': int(result.notna().sum()), 'fuzzy': fuzzy,
+                  'fuzzy_names': fuzzy_names, 'unmatched': len(unmatched),
+                  'unmatched_names': [name for name, _ in Counter(unmatched).most_common()]}
+        return result, report
+
+    def translate(self, frame, column='country', target='英文'):
+        """返回 (附加英文名列的新表, 统计)，保留全部行"""
+        result, report = self.resolve(frame[column])
+        return frame.assign(**{target: result.to_numpy()}), report
+
+
+@lru_cache(maxsize=None)
+def load_country_index(path=NAMES_FILE):
+    """读取并缓存国家名称索引"""
+    return CountryIndex.from_file(path)
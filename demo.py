@@ -1,740 +1,559 @@
 #!/usr/bin/env python
 # coding: utf-8
+"""抓取腾讯新闻covid19的国内外疫情数据分析和制作词云图
+
+国家疫情防控一直严格把控，但是近期广州又新增许多新冠肺炎病例。因此，本文的目的是
+分析全国各地的疫情防控情况进行数据分析与挖掘。数据来自腾讯新闻公布的疫情数据：
+https://news.qq.com/zt2020/page/feiyan.htm#/
+
+用法：
+    python demo.py fetch            抓取数据，与缓存比对是否更新
+    python demo.py build            由缓存的数据生成表格快照与增量历史
+    python demo.py enrich           计算死亡率、治愈率并附加英文国家名
+    python demo.py render-maps      国内外现有确诊地图与死亡率柱状图
+    python demo.py render-squares   疫情方寸间
+    python demo.py wordcloud        疫情词云图
+    python demo.py all              执行以上全部步骤
+    python demo.py daemon           常驻运行，按自适应间隔重复 all
+    python demo.py serve            本地 HTTP 接口，提供最新数据的查询与图表
+
+各步骤组成流水线（见 pipeline.py），运行某一步时会先运行它所需的上游步骤；
+上游数据和参数都没有变化的步骤直接跳过，--force 强制重新运行。
+
+每个步骤只在运行时才导入自己需要的库（pandas、pyecharts、matplotlib、wordcloud），
+不依赖 IPython，可以直接放到 cron 中运行。
+"""
+
+import os
+import sys
+import argparse
+
+import profiling
+
+FEEDS = ['disease_h5', 'disease_foreign']
+CACHE_DIR = '.cache'
+STORE_DIR = 'snapshots'
+HISTORY_FILE = 'history.json'
+ASSET_ROOT = 'assets'
+PIPELINE_STATE = '.pipeline_state.json'
+CLOUD_DIR = 'wordclouds'
+CLOUD_SIZES = [(1000, 600), (400, 240)]
+ENRICHED = ('china_enriched', 'world_enriched')
 
-# # 背景描述
-# 
-# 国家疫情防控一直严格把控，但是近期广州又新增许多新冠肺炎病例。因此，本文的目的是分析全国各地的疫情防控情况进行数据分析与挖掘。
-# 
 
 # # 数据获取
 
-# ## 疫情数据获取
-# - 通过腾讯新闻公布的数据进行爬取
-# - 网址：https://news.qq.com/zt2020/page/feiyan.htm#/
-
-# In[516]:
-
-
-import time
-import json
-import requests
-import numpy as np
-import pandas as pd
-from datetime import datetime
-
-
-# In[517]:
-
-
 def Domestic():
     """国内疫情数据"""
-    url = 'https://view.inews.qq.com/g2/getOnsInfo?name=disease_h5'
-    response = requests.get(url=url).json()
-    data = json.loads(response['data'])
-    return data
+    from fetch import fetch_feed
+    return fetch_feed('disease_h5')
+
 
 def Oversea():
     """国外疫情数据"""
-    url = 'https://view.inews.qq.com/g2/getOnsInfo?name=disease_foreign'
-    response = requests.get(url=url).json()
-    data = json.loads(response['data'])
-    return data
-
-
-# In[518]:
-
-
-# 查看dict_keys
-domestic = Domestic()
-oversea = Oversea()
-print("domestic.keys: {}".format(domestic.keys()))
-print()
-print("oversea.keys: {}".format(oversea.keys()))
-
-
-# ## 疫情数据初步提取及分析
-
-# ### 国内疫情数据提取
-
-# In[519]:
-
-
-# 提取国内各地区数据明细
-areaTree = domestic['areaTree']
-lastUpdateTime = domestic['lastUpdateTime']
-# print(areaTree)
-china_data = areaTree[0]['children']
-china_list = []
-for a in range(len(china_data)):
-    province = china_data[a]['name']  
-    confirm = china_data[a]['total']['confirm'] 
-    heal = china_data[a]['total']['heal']  
-    dead = china_data[a]['total']['dead']  
-    nowConfirm = confirm - heal - dead 
-    china_dict = {} 
-    china_dict['province'] = province  # 地区
-    china_dict['nowConfirm'] = nowConfirm  # 现有 
-    china_dict['confirm'] = confirm  # 累计
-    china_dict['heal'] = heal  # 治愈
-    china_dict['dead'] = dead  # 死亡
-    china_list.append(china_dict) 
-
-china_data = pd.DataFrame(china_list) 
-china_data.to_excel("国内疫情.xlsx", index=False) #存储为EXCEL文件
-china_data.head()
-
-
-# ### 国外疫情数据获取
-
-# In[520]:
-
-
-foreignList = oversea['foreignList']
-foreign_data = foreignList
-foreign_list = []
-for a in range(len(foreign_data)):
-    # 提取数据
-    country = foreign_data[a]['name']
-    nowConfirm = foreign_data[a]['nowConfirm']  
-    confirm = foreign_data[a]['confirm']
-    dead = foreign_data[a]['dead']  
-    heal = foreign_data[a]['heal'] 
-    # 存放数据
-    foreign_dict = {}
-    foreign_dict['country'] = country
-    foreign_dict['nowConfirm'] = nowConfirm
-    foreign_dict['confirm'] = confirm
-    foreign_dict['dead'] = dead
-    foreign_dict['heal'] = heal
-    foreign_list.append(foreign_dict)
-
-foreign_data = pd.DataFrame(foreign_list)
-foreign_data.to_excel("国外疫情.xlsx", index=False)
-foreign_data.head()
-
-
-# ### 国内外疫情数据整合
-
-# 查询海外疫情数据中是否含有中国疫情数据
-
-# In[521]:
-
-
-foreign_data.loc[foreign_data['country'] == "中国"]
-
-
-# 从新增areaTree中提取中国数据，并添加至world_data
-
-# In[522]:
-
-
-confirm = areaTree[0]['total']['confirm']  # 提取中国累计确诊数据
-heal = areaTree[0]['total']['heal']  # 提取中国累计治愈数据
-dead = areaTree[0]['total']['dead']  # 提取中国累计死亡数据
-nowConfirm = confirm - heal - dead  # 计算中国现有确诊数量
-
-world_data = foreign_data.append(
-    {
-        'country': "中国",
-        'nowConfirm': nowConfirm,
-        'confirm': confirm,
-        'heal': heal,
-        'dead': dead
-    },
-    ignore_index=True)
-
-
-# 再次查询数据中是否含有中国疫情数据
-
-# In[523]:
-
-
-world_data.loc[world_data['country'] == "中国"]
+    from fetch import fetch_feed
+    return fetch_feed('disease_foreign')
+
+
+def fetch(args):
+    """各 feed 通过共享连接池并发抓取，并与磁盘缓存比对是否有更新
+
+    国内、海外两个 feed 是必需的，其中一个失败时本阶段失败；--feed 指定的额外 feed
+    失败时只报告并跳过（沿用缓存中上一次的数据），不影响后续阶段。
+    """
+    from cache import ResponseCache
+    from fetch import fetch_results
+
+    from pipeline import digest
+
+    cache = ResponseCache(CACHE_DIR)
+    names = FEEDS + [name for name in args.feed if name not in FEEDS]
+    feeds = fetch_results(names, cache=cache, return_exceptions=True)
+    cache.write_metrics()
+    for name in FEEDS:
+        if isinstance(feeds[name], BaseException):
+            raise feeds[name]
+    for name in names[len(FEEDS):]:
+        if isinstance(feeds[name], BaseException):
+            print("跳过 feed {}：{}: {}".format(name, type(feeds[name]).__name__, feeds[name]))
+            del feeds[name]
+    changed = any(result.changed for result in feeds.values())
+    print("lastUpdateTime: {}，数据{}".format(
+        feeds['disease_h5'].data.get('lastUpdateTime'), "已更新" if changed else "未更新"))
+    # 以缓存响应体的内容哈希作为本阶段的指纹
+    return digest(*(cache.meta(name)['sha256'] for name in feeds))
+
+
+# # 疫情数据初步提取及分析
+
+def load_feeds():
+    """读取缓存中最近一次抓取的数据，返回 (国内数据, 海外各国记录, 海外 lastUpdateTime)
+
+    国内数据整体解析（还要用到 lastUpdateTime 与中国整体的 total），海外只需要各国记录，
+    从缓存的响应体中逐条流式读出，不再解析成整棵对象树。海外数据自己的
+    lastUpdateTime 在记录读完后才能取到，所以返回的是一个取值函数；
+    海外 feed 不带该字段时取国内的 lastUpdateTime。
+    """
+    from cache import ResponseCache
+    from fetch import parse_body
+    from stream import LAST_UPDATE_TIME, iter_file_chunks, iter_payload_records
+
+    cache = ResponseCache(CACHE_DIR)
+    domestic = cache.load('disease_h5', parse_body)
+    foreign_path = cache.body_path('disease_foreign')
+    missing = [name for name, value in zip(FEEDS, (domestic, foreign_path)) if value is None]
+    if missing:
+        raise SystemExit("缓存中没有 {} 的数据，请先运行 fetch".format(', '.join(missing)))
+    captured = dict.fromkeys([LAST_UPDATE_TIME])
+    countries = iter_payload_records(iter_file_chunks(foreign_path), 'disease_foreign', captured)
+    return domestic, countries, lambda: captured[LAST_UPDATE_TIME] or domestic['lastUpdateTime']
+
+
+def build(args):
+    """提取国内各地区、海外各国数据，追加快照并更新增量历史"""
+    from extract import extract_domestic, extract_world
+    from history import HistoryEngine
+    from pipeline import digest, file_digest
+    from store import SnapshotStore, export_excel
+
+    domestic, countries, foreign_time = load_feeds()
+    areaTree = domestic['areaTree']
+    lastUpdateTime = domestic['lastUpdateTime']
+
+    # 国内各地区数据明细与海外各国数据；各表都是 RegionStats 上的视图，数字只保存一份
+    provinces, cities = extract_domestic(areaTree[0]['children'])
+    china_data = provinces.to_frame('province')
+    city_data = cities.to_frame('city', 'province')
+    # 海外疫情数据中不含中国，从areaTree中提取中国数据放在world最后一行
+    world = extract_world(countries, areaTree)
+    world_data = world.to_frame('country', 'continent')
+    foreign_data = world[:-1].to_frame('country', 'continent')
+    # 海外数据可能单独更新，foreign、world 按海外 feed 自己的 lastUpdateTime 追加快照
+    foreignUpdateTime = foreign_time()
+
+    store = SnapshotStore(STORE_DIR)
+    paths = [store.write('china', china_data, lastUpdateTime),  # 按 lastUpdateTime 追加快照
+             store.write('cities', city_data, lastUpdateTime),
+             store.write('foreign', foreign_data, foreignUpdateTime),
+             store.write('world', world_data, foreignUpdateTime)]
+    if args.feed:
+        build_extra_feeds(args.feed, store)
+    if args.excel:
+        with profiling.stage('build.excel'):
+            export_excel(china_data, "国内疫情.xlsx")
+            export_excel(foreign_data, "国外疫情.xlsx")
+
+    # 增量更新每个地区的新增数与 7/14 日滚动汇总
+    with profiling.stage('build.history'):
+        if os.path.exists(HISTORY_FILE):
+            history = HistoryEngine.load(HISTORY_FILE)
+        else:
+            history = HistoryEngine.from_store(store)
+        china_delta = history.ingest('china', china_data, lastUpdateTime)
+        foreign_delta = history.ingest('foreign', foreign_data, foreignUpdateTime)
+        history.save(HISTORY_FILE)
+    print("{} 个省份、{} 个国家的数据有变化".format(len(china_delta), len(foreign_delta)))
+    # 指纹取自快照库中实际保存的文件，而不是内存中的表
+    return digest(*(file_digest(path) for path in paths))
+
+
+def build_extra_feeds(names, store):
+    """其他 getOnsInfo feed 按 backfill 中注册的（或通用的）规则提取后写入快照库
+
+    某个 feed 出错（缺少 lastUpdateTime、pyarrow 写不出的列等）时报告并跳过它。
+    """
+    from backfill import FILE_ERRORS, extract
+    from cache import ResponseCache
+    from fetch import parse_body
+
+    cache = ResponseCache(CACHE_DIR)
+    for name in names:
+        data = cache.load(name, parse_body)
+        if data is None or name in FEEDS:
+            continue
+        try:
+            for kind, frame in extract(name, data).items():
+                store.write(kind, frame, data['lastUpdateTime'])
+        except FILE_ERRORS as exc:
+            print("跳过 feed {}：{}: {}".format(name, type(exc).__name__, exc))
+
+
+def load_frames(kinds=('china', 'world')):
+    """读取最新的国内、世界数据快照"""
+    from store import SnapshotStore
+
+    store = SnapshotStore(STORE_DIR)
+    frames = [store.read(kind) for kind in kinds]
+    if any(frame is None for frame in frames):
+        raise SystemExit("没有 {} 数据快照，请先运行 build".format('/'.join(kinds)))
+    return frames
+
+
+def enrich(args):
+    """计算死亡率、治愈率并附加英文国家名"""
+    from pipeline import frame_digest
+    from rates import rate_metrics
+    from store import SnapshotStore
+
+    store = SnapshotStore(STORE_DIR)
+    china_data, world_data = load_frames()
+    china_data = rate_metrics(china_data)
+    world_data = rate_metrics(world_data)
+    with profiling.stage('enrich.translate'):
+        world_data = translate_world(world_data)
+    store.write('china_enriched', china_data, store.snapshots('china')[-1][0], overwrite=True)
+    store.write('world_enriched', world_data, store.snapshots('world')[-1][0], overwrite=True)
+    return frame_digest(china_data, world_data)
 
 
 # # 总结与展示
 
-# In[524]:
-
-
-import pyecharts
-import pyecharts.options as opts
-from pyecharts.charts import Map
-from pyecharts.globals import CurrentConfig, NotebookType
-CurrentConfig.NOTEBOOK_TYPE = NotebookType.JUPYTER_LAB
-from pyecharts.commons.utils import JsCode
-CurrentConfig.ONLINE_HOST ='https://assets.pyecharts.org/assets/'
-
-
 # ## 疫情态势可视化
 
-# ### 国内疫情可视化
-
-# 国内各地区现有确诊人数地图
-
-# In[525]:
-
-
-m = Map()
-m.load_javascript()
-m.add("", [
-    list(z)
-    for z in zip(list(china_data["province"]), list(china_data["nowConfirm"]))
-],
-      maptype="china",
-      is_map_symbol_show=False)
-m.set_global_opts(
-    title_opts=opts.TitleOpts(title="COVID-19中国现有地区现有确诊人数地图"),
-    visualmap_opts=opts.VisualMapOpts(
-        is_piecewise=True,
-        pieces=[
-            {
-                "min": 5000,
-                "label": '>5000',
-                "color": "#893448"
-            },  # 不指定 max，表示 max 为无限大
-            {
-                "min": 1000,
-                "max": 4999,
-                "label": '1000-4999',
-                "color": "#ff585e"
-            },
-            {
-                "min": 500,
-                "max": 999,
-                "label": '500-1000',
-                "color": "#fb8146"
-            },
-            {
-                "min": 101,
-                "max": 499,
-                "label": '101-499',
-                "color": "#ffA500"
-            },
-            {
-                "min": 10,
-                "max": 100,
-                "label": '10-100',
-                "color": "#ffb248"
-            },
-            {
-                "min": 1,
-                "max": 9,
-                "label": '1-9',
-                "color": "#fff2d1"
-            },
-            {
-                "max": 1,
-                "label": '0',
-                "color": "#ffffff"
-            }
-        ]))
-
-# 保存动图的html文件
-m.render('country.html')
-
-
-# In[526]:
-
-
-m.load_javascript();
-
-
-# pyecharts 使用的所有静态资源文件存放于 pyecharts-assets 项目中，默认挂载在 https://assets.pyecharts.org/assets/
-# 
-# 但是我在写的时候电脑无法打开上面这个网页，所以我直接render()保存为html文件
-
-# In[527]:
-
-
-m.render_notebook()
-
-
-# ### 国际疫情可视化
-
-# In[528]:
-
-
-# 国家名称中英文映射表,已根据疫情数据中的中文名称进行对应矫正，操作较为麻烦，目前尚有一些缺失国家及地区。
-name_dict = {'Liechtenstein': '列支敦士登', 'Morocco': '摩洛哥', 'W. Sahara': '西撒哈拉', 'Serbia': '塞尔维亚', 'Afghanistan': '阿富汗',
-                'Angola': '安哥拉', 'Albania': '阿尔巴尼亚', 'Aland': '奥兰群岛', 'Andorra': '安道尔',
-                'United Arab Emirates': '阿联酋', 'Argentina': '阿根廷', 'Armenia': '亚美尼亚', 'American Samoa': '美属萨摩亚',
-                'Fr. S. Antarctic Lands': '法属南半球和南极领地', 'Antigua and Barb.': '安提瓜和巴布达', 'Australia': '澳大利亚',
-                'Austria': '奥地利', 'Azerbaijan': '阿塞拜疆', 'Burundi': '布隆迪', 'Belgium': '比利时', 'Benin': '贝宁',
-                'Burkina Faso': '布基纳法索', 'Bangladesh': '孟加拉国', 'Bulgaria': '保加利亚', 'Bahrain': '巴林', 'Bahamas': '巴哈马',
-                'Bosnia and Herz.': '波黑', 'Belarus': '白俄罗斯', 'Belize': '伯利兹', 'Bermuda': '百慕大', 'Bolivia': '玻利维亚',
-                'Brazil': '巴西', 'Barbados': '巴巴多斯', 'Brunei': '文莱', 'Bhutan': '不丹', 'Botswana': '博茨瓦纳',
-                'Central African Rep.': '中非', 'Canada': '加拿大', 'Switzerland': '瑞士', 'Chile': '智利', 'China': '中国',
-                "Côte d'Ivoire": '科特迪瓦', 'Cameroon': '喀麦隆', 'Dem. Rep. Congo': '刚果（布）', 'Congo': '刚果（金）',
-                'Colombia': '哥伦比亚', 'Comoros': '科摩罗', 'Cape Verde': '佛得角', 'Costa Rica': '哥斯达黎加', 'Cuba': '古巴',
-                'Curaçao': '库拉索', 'Cayman Is.': '开曼群岛', 'N. Cyprus': '北塞浦路斯', 'Cyprus': '塞浦路斯', 'Czech Rep.': '捷克',
-                'Germany': '德国', 'Djibouti': '吉布提', 'Denmark': '丹麦', 'Dominican Rep.': '多米尼加',
-                'Algeria': '阿尔及利亚', 'Ecuador': '厄瓜多尔', 'Egypt': '埃及', 'Eritrea': '厄立特里亚', 'Spain': '西班牙',
-                'Estonia': '爱沙尼亚', 'Ethiopia': '埃塞俄比亚', 'Finland': '芬兰', 'Fiji': '斐济', 'Falkland Is.': '福克兰群岛（马尔维纳斯）',
-                'France': '法国', 'Faeroe Is.': '法罗群岛', 'Micronesia': '密克罗尼西亚', 'Gabon': '加蓬', 'United Kingdom': '英国',
-                'Georgia': '格鲁吉亚', 'Ghana': '加纳', 'Guinea': '几内亚', 'Gambia': '冈比亚', 'Guinea-Bissau': '几内亚比绍',
-                'Eq. Guinea': '赤道几内亚', 'Greece': '希腊', 'Grenada': '格林纳达', 'Greenland': '格陵兰', 'Guatemala': '危地马拉',
-                'Guam': '关岛', 'Heard I. and McDonald Is.': '赫德岛和麦克唐纳群岛', 'Honduras': '洪都拉斯',
-                'Croatia': '克罗地亚', 'Haiti': '海地', 'Hungary': '匈牙利', 'Indonesia': '印度尼西亚', 'Isle of Man': '英国属地曼岛',
-                'India': '印度', 'Br. Indian Ocean Ter.': '英属印度洋领土', 'Ireland': '爱尔兰', 'Iran': '伊朗', 'Iraq': '伊拉克',
-                'Iceland': '冰岛', 'Israel': '以色列', 'Italy': '意大利', 'Jamaica': '牙买加', 'Jersey': '泽西岛', 'Jordan': '约旦',
-                'Japan': '日本', 'Siachen Glacier': '锡亚琴冰川', 'Kazakhstan': '哈萨克斯坦', 'Kenya': '肯尼亚',
-                'Kyrgyzstan': '吉尔吉斯斯坦', 'Cambodia': '柬埔寨', 'Kiribati': '基里巴斯', 'Korea': '韩国', 'Kuwait': '科威特',
-                'Lao PDR': '老挝', 'Lebanon': '黎巴嫩', 'Liberia': '利比里亚', 'Libya': '利比亚', 'Saint Lucia': '圣卢西亚',
-                'Sri Lanka': '斯里兰卡', 'Lesotho': '莱索托', 'Lithuania': '立陶宛', 'Luxembourg': '卢森堡', 'Latvia': '拉脱维亚',
-                'Moldova': '摩尔多瓦', 'Madagascar': '马达加斯加', 'Mexico': '墨西哥', 'Macedonia': '北马其顿', 'Mali': '马里',
-                'Malta': '马耳他', 'Myanmar': '缅甸', 'Montenegro': '黑山', 'Mongolia': '蒙古', 'N. Mariana Is.': '北马里亚纳',
-                'Mozambique': '莫桑比克', 'Mauritania': '毛利塔尼亚', 'Montserrat': '蒙特塞拉特', 'Mauritius': '毛里求斯',
-                'Malawi': '马拉维', 'Malaysia': '马来西亚', 'Namibia': '纳米比亚', 'New Caledonia': '新喀里多尼亚', 'Niger': '尼日尔',
-                'Nigeria': '尼日利亚', 'Nicaragua': '尼加拉瓜', 'Niue': '纽埃', 'Netherlands': '荷兰', 'Norway': '挪威',
-                'Nepal': '尼泊尔', 'New Zealand': '新西兰', 'Oman': '阿曼', 'Pakistan': '巴基斯坦', 'Panama': '巴拿马', 'Peru': '秘鲁',
-                'Philippines': '菲律宾', 'Palau': '帕劳', 'Papua New Guinea': '巴布亚新几内亚', 'Poland': '波兰',
-                'Puerto Rico': '波多黎各', 'Dem. Rep. Korea': '朝鲜', 'Portugal': '葡萄牙', 'Paraguay': '巴拉圭',
-                'Palestine': '巴勒斯坦', 'Fr. Polynesia': '法属波利尼西亚', 'Qatar': '卡塔尔', 'Romania': '罗马尼亚', 'Russia': '俄罗斯',
-                'Rwanda': '卢旺达', 'Saudi Arabia': '沙特阿拉伯', 'Sudan': '苏丹', 'S. Sudan': '南苏丹', 'Senegal': '塞内加尔',
-                'Singapore': '新加坡', 'S. Geo. and S. Sandw. Is.': '南乔治亚岛和南桑威奇群岛', 'Saint Helena': '圣赫勒拿',
-                'Solomon Is.': '所罗门群岛', 'Sierra Leone': '塞拉利昂', 'El Salvador': '萨尔瓦多',
-                'St. Pierre and Miquelon': '圣皮埃尔和密克隆', 'São Tomé and Principe': '圣多美和普林西比', 'Suriname': '苏里南',
-                'Slovakia': '斯洛伐克', 'Slovenia': '斯洛文尼亚', 'Sweden': '瑞典', 'Swaziland': '斯威士兰', 'Seychelles': '塞舌尔',
-                'Syria': '叙利亚', 'Turks and Caicos Is.': '特克斯和凯科斯群岛', 'Chad': '乍得', 'Togo': '多哥', 'Thailand': '泰国',
-                'Tajikistan': '塔吉克斯坦', 'Turkmenistan': '土库曼斯坦', 'Timor-Leste': '东帝汶', 'Tonga': '汤加',
-                'Trinidad and Tobago': '特立尼达和多巴哥', 'Tunisia': '突尼斯', 'Turkey': '土耳其', 'Tanzania': '坦桑尼亚',
-                'Uganda': '乌干达', 'Ukraine': '乌克兰', 'Uruguay': '乌拉圭', 'United States': '美国', 'Uzbekistan': '乌兹别克斯坦',
-                'St. Vin. and Gren.': '圣文森特和格林纳丁斯', 'Venezuela': '委内瑞拉', 'U.S. Virgin Is.': '美属维尔京群岛', 'Vietnam': '越南',
-                'Vanuatu': '瓦努阿图', 'Samoa': '萨摩亚', 'Yemen': '也门', 'South Africa': '南非', 'Zambia': '赞比亚',
-                'Zimbabwe': '津巴布韦', 'Somalia': '索马里', "Anguilla": "安圭拉", 'Dominica': '多米尼克','Gibraltar': '直布罗陀',
-                'Guyana': '圭亚那','Saint Kitts and Nevis': '圣基茨和尼维斯','Monaco': '摩纳哥','Maldives': '马尔代夫','San Marino': '圣马力诺',
-                'Vatican City': '梵蒂冈','British Virgin Islands': '英属维尔京群岛'}
-
-
-# In[529]:
-
-
-name_df = pd.DataFrame(name_dict,index=[0]).T
-name_df.columns = ['中文']
-name_df.reset_index(inplace=True)
-name_df.rename(columns={'index':'英文'}, inplace=True)
-
-
-# In[530]:
-
-
-world_data_t = pd.merge(world_data,
-                        name_df,
-                        left_on="country",
-                        right_on="中文",
-                        how="inner")
-
-world_data_t
-
-
-# 世界各国现有确诊人数地图
-
-# In[531]:
-
-
-m2 = Map()
-m2.add("", [
-    list(z)
-    for z in zip(list(world_data_t["英文"]), list(world_data_t["nowConfirm"]))
-],
-       maptype="world",
-       is_map_symbol_show=False)
-m2.set_global_opts(title_opts=opts.TitleOpts(title="COVID-19世界各国现有确诊人数地图"),
-                   visualmap_opts=opts.VisualMapOpts(is_piecewise=True,
-                                                     pieces=[{
-                                                         "min": 20000,
-                                                         "label": '>20000',
-                                                         "color": "#893448"
-                                                     }, {
-                                                         "min": 10000,
-                                                         "max": 19999,
-                                                         "label": '10000-19999',
-                                                         "color": "#ff585e"
-                                                     }, {
-                                                         "min": 5000,
-                                                         "max": 9999,
-                                                         "label": '5000-9999',
-                                                         "color": "#fb8146"
-                                                     }, {
-                                                         "min": 1001,
-                                                         "max": 4999,
-                                                         "label": '1001-4999',
-                                                         "color": "#ffA500"
-                                                     }, {
-                                                         "min": 100,
-                                                         "max": 1000,
-                                                         "label": '100-1000',
-                                                         "color": "#ffb248"
-                                                     }, {
-                                                         "min": 0,
-                                                         "max": 99,
-                                                         "label": '0-99',
-                                                         "color": "#fff2d1"
-                                                     }]))
-"""取消显示国家名称"""
-m2.set_series_opts(label_opts=opts.LabelOpts(is_show=False))
-m2.render('world.html')
+# 地图的分段配色按当前 nowConfirm 的分布计算（binning.METHODS），段数为 MAP_BINS
+MAP_BINS = 6
+
+
+def translate_world(world_data):
+    """附加英文国家名；未能匹配的国家会统计出来（写入 --metrics），而不是被丢弃"""
+    from countries import load_country_index
+
+    world_data_t, report = load_country_index().translate(world_data, column='country',
+                                                          target='英文')
+    for result in ('matched', 'fuzzy', 'unmatched'):
+        profiling.gauge('country_names', report[result], result=result)
+    if report['fuzzy_names']:
+        print("近似匹配的国家：{}".format('、'.join(
+            '{} -> {}'.format(name, key) for name, key in report['fuzzy_names'].items())))
+    if report['unmatched_names']:
+        print("未匹配的国家：{}".format('、'.join(report['unmatched_names'])))
+    return world_data_t
+
+
+def death_rates(china, world):
+    """用于死亡率分析的省份与国家（china、world 为 query.Query）"""
+    # 治愈率小于等于1.00且死亡率大于0.00的省份，按治愈率从高到低
+    china_rates = china.where(china['healRate'] <= 1, china['deadRate'] > 0.00) \
+        .sort("healRate", ascending=False)
+    # 治愈率小于0.90且死亡率大于0.00的国家，按死亡率从高到低
+    world_rates = world.where(world['healRate'] < 0.90, world['deadRate'] > 0.00) \
+        .sort("deadRate", ascending=False)
+    return china_rates, world_rates
+
+
+# 各快照中确定一个地区的列：城市名不唯一（如各省都有“境外输入”），要连同省份一起
+RANK_COLUMNS = {'china_enriched': 'province', 'world_enriched': 'country',
+                'cities': ('province', 'city')}
+_rankings = {}  # 快照类型 -> RankingIndex，常驻进程中跨轮增量更新
+
+
+def load_queries(kinds=ENRICHED):
+    """最新快照上的 Query，各输出阶段都通过它按行号读取，不复制表格"""
+    from query import Query
+    from ranking import RankingIndex
+
+    queries = []
+    for kind, frame in zip(kinds, load_frames(kinds)):
+        ranking = _rankings.setdefault(kind, RankingIndex())
+        ranking.update(frame, RANK_COLUMNS[kind])
+        queries.append(Query(frame, ranking))
+    return queries
+
+
+def render_maps(args):
+    """国内外现有确诊人数地图与死亡率柱状图"""
+    from assets import vendor_assets
+    from binning import pieces
+    from render import ONLINE_HOST, ChartSpec, render_charts
+
+    china, world = load_queries()
+    mapped = world.where(world.frame["英文"].notna().to_numpy())
+    china_rates, world_rates = death_rates(china, world)
+
+    specs = [
+        ChartSpec(
+            kind='map',
+            path='country.html',
+            title="COVID-19中国现有地区现有确诊人数地图",
+            data=china.view().pairs("province", "nowConfirm"),
+            maptype="china",
+            pieces=pieces(china['nowConfirm'], args.binning, MAP_BINS)),
+        ChartSpec(
+            kind='map',
+            path='world.html',
+            title="COVID-19世界各国现有确诊人数地图",
+            data=mapped.pairs("英文", "nowConfirm"),
+            maptype="world",
+            pieces=pieces(mapped['nowConfirm'], args.binning, MAP_BINS),
+            show_label=False),  # 取消显示国家名称
+        ChartSpec(
+            kind='bar',
+            path='中国各省 COVID-19 死亡率.html',
+            title="中国各省 COVID-19 死亡率",
+            data=china_rates.pairs('province', 'healRate', '.2f'),
+            series_name="中国",
+            width="900px",
+            height="400px",
+            x_rotate=45),
+        ChartSpec(
+            kind='bar',
+            path='世界COVID-19 People Dead Rate.html',
+            title="世界各国 COVID-19 死亡率",
+            data=world_rates.pairs('country', 'deadRate', '.2f'),
+            series_name="世界",
+            width="3500px",
+            height="800px",
+            x_rotate=90,
+            y_rotate=45),
+    ]
+
+    # pyecharts 的静态资源默认挂载在 https://assets.pyecharts.org/assets/，该地址经常无法访问，
+    # 所以 echarts 与地图脚本只在第一次运行时复制到 assets/（按内容哈希命名），之后离线也能打开；
+    # 来源默认为该地址，离线环境用 --assets-source 指向本地的 pyecharts-assets
+    asset_root = None
+    if not args.online_assets:
+        source = args.assets_source or ONLINE_HOST
+        with profiling.stage('render-maps.assets'):
+            try:
+                vendor_assets(root=ASSET_ROOT, source=source)
+            except OSError as exc:
+                raise SystemExit(
+                    "无法从 {} 获取 echarts 与地图脚本（{}）。\n"
+                    "离线运行时可以：用 --assets-source 指向本地 pyecharts-assets 仓库中的 "
+                    "assets 目录；或把已准备好的 {}/ 目录（含 manifest.json）复制到当前目录；"
+                    "或加 --online-assets 让页面直接引用在线脚本。".format(
+                        source, exc, ASSET_ROOT))
+        asset_root = ASSET_ROOT
+    for result in render_charts(specs, asset_root=asset_root):
+        print("{}: {:.1f} ms".format(result.path, result.seconds * 1000))
 
 
 # ## 疫情方寸间
 
-# ### 国内疫情方寸间
-
-# In[532]:
-
-
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-get_ipython().run_line_magic('matplotlib', 'inline')
-
-
-# 单独取出中国疫情数据
-
-# In[533]:
-
-
-China_data = world_data.loc[world_data['country'] == "中国"]  # 单独取出中国疫情数据
-China_data.reset_index(drop=True, inplace=True)  # 使索引从0开始递增
-China_data
-
-
-# 提取China_data的累计确诊、累计治愈与累计死亡数据
-
-# In[534]:
-
-
-# 提取China_data的累计确诊、累计治愈与累计死亡数据
-# data.at[n,'name']代表根据行索引和列名，获取对应元素的值
-w_confirm = China_data.at[0, 'confirm']
-w_heal = China_data.at[0, 'heal']
-w_dead = China_data.at[0, 'dead']
-
-
-# 国内疫情方寸间
-
-# In[535]:
-
-
-fig1 = plt.figure()
-
-ax1 = fig1.add_subplot(111, aspect='equal', facecolor='#fafaf0')
-ax1.set_xlim(-w_confirm / 2, w_confirm / 2)
-ax1.set_ylim(-w_confirm / 2, w_confirm / 2)
-ax1.spines['top'].set_color('none')
-ax1.spines['right'].set_color('none')
-ax1.spines['bottom'].set_position(('data', 0))
-ax1.spines['left'].set_position(('data', 0))
-ax1.set_xticks([])
-ax1.set_yticks([])
-
-p0 = patches.Rectangle((-w_confirm / 2, -w_confirm / 2),
-                       width=w_confirm,
-                       height=w_confirm,
-                       facecolor='#29648c',
-                       label='confirm')
-p1 = patches.Rectangle((-w_heal / 2, -w_heal / 2),
-                       width=w_heal,
-                       height=w_heal,
-                       facecolor='#69c864',
-                       label='heal')
-p2 = patches.Rectangle((-w_dead / 2, -w_dead / 2),
-                       width=w_dead,
-                       height=w_dead,
-                       facecolor='#000000',
-                       label='dead')
-
-plt.gca().add_patch(p0)
-plt.gca().add_patch(p1)
-plt.gca().add_patch(p2)
-plt.title('COVID-19 Square - China', fontdict={'size': 20})
-plt.legend(loc='best')
-plt.show()
-
-
-# 国内各省疫情方寸间
-
-# 重新排序数据
-
-# In[536]:
-
-
-china_data.sort_values("confirm", ascending=False, inplace=True)
-china_data.reset_index(drop=True, inplace=True)
-china_data
-
-
-# In[537]:
+def render_squares_stage(args):
+    """中国、国内各省与国际各国的疫情方寸间"""
+    from squares import render_squares
 
+    china, world = load_queries()
 
-plt.rcParams['font.sans-serif'] = [u'SimHei']
-plt.rcParams['axes.unicode_minus'] = False
-fig1 = plt.figure(figsize=(25, 25))
-for a in range(25):
+    # 单独取出中国疫情数据，其累计确诊数作为各省方寸图每格的尺寸
+    china_total = world.where(world['country'] == "中国")
+    w_confirm = china_total['confirm'][0]
+    render_squares(china_total, '中国疫情方寸间.png', 'country', cols=1,
+                   title='COVID-19 Square - China')
 
-    c_confirm = china_data.at[a, 'confirm']
-    c_heal = china_data.at[a, 'heal']
-    c_dead = china_data.at[a, 'dead']
-    ax1 = fig1.add_subplot(25 / 5,
-                           5,
-                           a + 1,
-                           aspect='equal',
-                           facecolor='#fafaf0')
-    ax1.set_xlim(-w_confirm / 2, w_confirm / 2)
-    ax1.set_ylim(-w_confirm / 2, w_confirm / 2)
+    # 前25个省份
+    render_squares(china.top("confirm", 25), '国内各省疫情方寸间.png',
+                   'province', cols=5, scale=w_confirm)
 
-    ax1.spines['top'].set_color('none')
-    ax1.spines['right'].set_color('none')
-    ax1.spines['bottom'].set_position(('data', 0))
-    ax1.spines['left'].set_position(('data', 0))
-    ax1.set_xticks([])
-    ax1.set_yticks([])
-    p0 = patches.Rectangle((-w_confirm / 2, -w_confirm / 2),
-                           width=w_confirm,
-                           height=w_confirm,
-                           alpha=1,
-                           facecolor='#29648c',
-                           label='confirm')
-    p1 = patches.Rectangle((-w_heal / 2, -w_heal / 2),
-                           width=w_heal,
-                           height=w_heal,
-                           alpha=1,
-                           facecolor='#69c864',
-                           label='heal')
-    p2 = patches.Rectangle((-w_dead / 2, -w_dead / 2),
-                           width=w_dead,
-                           height=w_dead,
-                           alpha=1,
-                           facecolor='black',
-                           label='dead')
-    plt.gca().add_patch(p0)
-    plt.gca().add_patch(p1)
-    plt.gca().add_patch(p2)
-
-
-    plt.title(china_data.at[a, 'province'], fontdict={'size': 20})
-
-
-    plt.legend(loc='best')
-plt.show()
-
-
-# ### 国际疫情方寸间
-
-# 重新排序数据
-
-# In[538]:
-
-
-world_data_t.sort_values("confirm", ascending=False, inplace=True)
-world_data_t.reset_index(drop=True, inplace=True)
-world_data_t
-
-
-# 国际各国疫情方寸间
-
-# In[539]:
-
-
-plt.rcParams['font.sans-serif'] = [u'SimHei']
-plt.rcParams['axes.unicode_minus'] = False
-fig1 = plt.figure(figsize=(25, 25))
-for a in range(20):
-
-    w_confirm = world_data.at[a, 'confirm']
-    w_heal = world_data.at[a, 'heal']
-    w_dead = world_data.at[a, 'dead']
-    ax1 = fig1.add_subplot(20 / 4,
-                           4,
-                           a + 1,
-                           aspect='equal',
-                           facecolor='#fafaf0')
-    ax1.set_xlim(-w_confirm / 2, w_confirm / 2)
-    ax1.set_ylim(-w_confirm / 2, w_confirm / 2)
-
-    ax1.spines['top'].set_color('none')
-    ax1.spines['right'].set_color('none')
-    ax1.spines['bottom'].set_position(('data', 0))
-    ax1.spines['left'].set_position(('data', 0))
-    ax1.set_xticks([])
-    ax1.set_yticks([])
-    p0 = patches.Rectangle((-w_confirm / 2, -w_confirm / 2),
-                           width=w_confirm,
-                           height=w_confirm,
-                           alpha=1,
-                           facecolor='#29648c',
-                           label='confirm')
-    p1 = patches.Rectangle((-w_heal / 2, -w_heal / 2),
-                           width=w_heal,
-                           height=w_heal,
-                           alpha=1,
-                           facecolor='#69c864',
-                           label='heal')
-    p2 = patches.Rectangle((-w_dead / 2, -w_dead / 2),
-                           width=w_dead,
-                           height=w_dead,
-                           alpha=1,
-                           facecolor='black',
-                           label='dead')
-    plt.gca().add_patch(p0)
-    plt.gca().add_patch(p1)
-    plt.gca().add_patch(p2)
-
-
-    plt.title(world_data_t.at[a, '英文'], fontdict={'size': 20})
-
-
-    plt.legend(loc='best')
-plt.show()
-
-
-# ## 疫情死亡率分析
-
-# ### 国内各省疫情死亡率分析
-
-# In[540]:
-
-
-china_data['deadRate'] = [0.0 for _ in range(len(china_data))]
-china_data['healRate'] = [0.0 for _ in range(len(china_data))]
-
-for i in range(len(china_data)):
-    china_data['deadRate'][i] = china_data['dead'][i] / china_data['confirm'][i]
-    china_data['healRate'][i] = china_data['heal'][i] / china_data['confirm'][i]
-
-# 查看治愈率小于1.00且死亡率大于0.00的省份
-china_data = china_data[china_data['healRate']<=1]
-china_data = china_data[china_data['deadRate']>0.00]
-china_data.sort_values("healRate", ascending=False, inplace=True)
-china_data
-
-
-# In[541]:
-
-
-from pyecharts.charts import Bar
-
-print(china_data)
-attr, value = list(china_data['province']), list(china_data['healRate'])
-value = [format(i, '.2f') for i in value]
-print(attr, '\n', value)
-bar = Bar(init_opts=opts.InitOpts(width="900px", height="400px"))
-bar.add_xaxis(attr)
-bar.add_yaxis("中国", value)
-bar.set_global_opts(title_opts=opts.TitleOpts(title="中国各省 COVID-19 死亡率"),
-                   xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=45)))
-
-bar.load_javascript();
-
-
-# In[542]:
-
-
-# 保存html文件
-bar.render('中国各省 COVID-19 死亡率.html')
-
-
-# In[543]:
-
-
-bar.render_notebook()
-
-
-# ### 国际各国疫情死亡率分析
-
-# In[544]:
-
-
-world_data['deadRate'] = [0.0 for _ in range(len(world_data))]
-world_data['healRate'] = [0.0 for _ in range(len(world_data))]
-
-for i in range(len(world_data)):
-    world_data['deadRate'][i] = world_data['dead'][i] / world_data['confirm'][i]
-    world_data['healRate'][i] = world_data['heal'][i] / world_data['confirm'][i]
-
-# 查看治愈率小于1.00且死亡率大于0.00的国家
-world_data = world_data[world_data['healRate']<0.90]
-world_data = world_data[world_data['deadRate']>0.00]
-world_data.sort_values("deadRate", ascending=False, inplace=True)
-
-
-# In[545]:
-
-
-world_data
-
-
-# In[546]:
-
-
-from pyecharts.charts import Bar
-attr, value = list(world_data['country']), list(world_data['deadRate'])
-value = [format(i, '.2f') for i in value]
-print(attr, '\n', value)
-bar = Bar(init_opts=opts.InitOpts(width="3500px", height="800px"))
-bar.add_xaxis(attr)
-bar.add_yaxis("世界", value)
-bar.set_global_opts(title_opts=opts.TitleOpts(title="世界各国 COVID-19 死亡率"),
-                   xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=90)),
-                   yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=45)))
-
-bar.load_javascript();
-
-
-# In[547]:
-
-
-bar.render('世界COVID-19 People Dead Rate.html')
+    # 前20个国家，数字与标题取自同一组行号；与原来的画法一致，每格按该国自己的累计确诊缩放
+    top_world = world.top("confirm", 20)
+    render_squares(top_world, '国际各国疫情方寸间.png', '英文', cols=4, scale='row',
+                   labels=top_world.labels('英文', fallback='country'))
 
 
 # ## 制作疫情词云
 
-# In[548]:
-
-
-import pandas as pd
-import numpy as np
-from wordcloud import WordCloud
-from matplotlib import colors
-from PIL import Image
-
-
-# ### 中国疫情词云图
-
-# In[549]:
-
-
-def wordcloud_china():
-    data = {i:j for i,j in zip(china_data['province'], china_data['confirm'])}
-    
-    word_cloud = WordCloud(
-        font_path='C:/Windows/Fonts/msyhbd.ttc',
-        background_color='white',
-        width=1000,
-        height=600)
-    word_cloud.generate_from_frequencies(data)
-    word_cloud.to_file('中国疫情词云图.png')
-wordcloud_china()
-
-
-# ### 国际疫情词云图
-
-# In[550]:
-
-
-def wordcloud_world():
-    data = {i:j for i,j in zip(world_data['country'], china_data['confirm'])}
-    
-    word_cloud = WordCloud(
-        font_path='C:/Windows/Fonts/msyhbd.ttc',
-        background_color='white',
-        width=1000,
-        height=600)
-    word_cloud.generate_from_frequencies(data)
-    word_cloud.to_file('国际疫情词云图.png')
-wordcloud_world()
-
-
-
-
-
+def wordcloud_china(china_rates, service=None):
+    """中国疫情词云图"""
+    from clouds import get_service
+
+    data = china_rates.frequencies('province', 'confirm')
+    (service or get_service()).generate(data, '中国疫情词云图.png', width=1000, height=600)
+
+
+def wordcloud_world(world_rates, service=None):
+    """国际疫情词云图"""
+    from clouds import get_service
+
+    data = world_rates.frequencies('country', 'confirm')
+    (service or get_service()).generate(data, '国际疫情词云图.png', width=1000, height=600)
+
+
+def group_clouds(cities, world, sizes=CLOUD_SIZES):
+    """各省城市、各大洲国家的词云任务，每组输出 sizes 中的每个尺寸"""
+    from clouds import CloudJob, CloudOutput
+
+    groups = [(province, view['city'], view['confirm'])
+              for province, view in cities.view().groups('province')]
+    groups += [(continent, view['country'], view['confirm'])
+               for continent, view in world.view().groups('continent') if continent]
+    for name, words, counts in groups:
+        frequencies = {word: count for word, count in zip(words.tolist(), counts.tolist())
+                       if count > 0}
+        if frequencies:
+            outputs = [CloudOutput(os.path.join(CLOUD_DIR, '{}-{}.png'.format(name, width)),
+                                   width, height) for width, height in sizes]
+            yield CloudJob(name, frequencies, outputs)
+
+
+def wordclouds(args):
+    """中国与国际疫情词云图，以及各省、各大洲的分组词云"""
+    from clouds import get_service, render_batch
+
+    china, world = load_queries()
+    cities, = load_queries(('cities',))
+    china_rates, world_rates = death_rates(china, world)
+    service = get_service()
+    with profiling.stage('wordcloud.generate'):
+        wordcloud_china(china_rates, service)
+        wordcloud_world(world_rates, service)
+    # 分组词云分发到进程池，每完成一组就已写出文件
+    with profiling.stage('wordcloud.groups'):
+        results = list(render_batch(group_clouds(cities, world)))
+    print("{} 组分组词云已输出到 {}/".format(len(results), CLOUD_DIR))
+
+
+# # 命令行
+
+MAP_OUTPUTS = ['country.html', 'world.html', '中国各省 COVID-19 死亡率.html',
+               '世界COVID-19 People Dead Rate.html']
+SQUARE_OUTPUTS = ['中国疫情方寸间.png', '国内各省疫情方寸间.png', '国际各国疫情方寸间.png']
+WORDCLOUD_OUTPUTS = ['中国疫情词云图.png', '国际疫情词云图.png', CLOUD_DIR]
+
+
+def build_pipeline(args):
+    """fetch -> build -> enrich -> 各输出阶段；参数或上游数据未变化的阶段会被跳过"""
+    from clouds import find_font
+    from countries import NAMES_FILE
+    from pipeline import Pipeline, Stage, file_digest
+
+    return Pipeline([
+        Stage('fetch', lambda: fetch(args), volatile=True),
+        Stage('build', lambda: build(args), deps=('fetch',),
+              params={'excel': args.excel, 'feeds': args.feed}, outputs=[STORE_DIR]),
+        Stage('enrich', lambda: enrich(args), deps=('build',),
+              params={'country_names': file_digest(NAMES_FILE)}, outputs=[STORE_DIR]),
+        Stage('render-maps', lambda: render_maps(args), deps=('enrich',),
+              params={'binning': args.binning, 'bins': MAP_BINS,
+                      'online_assets': args.online_assets, 'assets_source': args.assets_source},
+              outputs=MAP_OUTPUTS),
+        Stage('render-squares', lambda: render_squares_stage(args), deps=('enrich',),
+              outputs=SQUARE_OUTPUTS),
+        Stage('wordcloud', lambda: wordclouds(args), deps=('enrich',),
+              params=lambda: {'font': find_font(), 'sizes': CLOUD_SIZES},
+              outputs=WORDCLOUD_OUTPUTS),
+    ], state_file=PIPELINE_STATE)
+
+
+def poll(args):
+    """常驻进程：按自适应间隔抓取，数据变化时才重新生成各项输出"""
+    from cache import ResponseCache
+    from poller import run_forever
+
+    def cycle():
+        status = build_pipeline(args).run(force=args.force)
+        args.force = False  # --force 只作用于第一轮
+        ran = [name for name, value in status.items() if value == 'ran' and name != 'fetch']
+        print("重新生成：{}".format('、'.join(ran) if ran else "无"))
+        if args.metrics:
+            profiling.active().write_metrics(args.metrics)
+        return (ResponseCache(CACHE_DIR).meta('disease_h5') or {}).get('lastUpdateTime')
+
+    return run_forever(cycle, args.min_interval, args.max_interval,
+                       args.max_rss and args.max_rss * 2 ** 20)
+
+
+def serve(args):
+    """本地 HTTP 接口：最新数据的 JSON 查询与已生成的图表"""
+    import asyncio
+    from server import ApiServer
+
+    server = ApiServer(STORE_DIR, MAP_OUTPUTS + SQUARE_OUTPUTS + WORDCLOUD_OUTPUTS,
+                       args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def backfill_archive(args):
+    """把目录中归档的原始接口数据并行写入快照库，并重建增量历史"""
+    from backfill import backfill
+    from history import HistoryEngine
+    from store import SnapshotStore
+
+    report = backfill(args.directory, STORE_DIR, args.processes)
+    for path, error in report.errors:
+        print("跳过 {}：{}".format(path, error))
+    seconds = max(report.seconds, 1e-9)
+    print("{} 个文件、{} 行（{} 份 world），{:.1f} 秒".format(
+        report.files, report.rows, report.worlds, report.seconds))
+    print("{:.0f} 文件/秒，{:.0f} 行/秒，{} 个进程".format(
+        report.files / seconds, report.rows / seconds, report.processes))
+    if report.files and not args.no_history:
+        HistoryEngine.from_store(SnapshotStore(STORE_DIR)).save(HISTORY_FILE)
+        print("增量历史已按快照库重建：{}".format(HISTORY_FILE))
+    return 0
+
+
+def main(argv=None):
+    from binning import METHODS
+
+    parser = argparse.ArgumentParser(description="腾讯新闻 COVID-19 疫情数据分析与可视化")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--force', action='store_true', help="输入未变化时也重新运行")
+    common.add_argument('--excel', action='store_true', help="同时导出 Excel 文件")
+    common.add_argument('--binning', choices=METHODS, default='quantile',
+                        help="地图分段方法：分位数、对数等比或自然断点（默认 quantile）")
+    common.add_argument('--online-assets', action='store_true',
+                        help="引用 assets.pyecharts.org 上的脚本，不使用本地 assets/")
+    common.add_argument('--assets-source', metavar='PATH_OR_URL',
+                        help="第一次准备 assets/ 时脚本的来源，可以是本地 pyecharts-assets "
+                             "仓库的 assets 目录（默认从 assets.pyecharts.org 下载）")
+    common.add_argument('--feed', action='append', default=[], metavar='NAME',
+                        help="额外抓取的 getOnsInfo feed（可重复），提取后写入快照库")
+    common.add_argument('--metrics', metavar='PATH',
+                        help="运行结束后写出各阶段耗时与峰值内存（.prom 或 .json）")
+    common.add_argument('--profile', choices=profiling.MODES,
+                        help="把各阶段的 cProfile 或 tracemalloc 结果写入 {}/".format(
+                            profiling.PROFILE_DIR))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    commands = {
+        'fetch': fetch,
+        'build': build,
+        'enrich': enrich,
+        'render-maps': render_maps,
+        'render-squares': render_squares_stage,
+        'wordcloud': wordclouds,
+        'all': build_pipeline,
+    }
+    for name, func in commands.items():
+        subparsers.add_parser(name, parents=[common], help=(func.__doc__ or '').strip())
+    daemon = subparsers.add_parser('daemon', parents=[common], help=poll.__doc__)
+    daemon.add_argument('--min-interval', type=float, default=60, help="最短轮询间隔（秒）")
+    daemon.add_argument('--max-interval', type=float, default=1800, help="最长轮询间隔（秒）")
+    daemon.add_argument('--max-rss', type=float, help="RSS 超过该值（MB）时退出，由进程管理器重启")
+    server = subparsers.add_parser('serve', help=serve.__doc__)
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=8000)
+    archive = subparsers.add_parser('backfill', help=backfill_archive.__doc__)
+    archive.add_argument('directory', help="归档的原始响应文件目录（*.json、*.json.gz，含子目录）")
+    archive.add_argument('--processes', type=int, help="工作进程数，默认为 CPU 核数")
+    archive.add_argument('--no-history', action='store_true', help="不重建 history.json")
+    args = parser.parse_args(argv)
+
+    # 每个子命令都通过流水线运行：所需的上游阶段在输入变化时才会重新运行
+    if args.command == 'serve':
+        return serve(args)
+    if args.command == 'backfill':
+        return backfill_archive(args)
+    if args.metrics or args.profile:
+        profiler = profiling.configure(mode=args.profile)
+    if args.command == 'daemon':
+        return poll(args)
+    targets = None if args.command == 'all' else [args.command]
+    try:
+        status = build_pipeline(args).run(targets, force=args.force)
+    finally:
+        if args.metrics:
+            profiler.write_metrics(args.metrics)
+    for name in commands:
+        if name in status:
+            print("{:<16}{}".format(name, "已运行" if status[name] == 'ran' else "未变化，跳过"))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# coding: utf-8
+"""从 areaTree / foreignList 提取疫情数据
+
+各函数读取记录并分批追加到 RegionStatsBuilder，既可以传入整体解析后的列表，
+也可以传入 stream.py 逐条读出的记录；nowConfirm 的取法统一由 RegionStatsBuilder
+决定。得到的 RegionStats 用 to_frame 转为表格，不复制数字。
+"""
+
+from itertools import chain
+
+
+def extract_domestic(provinces, table=None):
+    """各省记录（areaTree[0]['children'] 或逐条读出的省份）→ (省级, 市级) RegionStats
+
+    只遍历一遍：每个省份的城市在读到该省时追加，省份记录随即可以丢弃（只留下 total）。
+    两者共用同一个 NameTable，市级的 group_ids 为所属省份。
+    """
+    from regionstats import RegionStatsBuilder
+
+    names, totals = [], []
+    cities = RegionStatsBuilder(table)
+    for province in provinces:
+        names.append(province['name'])
+        totals.append(province['total'])
+        children = province.get('children')
+        if children:
+            cities.extend([city['name'] for city in children], [city['total'] for city in children],
+                          [province['name']] * len(children))
+    builder = RegionStatsBuilder(cities.table)
+    builder.extend(names, totals)
+    return builder.build(), cities.build()
+
+
+def extract_countries(foreign_list, table=None):
+    """海外各国的 RegionStats，group_ids 为大洲"""
+    from regionstats import RegionStats
+
+    return RegionStats.from_records(foreign_list, group='continent', table=table)
+
+
+def extract_world(foreign_list, area_tree):
+    """海外各国与中国整体的 RegionStats（最后一行为中国），group_ids 为大洲
+
+    各国与中国的数字一次性写入同一块 counts，海外部分取 [:-1] 切片即可，
+    不再另外拼接一份 world_data。
+    """
+    china = dict(area_tree[0]['total'], name='中国', continent='亚洲')
+    return extract_countries(chain(foreign_list, [china]))
@@ -0,0 +1,150 @@
+# coding: utf-8
+"""腾讯新闻 getOnsInfo 接口的并发抓取层
+
+所有 feed 共用一个带连接池的 keep-alive 会话，asyncio 负责把多个 feed
+同时发出去；``fetch_all`` 是同步包装，返回值与原来的 Domestic()/Oversea() 一致。
+传入 ``cache``（见 cache.py）时发送条件请求，并在结果中标明数据是否更新。
+"""
+
+import json
+import time
+import asyncio
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = 'https://view.inews.qq.com/g2/getOnsInfo?name={}'
+
+# feed 名称 -> 说明
+FEEDS = {
+    'disease_h5': '国内疫情数据',
+    'disease_foreign': '国外疫情数据',
+}
+
+TIMEOUT = 10  # 单次请求超时（秒）
+RETRIES = 3  # 连接错误、超时、5xx 与 429 后最多重试次数，其他错误不重试
+BACKOFF = 0.5  # 退避基数（秒），第 n 次重试前等待 BACKOFF * 2 ** (n - 1)
+POOL_SIZE = 10
+
+_session = None
+
+# changed 为 False 表示数据与缓存一致
+FeedResult = namedtuple('FeedResult', ['name', 'data', 'changed'])
+
+
+def get_session(pool_size=POOL_SIZE):
+    """返回全局共享的 keep-alive 会话"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
+def feed_url(name, base_url=None):
+    """base_url 为空时用模块级的 BASE_URL（调用时读取，测试可以替换）"""
+    return (base_url or BASE_URL).format(name)
+
+
+def parse_payload(payload):
+    """解出 response['data'] 中嵌套的 JSON 字符串"""
+    data = payload['data']
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data
+
+
+def parse_body(body):
+    """由原始响应体解析出数据"""
+    return parse_payload(json.loads(body))
+
+
+def _request_kwargs(name, base_url, timeout, cache):
+    kwargs = {'url': feed_url(name, base_url), 'timeout': timeout}
+    if cache is not None:
+        kwargs['headers'] = cache.conditional_headers(name)
+    return kwargs
+
+
+def _retryable(exc):
+    """连接错误、超时与 5xx/429 是暂时的，404、400 等其他响应重试也不会成功"""
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else None
+        return status is not None and (status >= 500 or status == 429)
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError))
+
+
+def _to_result(name, response, cache):
+    if cache is not None and response.status_code == 304 and cache.not_modified(name):
+        return FeedResult(name, cache.load(name, parse_body), False)
+    response.raise_for_status()
+    if cache is None:
+        return FeedResult(name, parse_body(response.content), True)
+    data, changed = cache.store(name, response.content, parse_body, response.headers)
+    return FeedResult(name, data, changed)
+
+
+def fetch_result(name, session=None, cache=None, base_url=None, timeout=TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF):
+    """同步抓取单个 feed，暂时性的错误按指数退避重试"""
+    session = session or get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(**_request_kwargs(name, base_url, timeout, cache))
+            return _to_result(name, response, cache)
+        except requests.RequestException as exc:
+            if attempt == retries or not _retryable(exc):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+async def fetch_result_async(name, session=None, cache=None, base_url=None,
+                             timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """异步抓取单个 feed，重试之间用 asyncio.sleep 让出事件循环"""
+    session = session or get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = await asyncio.to_thread(
+                session.get, **_request_kwargs(name, base_url, timeout, cache))
+            return _to_result(name, response, cache)
+        except requests.RequestException as exc:
+            if attempt == retries or not _retryable(exc):
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+
+async def fetch_results_async(names=tuple(FEEDS), return_exceptions=False, **kwargs):
+    """同时抓取多个 feed，返回 {feed 名称: FeedResult}
+
+    某个 feed 重试后仍失败时，其余 feed 照常完成（结果已写入缓存），再抛出第一个错误；
+    return_exceptions 为 True 时不抛出，失败的 feed 对应的是其异常。
+    """
+    session = kwargs.pop('session', None) or get_session()
+    results = await asyncio.gather(
+        *(fetch_result_async(name, session=session, **kwargs) for name in names),
+        return_exceptions=True)
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+    return dict(zip(names, results))
+
+
+def fetch_results(names=tuple(FEEDS), **kwargs):
+    """fetch_results_async 的同步包装"""
+    return asyncio.run(fetch_results_async(tuple(names), **kwargs))
+
+
+def fetch_feed(name, **kwargs):
+    """同步抓取单个 feed，返回数据"""
+    return fetch_result(name, **kwargs).data
+
+
+def fetch_all(names=tuple(FEEDS), **kwargs):
+    """同时抓取多个 feed，返回 {feed 名称: 数据}"""
+    return {name: result.data for name, result in fetch_results(names, **kwargs).items()}
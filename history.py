@@ -0,0 +1,163 @@
+# coding: utf-8
+"""增量时间序列：相邻两次抓取之间的新增数与 7/14 日滚动汇总
+
+每次抓取的 china_data/foreign_data 送入 ``HistoryEngine.ingest``，
+只与上一份快照做一次向量化比较（O(地区数)），不回扫历史。只有数值变化的
+地区会写入新增记录，滚动汇总随新增记录一起更新（每条记录 O(窗口天数)）。
+"""
+
+import json
+from datetime import datetime, date, timedelta
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+METRICS = ('confirm', 'heal', 'dead')
+WINDOWS = (7, 14)
+KEYS = ('province', 'country', 'city')
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def _infer_key(frame):
+    for key in KEYS:
+        if key in frame.columns:
+            return key
+    raise ValueError('无法识别地区列，请传入 key')
+
+
+class HistoryEngine:
+    """按数据类别（china、foreign 等）维护每个地区的新增数与滚动汇总"""
+
+    def __init__(self, windows=WINDOWS, metrics=METRICS):
+        self.windows = tuple(windows)
+        self.metrics = list(metrics)
+        self._last = {}  # kind -> 上一份快照（以地区为索引的 DataFrame）
+        self._last_time = {}  # kind -> 上一份快照的 lastUpdateTime
+        # kind -> 地区 -> 日期 -> 当日新增 [confirm, heal, dead]
+        self._daily = defaultdict(lambda: defaultdict(dict))
+        # kind -> 窗口 -> 地区 -> 日期 -> 截至该日的窗口合计
+        self._rolling = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
+
+    def ingest(self, kind, frame, last_update_time, key=None):
+        """写入一份新快照，返回有变化地区的新增数（DataFrame）
+
+        整张表与上一份快照逐行相减，耗时与地区总数成正比；之后只有变化的地区
+        更新每日新增与滚动汇总。第一次出现的地区只记录基准值，不计新增。
+        早于已写入快照的数据会被忽略；与上一份快照时间相同的数据视为对它的修订，
+        只计入与之相比的差值。
+        """
+        key = key or _infer_key(frame)
+        stamp = last_update_time
+        if isinstance(stamp, str):
+            stamp = datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S')
+        columns = [key] + self.metrics
+        if kind in self._last_time and stamp < self._last_time[kind]:
+            return pd.DataFrame(columns=columns)
+
+        current = frame.set_index(key)[self.metrics].astype(np.int64)
+        last = self._last.get(kind)
+        if last is None:
+            self._last[kind], self._last_time[kind] = current, stamp
+            return pd.DataFrame(columns=columns)
+
+        previous = last.reindex(current.index)
+        known = previous.notna().all(axis=1).to_numpy()
+        diff = current.to_numpy() - previous.to_numpy(dtype=np.float64, na_value=0)
+        changed = known & (diff != 0).any(axis=1)
+        regions = current.index[changed]
+        deltas = diff[changed].astype(np.int64)
+
+        day = _to_date(stamp)
+        for region, delta in zip(regions, deltas):
+            self._add(kind, region, day, delta)
+
+        self._last[kind] = current.combine_first(last).astype(np.int64)
+        self._last_time[kind] = stamp
+        result = pd.DataFrame(deltas, columns=self.metrics)
+        result.insert(0, key, regions)
+        return result
+
+    def _add(self, kind, region, day, delta):
+        daily = self._daily[kind][region]
+        daily[day] = (np.asarray(daily.get(day, 0)) + delta).tolist()
+        for window in self.windows:
+            rolling = self._rolling[kind][window][region]
+            for offset in range(window):
+                target = day + timedelta(days=offset)
+                rolling[target] = (np.asarray(rolling.get(target, 0)) + delta).tolist()
+
+    def regions(self, kind):
+        return list(self._daily[kind])
+
+    @staticmethod
+    def _frame(values, start, end, metrics):
+        start = _to_date(start) if start is not None else None
+        end = _to_date(end) if end is not None else None
+        days = sorted(d for d in values
+                      if (start is None or d >= start) and (end is None or d <= end))
+        return pd.DataFrame([values[d] for d in days], index=pd.Index(days, name='date'),
+                            columns=metrics, dtype=np.int64)
+
+    def deltas(self, kind, region, start=None, end=None):
+        """某地区在日期区间内的每日新增"""
+        return self._frame(self._daily[kind].get(region, {}), start, end, self.metrics)
+
+    def rolling(self, kind, region, window, start=None, end=None):
+        """某地区在日期区间内每天的 window 日滚动合计
+
+        只列出窗口内有新增记录的日期，其余日期合计为 0。
+        """
+        if window not in self.windows:
+            raise ValueError('未维护 {} 日窗口，可选 {}'.format(window, self.windows))
+        values = self._rolling[kind][window].get(region, {})
+        return self._frame(values, start, end, self.metrics)
+
+    def save(self, path):
+        state = {
+            'windows': self.windows,
+            'metrics': self.metrics,
+            'last': {kind: {'time': self._last_time[kind].strftime('%Y-%m-%d %H:%M:%S'),
+                            'index_name': frame.index.name,
+                            'values': {str(r): v for r, v in
+                                       zip(frame.index, frame.to_numpy().tolist())}}
+                     for kind, frame in self._last.items()},
+            'daily': {kind: {region: {d.isoformat(): v for d, v in days.items()}
+                             for region, days in regions.items()}
+                      for kind, regions in self._daily.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """从 save() 的文件恢复；滚动汇总由每日新增重新累计"""
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        engine = cls(state['windows'], state['metrics'])
+        for kind, last in state['last'].items():
+            index = pd.Index(list(last['values']), name=last['index_name'])
+            engine._last[kind] = pd.DataFrame(list(last['values'].values()), index=index,
+                                              columns=engine.metrics, dtype=np.int64)
+            engine._last_time[kind] = datetime.strptime(last['time'], '%Y-%m-%d %H:%M:%S')
+        for kind, regions in state['daily'].items():
+            for region, days in regions.items():
+                for day, delta in days.items():
+                    engine._add(kind, region, _to_date(day), np.asarray(delta))
+        return engine
+
+    @classmethod
+    def from_store(cls, store, kinds=('china', 'foreign'), **kwargs):
+        """按时间顺序重放 SnapshotStore 中的全部快照"""
+        engine = cls(**kwargs)
+        for kind in kinds:
+            for stamp, _ in store.snapshots(kind):
+                engine.ingest(kind, store.read(kind, stamp), stamp)
+        return engine
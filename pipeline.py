@@ -0,0 +1,133 @@
+# coding: utf-8
+"""带依赖关系与“未变化则跳过”的分阶段流水线
+
+每个阶段声明依赖的上游阶段、参数和输出文件。阶段函数返回其输出的指纹
+（内容哈希）；阶段的输入键由参数与上游指纹共同决定，输入键与上次运行相同
+且输出文件都在时直接跳过。互不依赖的阶段在线程池中同时运行。
+
+    fetch -> build -> enrich -> render-maps / render-squares / wordcloud
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import profiling
+
+STATE_FILE = '.pipeline_state.json'
+
+# volatile 的阶段（如抓取）只有被明确指定时才运行，
+# 否则沿用上次的指纹，改动下游参数时不会重新抓取数据。
+# params 也可以是返回参数的函数，只在该阶段被选中、需要计算输入键时才调用
+Stage = namedtuple('Stage', ['name', 'func', 'deps', 'params', 'outputs', 'volatile'])
+Stage.__new__.__defaults__ = ((), None, (), False)
+
+
+def digest(*parts):
+    """任意可 JSON 序列化对象的内容哈希"""
+    text = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+    """文件内容哈希，文件不存在时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def frame_digest(*frames):
+    """DataFrame 的内容哈希（含列名）"""
+    import pandas as pd
+
+    h = hashlib.sha256()
+    for frame in frames:
+        h.update('\0'.join(map(str, frame.columns)).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class Pipeline:
+    def __init__(self, stages, state_file=STATE_FILE):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError('阶段 {} 依赖未知阶段 {}'.format(stage.name, dep))
+        try:
+            with open(state_file, encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+
+    def _save_state(self):
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.state_file)
+
+    def _closure(self, targets):
+        """targets 及其全部上游阶段"""
+        selected, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.stages[name].deps)
+        return selected
+
+    def input_key(self, stage):
+        fingerprints = [self.state.get(dep, {}).get('fingerprint') for dep in stage.deps]
+        params = stage.params() if callable(stage.params) else stage.params
+        return digest(stage.name, params, fingerprints)
+
+    def _should_run(self, stage, explicit, force):
+        previous = self.state.get(stage.name)
+        if stage.volatile:
+            return stage.name in explicit or previous is None
+        if force or previous is None:
+            return True
+        if any(not os.path.exists(path) for path in stage.outputs):
+            return True
+        return previous.get('key') != self.input_key(stage)
+
+    def _run_stage(self, stage, explicit, force):
+        if not self._should_run(stage, explicit, force):
+            return stage.name, 'skipped'
+        key = self.input_key(stage)
+        with profiling.stage(stage.name):
+            fingerprint = stage.func()
+        with self._lock:
+            self.state[stage.name] = {
+                'key': key,
+                'fingerprint': fingerprint if fingerprint is not None else key,
+            }
+            self._save_state()
+        return stage.name, 'ran'
+
+    def run(self, targets=None, force=False, max_workers=None):
+        """运行 targets（默认全部阶段）及所需的上游阶段，返回 {阶段名: 'ran'/'skipped'}"""
+        explicit = set(targets or self.stages)
+        selected = self._closure(explicit)
+        remaining = {name: set(self.stages[name].deps) & selected for name in selected}
+        status = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            running = {}
+            while remaining or running:
+                for name in [n for n, deps in remaining.items() if not deps]:
+                    del remaining[name]
+                    running[pool.submit(self._run_stage, self.stages[name], explicit, force)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    status[name] = future.result()[1]
+                    for deps in remaining.values():
+                        deps.discard(name)
+        return status
@@ -0,0 +1,132 @@
+# coding: utf-8
+"""常驻轮询进程
+
+cron 每隔几分钟启动一次脚本，每次都要重新付出解释器启动和 pandas、pyecharts 等
+库的导入开销。Poller 在同一个进程里反复执行一轮流水线，库、字体、排版缓存、
+国家名索引都保持加载；数据未变化时流水线只发一次条件请求，后续阶段全部跳过。
+
+轮询间隔由 AdaptiveInterval 决定：根据 lastUpdateTime 实际变化的间隔（指数滑动
+平均）取其 1/4，连续没有变化或出错时按倍数退避，始终限制在 [minimum, maximum] 内。
+收到 SIGTERM/SIGINT 时等当前一轮结束后退出；每轮结束后回收内存并检查 RSS，
+超过上限时退出，交给 systemd 等进程管理器重启。
+"""
+
+import gc
+import time
+import signal
+import threading
+import traceback
+from datetime import datetime
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+EXIT_RSS = 3  # RSS 超过上限时的退出码
+
+
+def parse_time(text):
+    """解析 lastUpdateTime，无法解析时返回 None"""
+    try:
+        return datetime.strptime(text, TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def current_rss():
+    """当前常驻内存（字节），无法获取时退回峰值 RSS"""
+    import profiling
+
+    rss = profiling.current_rss()
+    return rss if rss is not None else profiling.peak_rss()
+
+
+class AdaptiveInterval:
+    def __init__(self, minimum=60, maximum=1800, alpha=0.3, divisor=4, backoff=1.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.alpha = alpha
+        self.divisor = divisor
+        self.backoff = backoff
+        self.gap = None  # lastUpdateTime 相邻两次变化间隔的指数滑动平均（秒）
+        self.misses = 0  # 连续没有变化（或出错）的轮数
+        self.current = minimum
+        self._last = None
+
+    def _next(self):
+        base = self.minimum if self.gap is None else self.gap / self.divisor
+        self.current = min(self.maximum, max(self.minimum, base * self.backoff ** self.misses))
+        return self.current
+
+    def update(self, last_update_time):
+        """记录本轮的 lastUpdateTime（datetime），返回到下一轮前等待的秒数"""
+        if last_update_time is not None and last_update_time != self._last:
+            if self._last is not None:
+                gap = (last_update_time - self._last).total_seconds()
+                if gap > 0:
+                    self.gap = gap if self.gap is None else (
+                        self.alpha * gap + (1 - self.alpha) * self.gap)
+            self._last = last_update_time
+            self.misses = 0
+        else:
+            self.misses += 1
+        return self._next()
+
+    def failed(self):
+        """本轮出错，按没有变化处理"""
+        self.misses += 1
+        return self._next()
+
+
+class Poller:
+    def __init__(self, cycle, interval=None, max_rss=None):
+        """cycle() 执行一轮并返回 lastUpdateTime（字符串或 datetime）"""
+        self.cycle = cycle
+        self.interval = interval or AdaptiveInterval()
+        self.max_rss = max_rss
+        self.cycles = 0
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def install_signal_handlers(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.stop)
+
+    def log(self, message):
+        print('[{}] {}'.format(time.strftime(TIME_FORMAT), message), flush=True)
+
+    def run_once(self):
+        """执行一轮，返回到下一轮前等待的秒数"""
+        self.cycles += 1
+        try:
+            last_update_time = self.cycle()
+        except Exception:
+            traceback.print_exc()
+            wait = self.interval.failed()
+            self.log('第 {} 轮出错'.format(self.cycles))
+        else:
+            if isinstance(last_update_time, str):
+                last_update_time = parse_time(last_update_time)
+            wait = self.interval.update(last_update_time)
+        gc.collect()
+        return wait
+
+    def run(self):
+        """运行直到收到停止信号，返回退出码"""
+        while not self._stop.is_set():
+            wait = self.run_once()
+            rss = current_rss()
+            self.log('第 {} 轮结束，RSS {:.1f} MB，{:.0f} 秒后再次抓取'.format(
+                self.cycles, (rss or 0) / 2 ** 20, wait))
+            if self.max_rss and rss and rss > self.max_rss:
+                self.log('RSS 超过上限 {:.0f} MB，退出'.format(self.max_rss / 2 ** 20))
+                return EXIT_RSS
+            self._stop.wait(wait)
+        self.log('收到停止信号，退出')
+        return 0
+
+
+def run_forever(cycle, minimum=60, maximum=1800, max_rss=None):
+    """在主线程中运行 Poller，SIGTERM/SIGINT 时在当前一轮结束后退出"""
+    poller = Poller(cycle, AdaptiveInterval(minimum, maximum), max_rss)
+    poller.install_signal_handlers()
+    return poller.run()
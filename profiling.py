@@ -0,0 +1,199 @@
+# coding: utf-8
+"""各阶段的耗时、内存统计与性能剖析
+
+流水线的每个阶段（以及阶段内较重的步骤）都包在 profiling.stage(name) 中。
+未启用时 stage 返回一个共用的空上下文，几乎没有开销；启用后记录每个阶段的
+耗时和阶段前后当前 RSS 的差值（rss_delta_bytes，并发运行的阶段会互相计入），可选：
+
+* mode='cprofile'：每个最外层阶段的 cProfile 结果写入 profiles/<阶段>.prof，
+  可用 python -m pstats 或 snakeviz 查看；
+* mode='tracemalloc'：记录每个最外层阶段 Python 内存分配的峰值，并把分配最多的
+  代码行写入 profiles/<阶段>.tracemalloc.txt。
+
+嵌套在其他阶段中的步骤（如 build.excel）只记录耗时与 RSS，
+剖析结果包含在外层阶段的文件里。进程的峰值 RSS（ru_maxrss）只增不减，
+不能归到单个阶段，写出指标时只作为 process_peak_rss_bytes 记录一次。
+
+阶段之外的数值（如本轮未匹配的国家数）用 gauge(name, value, **labels) 记录，
+每次记录覆盖上一次的值。运行结束后 write_metrics 按扩展名写出 Prometheus 文本
+（.prom）或 JSON。
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+PROFILE_DIR = 'profiles'
+MODES = ('cprofile', 'tracemalloc')
+TOP_LINES = 25
+
+_NULL = contextlib.nullcontext()
+
+
+def peak_rss():
+    """进程的峰值常驻内存（字节），不支持的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss():
+    """当前常驻内存（字节），没有 /proc 的平台返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Profiler:
+    def __init__(self, enabled=True, mode=None, out_dir=PROFILE_DIR):
+        if mode is not None and mode not in MODES:
+            raise ValueError('未知的剖析模式：{}'.format(mode))
+        self.enabled = enabled or mode is not None
+        self.mode = mode
+        self.out_dir = out_dir
+        self.stats = {}  # {阶段: {'seconds', 'rss_delta_bytes', 'traced_peak_bytes', 'runs'}}
+        self.gauges = {}  # {指标名: {标签元组: 数值}}
+        self._lock = threading.Lock()
+        self._local = threading.local()  # 当前线程中嵌套的阶段层数
+        if mode == 'tracemalloc':
+            import tracemalloc
+
+            tracemalloc.start()
+
+    def stage(self, name):
+        """统计 name 阶段的上下文管理器"""
+        if not self.enabled:
+            return _NULL
+        return self._measure(name)
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        mode = self.mode if depth == 0 else None
+        profile = None
+        if mode == 'cprofile':
+            import cProfile
+
+            profile = cProfile.Profile()
+        elif mode == 'tracemalloc':
+            import tracemalloc
+
+            # 各阶段并发运行时峰值是所有线程的合计
+            tracemalloc.reset_peak()
+        rss_before = current_rss()
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            self._local.depth = depth
+            rss_after = current_rss()
+            entry = {'seconds': seconds, 'rss_delta_bytes': None}
+            if rss_before is not None and rss_after is not None:
+                entry['rss_delta_bytes'] = rss_after - rss_before
+            if mode == 'tracemalloc':
+                entry['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                self._dump_tracemalloc(name)
+            elif profile is not None:
+                os.makedirs(self.out_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.out_dir, name + '.prof'))
+            with self._lock:
+                entry['runs'] = self.stats.get(name, {}).get('runs', 0) + 1
+                self.stats[name] = entry
+
+    def gauge(self, name, value, **labels):
+        """记录指标 covid_<name> 的当前值"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def _dump_tracemalloc(self, name):
+        import tracemalloc
+
+        top = tracemalloc.take_snapshot().statistics('lineno')[:TOP_LINES]
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, name + '.tracemalloc.txt'), 'w',
+                  encoding='utf-8') as f:
+            f.write('\n'.join(str(stat) for stat in top) + '\n')
+
+    def metrics_text(self):
+        """Prometheus 文本格式"""
+        lines = []
+        for field, kind in (('seconds', 'gauge'), ('rss_delta_bytes', 'gauge'),
+                            ('traced_peak_bytes', 'gauge'), ('runs', 'counter')):
+            rows = [(name, entry[field]) for name, entry in sorted(self.stats.items())
+                    if entry.get(field) is not None]
+            if not rows:
+                continue
+            metric = 'covid_stage_{}'.format(field + '_total' if kind == 'counter' else field)
+            lines.append('# TYPE {} {}'.format(metric, kind))
+            lines.extend('{}{{stage="{}"}} {}'.format(metric, name, value) for name, value in rows)
+        for name, values in sorted(self.gauges.items()):
+            metric = 'covid_' + name
+            lines.append('# TYPE {} gauge'.format(metric))
+            for labels, value in sorted(values.items()):
+                label_text = ','.join('{}="{}"'.format(k, v) for k, v in labels)
+                lines.append('{}{} {}'.format(metric, '{' + label_text + '}' if labels else '',
+                                              value))
+        peak = peak_rss()
+        if peak is not None and self.stats:
+            lines.append('# TYPE covid_process_peak_rss_bytes gauge')
+            lines.append('covid_process_peak_rss_bytes {}'.format(peak))
+        return '\n'.join(lines) + '\n'
+
+    def write_metrics(self, path):
+        """写出各阶段统计，.json 结尾时写 JSON，否则写 Prometheus 文本"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                gauges = {name: [dict(labels, value=value) for labels, value in values.items()]
+                          for name, values in self.gauges.items()}
+                json.dump({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'stages': self.stats,
+                           'process_peak_rss_bytes': peak_rss(), 'gauges': gauges},
+                          f, ensure_ascii=False, indent=1)
+            else:
+                f.write(self.metrics_text())
+        os.replace(tmp, path)
+        return path
+
+
+_active = Profiler(enabled=False)
+
+
+def configure(enabled=True, mode=None, out_dir=PROFILE_DIR):
+    """启用全局的 Profiler 并返回它"""
+    global _active
+    _active = Profiler(enabled, mode, out_dir)
+    return _active
+
+
+def active():
+    return _active
+
+
+def stage(name):
+    """用全局 Profiler 统计 name 阶段，未启用时几乎没有开销"""
+    return _active.stage(name)
+
+
+def gauge(name, value, **labels):
+    """用全局 Profiler 记录一个指标值，未启用时忽略"""
+    _active.gauge(name, value, **labels)
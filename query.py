@@ -0,0 +1,133 @@
+# coding: utf-8
+"""按排序置换与组合掩码读取表格，不复制整张表
+
+原来的写法是 sort_values(inplace=True) + reset_index，再用一连串布尔条件
+反复切片并重新赋值，每一步都生成一份新表；方寸图又一边从 world_data 取数、
+一边从另一张排好序的 world_data_t 取标题，两者顺序不一致。
+
+Query 包住一张只读的表，按列缓存排序置换（argsort 只算一次）。View 只保存
+一个行号数组：where 把多个条件合成一个掩码后筛一次，sort 用缓存的置换重排，
+head 只是截取行号。地图、柱状图、方寸图、词云都从同一个 View 按同一组行号
+取名称和数值，顺序总是一致；只有被选中的行会被取出。
+
+给出 ranking（已用这张表 update 过的 ranking.RankingIndex）时，其中各指标的
+排序直接取自增量维护的排名，top 只需 O(K)。
+"""
+
+import numpy as np
+
+
+class Query:
+    def __init__(self, frame, ranking=None):
+        self.frame = frame
+        self.ranking = ranking
+        self._orders = {}  # (列名, 升序) -> 行号置换
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __getitem__(self, column):
+        """整列数据（NumPy 数组，不复制），用于组合条件"""
+        return self.frame[column].to_numpy()
+
+    def _ranked(self, column):
+        return (self.ranking is not None and column in self.ranking.metrics
+                and column in self.frame.columns)
+
+    def order(self, column, ascending=True):
+        """按 column 排序的行号置换，NaN 总在最后；同一列只排序一次"""
+        key = (column, ascending)
+        if key not in self._orders and self._ranked(column):
+            self._orders[key] = self.ranking.top_rows(column, ascending=ascending)
+        elif key not in self._orders:
+            values = self.frame[column].to_numpy()
+            if values.dtype.kind in 'iufb':
+                values = values.astype(np.float64)
+                self._orders[key] = np.argsort(values if ascending else -values, kind='stable')
+            else:
+                order = np.argsort(values, kind='stable')
+                self._orders[key] = order if ascending else order[::-1]
+        return self._orders[key]
+
+    def view(self):
+        """全部行，原始顺序"""
+        return View(self, np.arange(len(self.frame)))
+
+    def where(self, *masks):
+        return self.view().where(*masks)
+
+    def sort(self, column, ascending=True):
+        return self.view().sort(column, ascending)
+
+    def top(self, column, n, ascending=False):
+        """按 column 排在前 n 的行，有 ranking 时不需要排序"""
+        if self._ranked(column) and (column, ascending) not in self._orders:
+            return View(self, self.ranking.top_rows(column, n, ascending))
+        return View(self, self.order(column, ascending)[:n])
+
+
+class View:
+    """Query 中按顺序排列的一组行"""
+
+    __slots__ = ('query', 'rows')
+
+    def __init__(self, query, rows):
+        self.query = query
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, column):
+        """column 在这些行上的值"""
+        return self.query[column][self.rows]
+
+    def where(self, *masks):
+        """只保留所有条件都成立的行（masks 为整张表上的布尔数组）"""
+        if not masks:
+            return self
+        mask = masks[0] if len(masks) == 1 else np.logical_and.reduce(masks)
+        return View(self.query, self.rows[mask[self.rows]])
+
+    def sort(self, column, ascending=True):
+        """按 column 重排这些行"""
+        order = self.query.order(column, ascending)
+        if len(self.rows) == len(order):
+            return View(self.query, order)
+        selected = np.zeros(len(order), dtype=bool)
+        selected[self.rows] = True
+        return View(self.query, order[selected[order]])
+
+    def head(self, n):
+        return View(self.query, self.rows[:n])
+
+    def labels(self, column, fallback=None):
+        """名称列表，column 为空时取 fallback 列"""
+        values = self[column]
+        if fallback is None:
+            return values.tolist()
+        other = self[fallback]
+        return [b if a is None or a != a else a for a, b in zip(values.tolist(), other.tolist())]
+
+    def pairs(self, name_column, value_column, fmt=None):
+        """pyecharts 需要的 [(名称, 数值), ...]，fmt 给出时数值按其格式化为字符串"""
+        values = self[value_column].tolist()
+        if fmt is not None:
+            values = [format(v, fmt) for v in values]
+        return list(zip(self.labels(name_column), values))
+
+    def frequencies(self, name_column, value_column):
+        """词云需要的 {名称: 数值} 映射"""
+        from regionstats import FrequencyView
+
+        return FrequencyView(self.labels(name_column), self[value_column])
+
+    def groups(self, column):
+        """按 column 分组，按各组首次出现的顺序产出 (组名, View)"""
+        import pandas as pd
+
+        codes, uniques = pd.factorize(self[column], sort=False)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for i, name in enumerate(uniques):
+            yield name, View(self.query, self.rows[order[bounds[i]:bounds[i + 1]]])
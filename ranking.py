@@ -0,0 +1,187 @@
+# coding: utf-8
+"""各地区按指标排名的增量索引
+
+方寸图取前 25 个省份、前 20 个国家，死亡率柱状图按 healRate/deadRate 排列，
+原来每次都对整张表重新 sort_values。RankingIndex 为 confirm、nowConfirm、
+deadRate、healRate 各维护一份有序的地区编号数组：
+
+* 新快照到来时逐列比较数值，只把变化（新增、消失）的地区从有序数组中删除、
+  再二分查找位置插入，O(m log N) 次比较加上一次 O(N) 的数组搬移，不重新排序；
+  变化的地区超过 1/4 时才整体重排；
+* 前 K 名就是有序数组的前 K 个元素，O(K)；单个地区的名次 O(log N)。
+
+排序规则与 query.Query.order 一致：数值相同按地区在表中的行号，NaN 总在最后。
+地区按键列（如 province，或城市的 (province, city)）分配编号，表中每一行都有
+自己的编号：键重复的行（如各省都有的“境外输入”）按出现的先后各占一个编号。
+常驻进程（daemon）中同一个索引跨轮复用，每轮只处理有变化的地区。
+"""
+
+import threading
+
+import numpy as np
+
+METRICS = ('confirm', 'nowConfirm', 'deadRate', 'healRate')
+REBUILD_FRACTION = 0.25  # 变化的地区超过这个比例时整体重排
+
+
+class _Ranking:
+    """一个指标、一个方向上的有序地区编号，数值相同时按行号排列"""
+
+    def __init__(self, values, rows, slots, ascending):
+        self.sign = 1.0 if ascending else -1.0
+        self.rebuild(values, rows, slots)
+
+    def rebuild(self, values, rows, slots):
+        keys = values[slots] * self.sign
+        order = np.lexsort((rows[slots], keys))  # NaN 排在最后
+        self.order = slots[order]
+        self.keys = keys[order]
+        self.ties = rows[self.order]
+
+    def remove(self, slots):
+        keep = ~np.isin(self.order, slots)
+        self.order = self.order[keep]
+        self.keys = self.keys[keep]
+        self.ties = self.ties[keep]
+
+    def insert(self, values, rows, slots):
+        """插入 slots（已不在有序数组中），values、rows 为全部编号的数值与行号"""
+        keys = values[slots] * self.sign
+        ties = rows[slots]
+        new = np.lexsort((ties, keys))  # 按 (数值, 行号) 排好，位置相同时保持先后
+        slots, keys, ties = slots[new], keys[new], ties[new]
+        positions = np.empty(len(slots), dtype=np.int64)
+        for i, (key, tie) in enumerate(zip(keys.tolist(), ties.tolist())):
+            positions[i] = self._position(key, tie)
+        self.order = np.insert(self.order, positions, slots)
+        self.keys = np.insert(self.keys, positions, keys)
+        self.ties = np.insert(self.ties, positions, ties)
+
+    def _position(self, key, tie):
+        lo = np.searchsorted(self.keys, key, side='left')
+        hi = np.searchsorted(self.keys, key, side='right')
+        return int(lo + np.searchsorted(self.ties[lo:hi], tie))
+
+    def rank(self, key, tie):
+        return self._position(key * self.sign, tie)
+
+
+class RankingIndex:
+    def __init__(self, metrics=METRICS, rebuild_fraction=REBUILD_FRACTION):
+        self.metrics = tuple(metrics)
+        self.rebuild_fraction = rebuild_fraction
+        self.keys = []  # 编号 -> 地区键，键第一次出现时分配编号
+        self._slots = {}
+        self.values = {metric: np.empty(0) for metric in self.metrics}
+        self.present = np.zeros(0, dtype=bool)
+        self.rows = np.zeros(0, dtype=np.int64)  # 编号 -> 最近一次 update 的表中的行号
+        self._rankings = {}  # (指标, 升序) -> _Ranking，第一次查询时建立
+        self._frame_keys = None
+        self._frame_slots = None
+        self._lock = threading.Lock()
+        self.stats = {'updates': 0, 'changed': 0, 'rebuilds': 0}
+
+    def __len__(self):
+        return int(self.present.sum())
+
+    def _grow(self, size):
+        extra = size - len(self.present)
+        self.present = np.concatenate([self.present, np.zeros(extra, dtype=bool)])
+        self.rows = np.concatenate([self.rows, np.zeros(extra, dtype=np.int64)])
+        for metric in self.metrics:
+            self.values[metric] = np.concatenate([self.values[metric], np.full(extra, np.nan)])
+
+    def _assign_slots(self, keys):
+        """每一行的编号；同一张表中重复的键按出现次序区分，各占一个编号"""
+        if self._frame_keys is not None and keys == self._frame_keys:
+            return self._frame_slots
+        slots = np.empty(len(keys), dtype=np.int64)
+        seen = {}
+        for i, key in enumerate(keys):
+            k = seen[key] = seen.get(key, -1) + 1
+            if k:
+                key = (key, k)
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = len(self.keys)
+                self.keys.append(key)
+            slots[i] = slot
+        if len(self.keys) > len(self.present):
+            self._grow(len(self.keys))
+        self._frame_keys, self._frame_slots = keys, slots
+        return slots
+
+    @staticmethod
+    def _frame_keys_of(frame, key):
+        if isinstance(key, str):
+            return frame[key].tolist()
+        return list(zip(*(frame[column].tolist() for column in key)))
+
+    def update(self, frame, key):
+        """用新快照更新索引，返回有变化的地区数
+
+        key 为地区名称列，或能唯一确定地区的多列（如 ('province', 'city')）。
+        数值或行号变化的地区都会在有序数组中重新定位。
+        """
+        with self._lock:
+            slots = self._assign_slots(self._frame_keys_of(frame, key))
+            present = np.zeros(len(self.present), dtype=bool)
+            present[slots] = True
+            rows = np.zeros(len(self.present), dtype=np.int64)
+            rows[slots] = np.arange(len(slots))
+            changed = (present != self.present) | (present & (rows != self.rows))
+            for metric in self.metrics:
+                if metric not in frame.columns:
+                    continue
+                new = np.full(len(self.present), np.nan)
+                new[slots] = frame[metric].to_numpy(dtype=np.float64)
+                old = self.values[metric]
+                changed |= ~((new == old) | (np.isnan(new) & np.isnan(old)))
+                self.values[metric] = new
+            was = self.present
+            self.present = present
+            self.rows = rows
+            changed = np.flatnonzero(changed)
+            self.stats['updates'] += 1
+            self.stats['changed'] += len(changed)
+            if len(changed):
+                rebuild = len(changed) > self.rebuild_fraction * max(len(slots), 1)
+                live = np.flatnonzero(present)
+                for (metric, _), ranking in self._rankings.items():
+                    if rebuild:
+                        ranking.rebuild(self.values[metric], rows, live)
+                        continue
+                    ranking.remove(changed[was[changed]])
+                    ranking.insert(self.values[metric], rows, changed[present[changed]])
+                if rebuild and self._rankings:
+                    self.stats['rebuilds'] += 1
+            return len(changed)
+
+    def _ranking(self, metric, ascending):
+        key = (metric, ascending)
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            if metric not in self.values:
+                raise KeyError('没有 {} 的排名'.format(metric))
+            ranking = self._rankings[key] = _Ranking(
+                self.values[metric], self.rows, np.flatnonzero(self.present), ascending)
+        return ranking
+
+    def top(self, metric, k=None, ascending=False):
+        """前 k 名（默认全部）的地区编号，O(k)"""
+        with self._lock:
+            return self._ranking(metric, ascending).order[:k].copy()
+
+    def top_rows(self, metric, k=None, ascending=False):
+        """前 k 名在最近一次 update 的表中的行号"""
+        with self._lock:
+            return self._ranking(metric, ascending).ties[:k].copy()
+
+    def rank(self, metric, key, ascending=False):
+        """地区 key（键重复时为第一次出现的那一行）的名次（从 0 开始），O(log N)"""
+        with self._lock:
+            slot = self._slots[key]
+            if not self.present[slot]:
+                raise KeyError(key)
+            return self._ranking(metric, ascending).rank(self.values[metric][slot],
+                                                         self.rows[slot])
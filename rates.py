@@ -0,0 +1,33 @@
+# coding: utf-8
+"""死亡率、治愈率等比率指标
+
+省份表与国家表列名一致（confirm/heal/dead/nowConfirm），
+所以同一个函数可以同时用于 china_data 与 world_data。
+"""
+
+import numpy as np
+
+# 比率列名 -> 分子列名，分母统一为 confirm
+RATES = {
+    'deadRate': 'dead',
+    'healRate': 'heal',
+    'activeRate': 'nowConfirm',
+}
+
+
+def safe_divide(numerator, denominator):
+    """逐元素相除，分母为 0 时结果记为 0.0"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape, dtype=np.float64)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def rate_metrics(frame, rates=RATES):
+    """一次性计算所有比率列，返回新的 DataFrame（不修改原表）"""
+    confirm = frame['confirm'].to_numpy()
+    return frame.assign(**{
+        name: safe_divide(frame[column].to_numpy(), confirm)
+        for name, column in rates.items()
+    })
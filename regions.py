@@ -0,0 +1,157 @@
+# coding: utf-8
+"""国家 → 省份 → 城市的层级索引
+
+由 areaTree 只建一次。节点按层依次存放在紧凑的 NumPy 数组中：parent、level，
+以及 CSR 形式的 child_start/child_count，同一节点的子节点在数组中连续；
+每个节点的现有确诊、累计确诊、治愈、死亡直接取自接口给出的汇总值，存放在一块
+(N, 4) 的 int64 数组中，名称以索引自己的 NameTable 中的编号保存。省份在建索引时展开，
+各省的城市在第一次访问时才展开。
+
+索引用于反复的层级查询：按名称路径查找、取上级地区都只需 O(深度)，不需要在
+城市表上做布尔筛选（benchmark.py regions：180 次查找约 0.3 ms，布尔筛选约 80 ms）。
+只需要一次性得到省级、市级全表时，建索引比 extract_domestic 慢，build 与 backfill
+用的是后者。
+"""
+
+import numpy as np
+
+from regionstats import FIELDS, NameTable, RegionStats, RegionStatsBuilder
+
+LEVELS = ('country', 'province', 'city')
+
+
+class RegionIndex:
+    def __init__(self, area_tree, table=None):
+        root = area_tree[0]
+        provinces = root.get('children') or []
+        capacity = 1 + len(provinces) + sum(len(p.get('children') or []) for p in provinces)
+        self.table = NameTable() if table is None else table
+        self.name_ids = np.zeros(capacity, dtype=np.int32)
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.level = np.zeros(capacity, dtype=np.int8)
+        self.child_start = np.zeros(capacity, dtype=np.int32)
+        self.child_count = np.zeros(capacity, dtype=np.int32)
+        self.counts = np.zeros((capacity, len(FIELDS)), dtype=np.int64)  # 列依次为 FIELDS
+        self._lookup = {}  # (上级节点, 名称) -> 节点
+        self._pending = {}  # 尚未展开的节点 -> 原始 children 列表
+        self._size = 0
+        self._append(-1, 0, [root])
+        self._expand(0)
+
+    def __len__(self):
+        """已展开的节点数"""
+        return self._size
+
+    def _append(self, parent, level, nodes):
+        start, n = self._size, len(nodes)
+        end = self._size = start + n
+        self.parent[start:end] = parent
+        self.level[start:end] = level
+        builder = RegionStatsBuilder(self.table)
+        builder.extend([node['name'] for node in nodes], [node['total'] for node in nodes])
+        stats = builder.build()
+        self.counts[start:end] = stats.counts
+        self.name_ids[start:end] = stats.name_ids
+        for i, node in enumerate(nodes, start):
+            self._lookup[(parent, node['name'])] = i
+            children = node.get('children') or []
+            self.child_count[i] = len(children)
+            if children:
+                self._pending[i] = children
+        return start
+
+    def __getitem__(self, key):
+        """节点（编号、切片或编号数组）对应的 RegionStats，切片时共用 counts"""
+        # 数组按容量分配，负数编号与切片都相对于已展开的节点，-1 是最后一个节点
+        if isinstance(key, (int, np.integer)):
+            key = slice(*slice(key, key + 1 or None).indices(self._size))
+        elif isinstance(key, slice):
+            key = slice(*key.indices(self._size))
+        return RegionStats(self.name_ids[key], self.counts[key], None, self.table)
+
+    def name(self, node):
+        return self.table.names[self.name_ids[node]]
+
+    def _expand(self, node):
+        children = self._pending.pop(node, None)
+        if children is not None:
+            self.child_start[node] = self._append(node, self.level[node] + 1, children)
+
+    def expand_all(self):
+        """展开全部城市"""
+        for node in list(self._pending):
+            self._expand(node)
+        return self
+
+    def children(self, node=0):
+        """node 的全部子节点编号"""
+        self._expand(node)
+        start = self.child_start[node]
+        return np.arange(start, start + self.child_count[node])
+
+    def find(self, *path):
+        """按名称路径查找节点，如 find('广东', '广州')；路径可以省略开头的国家"""
+        node = 0
+        if path and path[0] == self.name(0):
+            path = path[1:]
+        for name in path:
+            self._expand(node)
+            node = self._lookup[(node, name)]
+        return node
+
+    def ancestors(self, node):
+        """从 node 到根的节点编号"""
+        chain = [node]
+        while self.parent[node] >= 0:
+            node = int(self.parent[node])
+            chain.append(node)
+        return chain
+
+    def path(self, node):
+        """从根到 node 的名称路径"""
+        return tuple(self.name(i) for i in reversed(self.ancestors(node)))
+
+    def rollup(self, node, level):
+        """node 所属的 level 级地区"""
+        level = LEVELS.index(level)
+        for i in self.ancestors(node):
+            if self.level[i] == level:
+                return i
+        raise ValueError('{} 没有 {} 级的上级地区'.format(self.name(node), LEVELS[level]))
+
+    def totals(self, node):
+        """node 的各项数字：nowConfirm, confirm, heal, dead"""
+        return dict(zip(FIELDS, self.counts[node].tolist()))
+
+    def nodes(self, level, parent=None):
+        """level 级（'country'、'province'、'city'）的节点编号，给出 parent 时只取其下属地区
+
+        parent 可以是节点编号、名称或名称路径。
+        """
+        level = LEVELS.index(level)
+        if parent is None:
+            parents = [0]
+        elif isinstance(parent, (int, np.integer)):
+            parents = [parent]
+        else:
+            parents = [self.find(*parent) if isinstance(parent, tuple) else self.find(parent)]
+        ids = np.asarray(parents, dtype=np.int64)
+        for _ in range(level - self.level[parents[0]]):
+            ids = np.concatenate([self.children(p) for p in ids] or [ids[:0]])
+        return ids
+
+    def stats(self, level='province', parent=None):
+        """level 级地区的 RegionStats；同一上级（或按顺序全部展开后同一层）的节点连续，
+        此时直接是 counts 的切片视图，市级的 group_ids 为所属省份"""
+        ids = self.nodes(level, parent)
+        if len(ids) and ids[-1] - ids[0] + 1 == len(ids):
+            stats = self[int(ids[0]):int(ids[-1]) + 1]
+        else:
+            stats = self[ids]
+        if level == 'city':
+            stats.group_ids = self.name_ids[self.parent[ids]]
+        return stats
+
+    def frame(self, level='province', parent=None):
+        """level 级地区的表格，省级、市级的列与 extract_domestic 结果的 to_frame 一致"""
+        return self.stats(level, parent).to_frame(level, 'province' if level == 'city' else None)
@@ -0,0 +1,206 @@
+# coding: utf-8
+"""按列存放的地区统计容器
+
+* counts：一块 (N, 4) 的 int64 数组，列依次为 FIELDS；
+* name_ids / group_ids：int32 编号，对应同一个 NameTable 中的名称。名称表属于
+  各自的索引或容器，不在进程内全局共用，随它们一起释放。
+
+切片、to_frame、column 都直接引用 counts，不复制数字：foreign 是 world 的切片，
+pandas 拿到的是同一块内存上的 DataFrame。常驻的数字本身与原来的多份 DataFrame
+相差不大，build 的耗时也相近（benchmark.py regionstats）。图表与词云的
+(名称, 数值) 序列和映射由 query.View 给出。
+"""
+
+from array import array
+from itertools import islice
+from collections.abc import Mapping
+
+import numpy as np
+
+FIELDS = ('nowConfirm', 'confirm', 'heal', 'dead')
+CHUNK = 1024  # from_records 每批追加的记录数
+
+
+class NameTable:
+    """名称驻留表：名称与 int32 编号一一对应"""
+
+    __slots__ = ('names', '_ids')
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """name 的编号，第一次出现时分配"""
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def ids(self, names):
+        """一组名称的编号数组"""
+        names = list(names)
+        return np.fromiter((self.intern(name) for name in names), dtype=np.int32,
+                           count=len(names))
+
+    def lookup(self, ids):
+        """编号数组对应的名称列表"""
+        names = self.names
+        return [names[i] for i in ids.tolist()]
+
+
+class FrequencyView(Mapping):
+    """{名称: 数值} 的只读映射，直接引用名称列表与数值列，供词云使用"""
+
+    __slots__ = ('_names', '_values', '_index')
+
+    def __init__(self, names, values):
+        self._names = names
+        self._values = values
+        self._index = None
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __getitem__(self, name):
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self._names)}
+        return self._values[self._index[name]].item()
+
+    def items(self):
+        return zip(self._names, self._values.tolist())
+
+
+class RegionStatsBuilder:
+    """分批追加地区记录，最后得到 RegionStats
+
+    名称编号与各列数字追加到 array 缓冲区中，build 时才拷入一块 counts；
+    记录本身不会被收集成列表，流式读出的记录每批处理完就可以释放。
+    nowConfirm 的规则只在这里：记录给出时沿用，没有时由 confirm - heal - dead 得到。
+    """
+
+    __slots__ = ('table', '_names', '_groups', '_columns', '_derive')
+
+    def __init__(self, table=None):
+        self.table = NameTable() if table is None else table
+        self._names = array('i')
+        self._groups = array('i')
+        self._columns = [array('q') for _ in FIELDS]
+        self._derive = array('b')  # 各行的 nowConfirm 是否需要计算
+
+    def __len__(self):
+        return len(self._names)
+
+    def extend(self, names, counts, groups=None):
+        """追加一批地区；counts 与 names 一一对应，是含 confirm/heal/dead（可选 nowConfirm）
+        的 dict 序列，groups 为各地区的分组名称"""
+        intern = self.table.intern
+        self._names.extend([intern(name) for name in names])
+        if groups is not None:
+            self._groups.extend([intern(group) for group in groups])
+        now = [c.get('nowConfirm') for c in counts]
+        self._derive.extend([value is None for value in now])
+        self._columns[0].extend([value or 0 for value in now])
+        for column, key in zip(self._columns[1:], FIELDS[1:]):
+            column.extend([c[key] for c in counts])
+
+    def build(self):
+        n = len(self._names)
+        if self._groups and len(self._groups) != n:
+            raise ValueError('只有部分地区给出了分组')
+        counts = np.empty((n, len(FIELDS)), dtype=np.int64)
+        for j, column in enumerate(self._columns):
+            counts[:, j] = np.frombuffer(column, dtype=np.int64)
+        stats = RegionStats(np.array(self._names, dtype=np.int32), counts,
+                            np.array(self._groups, dtype=np.int32) if self._groups else None,
+                            self.table)
+        derive = np.frombuffer(self._derive, dtype=np.int8).astype(bool)
+        if derive.all():
+            stats.derive_now_confirm()
+        elif derive.any():
+            stats.derive_now_confirm(derive)
+        return stats
+
+
+class RegionStats:
+    __slots__ = ('name_ids', 'group_ids', 'counts', 'table')
+
+    def __init__(self, name_ids, counts, group_ids, table):
+        """counts 形状为 (N, len(FIELDS))，不会被复制；编号对应 table 中的名称"""
+        if counts.ndim != 2 or counts.shape != (len(name_ids), len(FIELDS)):
+            raise ValueError('counts 的形状应为 ({}, {})'.format(len(name_ids), len(FIELDS)))
+        self.name_ids = name_ids
+        self.group_ids = group_ids
+        self.counts = counts
+        self.table = table
+
+    @classmethod
+    def from_records(cls, records, get_counts=lambda r: r, group=None, table=None):
+        """由 foreignList 等记录（列表或流式读出的迭代器）每 CHUNK 条一批追加，
+        见 RegionStatsBuilder
+
+        get_counts(record) 返回含 confirm/heal/dead（可选 nowConfirm）的 dict，
+        group 为分组字段名（如 'continent'）。
+        """
+        builder = RegionStatsBuilder(table)
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, CHUNK))
+            if not chunk:
+                return builder.build()
+            builder.extend([r['name'] for r in chunk], [get_counts(r) for r in chunk],
+                           None if group is None else [r.get(group, '') for r in chunk])
+
+    def derive_now_confirm(self, rows=None):
+        """原地计算 nowConfirm = confirm - heal - dead，rows 为布尔掩码时只计算这些行"""
+        if rows is not None:
+            counts = self.counts[rows]
+            self.counts[rows, 0] = counts[:, 1] - counts[:, 2] - counts[:, 3]
+            return self
+        now = self.counts[:, 0]
+        np.subtract(self.counts[:, 1], self.counts[:, 2], out=now)
+        np.subtract(now, self.counts[:, 3], out=now)
+        return self
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    def __getitem__(self, key):
+        """切片返回共用 counts 的视图；整数数组、布尔数组会复制所选的行"""
+        if isinstance(key, (int, np.integer)):
+            key = slice(key, key + 1 or None)
+        groups = None if self.group_ids is None else self.group_ids[key]
+        return RegionStats(self.name_ids[key], self.counts[key], groups, self.table)
+
+    def names(self):
+        return self.table.lookup(self.name_ids)
+
+    def groups(self):
+        return None if self.group_ids is None else self.table.lookup(self.group_ids)
+
+    def column(self, field):
+        """某一列，counts 上的视图"""
+        return self.counts[:, FIELDS.index(field)]
+
+    def find(self, name):
+        """名称对应的行号，没有时返回 -1"""
+        i = self.table._ids.get(name)
+        rows = np.flatnonzero(self.name_ids == i) if i is not None else ()
+        return int(rows[0]) if len(rows) else -1
+
+    def to_frame(self, name_column, group_column=None):
+        """共用 counts 内存的 DataFrame：[group_column,] name_column, *FIELDS"""
+        import pandas as pd
+
+        frame = pd.DataFrame(self.counts, columns=list(FIELDS), copy=False)
+        frame.insert(0, name_column, self.names())
+        if group_column is not None:
+            frame.insert(0, group_column, self.groups())
+        return frame
@@ -0,0 +1,126 @@
+# coding: utf-8
+"""pyecharts 地图与柱状图的批量渲染
+
+每张图用一个 ChartSpec 描述（类型、数据、分段配色、输出路径），
+render_charts 把它们分发到进程池并行渲染，返回每张图的渲染耗时。
+每个工作进程只初始化一次 pyecharts 配置并编译一次模板，
+所有输出文件都引用同一个静态资源地址，不各自内嵌脚本。
+"""
+
+import os
+import time
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+ONLINE_HOST = 'https://assets.pyecharts.org/assets/'
+TEMPLATE = 'simple_chart.html'
+
+ChartSpec = namedtuple('ChartSpec', [
+    'kind',  # 'map' 或 'bar'
+    'path',  # 输出 html 路径
+    'title',
+    'data',  # [(名称, 数值), ...]
+    'series_name',
+    'maptype',  # 地图类型，如 'china'、'world'
+    'pieces',  # VisualMapOpts 分段配置
+    'width',
+    'height',
+    'x_rotate',  # x 轴标签旋转角度
+    'y_rotate',
+    'show_label',  # 是否在地图上显示地区名称
+])
+ChartSpec.__new__.__defaults__ = ('', None, None, '900px', '500px', 0, 0, True)
+
+RenderResult = namedtuple('RenderResult', ['path', 'seconds'])
+
+_asset_root = None  # 离线资源目录，见 assets.py
+
+
+def _init_worker(js_host=ONLINE_HOST, asset_root=None):
+    """设置静态资源地址并预编译模板（每个进程只执行一次），返回恢复原设置的 restore()"""
+    global _asset_root
+    from pyecharts.globals import CurrentConfig
+
+    saved = CurrentConfig.ONLINE_HOST, _asset_root
+    CurrentConfig.ONLINE_HOST = js_host
+    CurrentConfig.GLOBAL_ENV.get_template(TEMPLATE)
+    _asset_root = asset_root
+    restore_assets = None
+    if asset_root is not None:
+        import assets
+
+        restore_assets = assets.install(asset_root)
+
+    def restore():
+        global _asset_root
+        CurrentConfig.ONLINE_HOST, _asset_root = saved
+        if restore_assets is not None:
+            restore_assets()
+
+    return restore
+
+
+def build_chart(spec, js_host=''):
+    """由 ChartSpec 构造 pyecharts 图表对象，js_host 为空时使用全局资源地址"""
+    import pyecharts.options as opts
+    from pyecharts.charts import Bar, Map
+
+    init_opts = opts.InitOpts(width=spec.width, height=spec.height, js_host=js_host)
+    if spec.kind == 'map':
+        chart = Map(init_opts=init_opts)
+        chart.add(spec.series_name, [list(z) for z in spec.data],
+                  maptype=spec.maptype, is_map_symbol_show=False)
+        chart.set_global_opts(
+            title_opts=opts.TitleOpts(title=spec.title),
+            visualmap_opts=opts.VisualMapOpts(is_piecewise=True, pieces=spec.pieces))
+        if not spec.show_label:
+            chart.set_series_opts(label_opts=opts.LabelOpts(is_show=False))
+    elif spec.kind == 'bar':
+        chart = Bar(init_opts=init_opts)
+        chart.add_xaxis([name for name, _ in spec.data])
+        chart.add_yaxis(spec.series_name, [value for _, value in spec.data])
+        chart.set_global_opts(
+            title_opts=opts.TitleOpts(title=spec.title),
+            xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=spec.x_rotate)),
+            yaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=spec.y_rotate)))
+    else:
+        raise ValueError('未知图表类型：{}'.format(spec.kind))
+    return chart
+
+
+def render_chart(spec):
+    """渲染单张图，返回 RenderResult"""
+    start = time.perf_counter()
+    directory = os.path.dirname(spec.path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    js_host = ''
+    if _asset_root is not None:
+        import assets
+
+        js_host = assets.js_host_for(spec.path, _asset_root)
+    build_chart(spec, js_host).render(spec.path, template_name=TEMPLATE)
+    return RenderResult(spec.path, time.perf_counter() - start)
+
+
+def render_charts(specs, processes=None, js_host=ONLINE_HOST, asset_root=None):
+    """并行渲染多张图，按 specs 顺序返回 RenderResult
+
+    processes=1 时在当前进程内依次渲染，结束后恢复 pyecharts 的全局设置。
+    给出 asset_root 时使用该目录下的离线资源（需先用 assets.vendor_assets 准备好），
+    页面以相对路径引用。
+    """
+    specs = list(specs)
+    if processes == 1 or len(specs) <= 1:
+        restore = _init_worker(js_host, asset_root)
+        try:
+            return [render_chart(spec) for spec in specs]
+        finally:
+            restore()
+    workers = min(processes or os.cpu_count() or 1, len(specs))
+    # 流水线在工作线程中调用本函数，fork 会复制其他线程持有的锁，改用 spawn
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(js_host, asset_root),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(render_chart, specs))
@@ -0,0 +1,301 @@
+# coding: utf-8
+"""本地 HTTP 接口：在内存中提供最新数据与已生成的图表
+
+只用 asyncio 的 streams 实现一个最小的 HTTP/1.1 服务（支持 keep-alive），
+不引入额外依赖。最新的 china_enriched / world_enriched 快照载入内存后，
+为每个数值列预先算好排序索引：
+
+    GET /api/<china|world>/top?metric=nowConfirm&n=10     按指标取前 n 名，O(n)
+    GET /api/<china|world>/filter?metric=deadRate&min=0.01&max=0.05
+                                                          二分查找指标区间，O(log N + k)
+    GET /api/<china|world>/region/<名称>                  单个地区，O(1)
+    GET /charts/<文件名>                                  country.html、词云 PNG 等
+    GET /healthz
+
+所有响应都带 ETag，If-None-Match 命中时返回 304。后台任务定期检查快照与图表
+文件，有更新时整体替换内存中的数据，正在处理的请求不受影响。
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import mimetypes
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import numpy as np
+
+from store import SnapshotStore
+
+HOST = '127.0.0.1'
+PORT = 8000
+RELOAD_SECONDS = 5
+RESPONSE_CACHE = 1024
+MAX_BODY = 64 * 1024  # 不超过该长度的请求体会被读掉丢弃，连接可以继续复用
+KINDS = {'china': ('china_enriched', 'province'), 'world': ('world_enriched', 'country')}
+STATUS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+          405: 'Method Not Allowed'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=''):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_value(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+class Dataset:
+    """一张地区表及其各数值列的排序
+
+    排序取自 query.Query 与 ranking.RankingIndex，与图表的排名规则相同：
+    数值相同按行号，NaN 总在最后。
+    """
+
+    def __init__(self, frame, name_column):
+        from query import Query
+        from ranking import RankingIndex
+
+        columns = list(frame.columns)
+        cells = frame.astype(object).where(frame.notna(), None)
+        self.rows = [{column: _json_value(value) for column, value in zip(columns, row)}
+                     for row in cells.itertuples(index=False, name=None)]
+        self.by_name = {row[name_column]: i for i, row in enumerate(self.rows)}
+        metrics = [column for column in columns if frame[column].dtype.kind in 'iuf']
+        ranking = RankingIndex(metrics)
+        ranking.update(frame, name_column)
+        self.query = Query(frame, ranking)
+        self.metrics = {}
+        for metric in metrics:
+            # 载入时算好两个方向的置换，请求只读缓存
+            ascending = self.query.order(metric, ascending=True)
+            values = self.query[metric].astype(np.float64)[ascending]
+            self.metrics[metric] = (self.query.order(metric, ascending=False), ascending, values)
+
+    def _metric(self, metric):
+        try:
+            return self.metrics[metric]
+        except KeyError:
+            raise HttpError(400, '未知指标：{}'.format(metric))
+
+    def top(self, metric, n):
+        descending = self._metric(metric)[0]
+        return [self.rows[i] for i in descending[:n]]
+
+    def filter(self, metric, low=None, high=None):
+        _, ascending, values = self._metric(metric)
+        lo = 0 if low is None else np.searchsorted(values, low, side='left')
+        hi = np.searchsorted(values, np.inf if high is None else high, side='right')
+        return [self.rows[i] for i in ascending[lo:hi]]
+
+    def region(self, name):
+        try:
+            return self.rows[self.by_name[name]]
+        except KeyError:
+            raise HttpError(404, '没有该地区：{}'.format(name))
+
+
+class Snapshot:
+    """某一时刻的全部数据与图表，载入后只读"""
+
+    def __init__(self, datasets, artifacts, version):
+        self.datasets = datasets  # {'china': Dataset, 'world': Dataset}
+        self.artifacts = artifacts  # {文件名: (内容, ETag, Content-Type)}
+        self.version = version
+        self.responses = OrderedDict()  # {请求路径: (内容, ETag)}
+
+
+class ApiServer:
+    def __init__(self, store_root='snapshots', artifacts=(), host=HOST, port=PORT,
+                 reload_seconds=RELOAD_SECONDS):
+        self.store = SnapshotStore(store_root)
+        self.artifact_paths = list(artifacts)
+        self.host = host
+        self.port = port
+        self.reload_seconds = reload_seconds
+        self.snapshot = None
+        self._signature = None
+        self._server = None
+        self._reloader = None
+
+    # ## 数据载入
+
+    def _current_signature(self):
+        signature = []
+        for kind, _ in KINDS.values():
+            snapshots = self.store.snapshots(kind)
+            if snapshots:
+                path = snapshots[-1][1]
+                signature.append((path, os.path.getmtime(path)))
+        for path in self.artifact_paths:
+            if os.path.isfile(path):
+                signature.append((path, os.path.getmtime(path)))
+            elif os.path.isdir(path):
+                signature.extend((entry.path, entry.stat().st_mtime)
+                                 for entry in os.scandir(path) if entry.is_file())
+        return tuple(sorted(signature))
+
+    def _artifact_files(self):
+        for path in self.artifact_paths:
+            if os.path.isfile(path):
+                yield os.path.basename(path), path
+            elif os.path.isdir(path):
+                for entry in os.scandir(path):
+                    if entry.is_file():
+                        yield '{}/{}'.format(os.path.basename(path.rstrip('/')), entry.name), \
+                            entry.path
+
+    def reload(self, force=False):
+        """快照或图表有变化时重新载入，返回是否载入了新数据"""
+        signature = self._current_signature()
+        if not force and signature == self._signature:
+            return False
+        datasets = {}
+        for name, (kind, name_column) in KINDS.items():
+            frame = self.store.read(kind)
+            if frame is not None:
+                datasets[name] = Dataset(frame, name_column)
+        artifacts = {}
+        for name, path in self._artifact_files():
+            with open(path, 'rb') as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            if content_type.startswith('text/'):
+                content_type += '; charset=utf-8'
+            artifacts[name] = (body, '"{}"'.format(hashlib.sha256(body).hexdigest()[:32]),
+                               content_type)
+        version = hashlib.sha256(repr(signature).encode('utf-8')).hexdigest()[:16]
+        self.snapshot = Snapshot(datasets, artifacts, version)
+        self._signature = signature
+        return True
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as exc:
+                print('重新载入失败：{!r}'.format(exc), flush=True)
+
+    # ## 请求处理
+
+    def _api(self, snapshot, path, query):
+        parts = path.strip('/').split('/')  # api/<kind>/<action>[/名称]
+        if len(parts) < 3 or parts[2] not in ('top', 'filter', 'region'):
+            raise HttpError(404)
+        dataset = snapshot.datasets.get(parts[1])
+        if dataset is None:
+            raise HttpError(404, '没有 {} 数据'.format(parts[1]))
+        action = parts[2]
+        try:
+            if action == 'top':
+                n = int(query.get('n', ['10'])[0])
+                return dataset.top(query.get('metric', ['nowConfirm'])[0], max(n, 0))
+            if action == 'filter':
+                low, high = query.get('min', [None])[0], query.get('max', [None])[0]
+                return dataset.filter(query.get('metric', ['deadRate'])[0],
+                                      None if low is None else float(low),
+                                      None if high is None else float(high))
+        except ValueError:
+            raise HttpError(400, '参数格式错误')
+        if len(parts) != 4:
+            raise HttpError(404)
+        return dataset.region(parts[3])
+
+    def handle(self, target):
+        """处理一个 GET 请求，返回 (状态码, 内容, ETag, Content-Type)"""
+        snapshot = self.snapshot
+        url = urlsplit(target)
+        path = unquote(url.path)
+        if path == '/healthz':
+            return 200, b'ok', None, 'text/plain'
+        if path.startswith('/charts/'):
+            artifact = snapshot.artifacts.get(path[len('/charts/'):])
+            if artifact is None:
+                raise HttpError(404)
+            body, etag, content_type = artifact
+            return 200, body, etag, content_type
+        if not path.startswith('/api/'):
+            raise HttpError(404)
+        cached = snapshot.responses.get(target)
+        if cached is None:
+            result = self._api(snapshot, path, parse_qs(url.query))
+            body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+            cached = (body, '"{}-{}"'.format(
+                snapshot.version, hashlib.sha256(target.encode('utf-8')).hexdigest()[:16]))
+            snapshot.responses[target] = cached
+            if len(snapshot.responses) > RESPONSE_CACHE:
+                snapshot.responses.popitem(last=False)
+        return (200,) + cached + ('application/json; charset=utf-8',)
+
+    async def _serve_client(self, reader, writer):
+        try:
+            while True:
+                request = await reader.readuntil(b'\r\n\r\n')
+                lines = request.decode('latin-1').split('\r\n')
+                method, target, version = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        key, value = line.split(':', 1)
+                        headers[key.strip().lower()] = value.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                length = int(headers.get('content-length') or 0)
+                if (method not in ('GET', 'HEAD') or 'transfer-encoding' in headers
+                        or length > MAX_BODY):
+                    keep_alive = False  # 不读取请求体，回应后关闭连接
+                elif length:
+                    await reader.readexactly(length)
+                try:
+                    if method not in ('GET', 'HEAD'):
+                        raise HttpError(405)
+                    status, body, etag, content_type = self.handle(target)
+                except HttpError as exc:
+                    status, etag, content_type = exc.status, None, 'application/json; charset=utf-8'
+                    body = json.dumps({'error': str(exc) or STATUS[exc.status]},
+                                      ensure_ascii=False).encode('utf-8')
+                if etag is not None and headers.get('if-none-match') == etag:
+                    status, body = 304, b''
+                head = ['HTTP/1.1 {} {}'.format(status, STATUS[status]),
+                        'Content-Type: ' + content_type,
+                        'Content-Length: {}'.format(len(body)),
+                        'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+                if etag is not None:
+                    head.append('ETag: ' + etag)
+                if status == 405:
+                    head.append('Allow: GET, HEAD')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError,
+                ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """载入数据并开始监听，返回 asyncio.Server"""
+        if self.snapshot is None:
+            await asyncio.to_thread(self.reload, True)
+        self._server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.reload_seconds:
+            self._reloader = asyncio.create_task(self._reload_loop())
+        return self._server
+
+    async def serve_forever(self):
+        server = await self.start()
+        print('在 http://{}:{}/ 提供数据与图表'.format(self.host, self.port), flush=True)
+        async with server:
+            await server.serve_forever()
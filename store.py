@@ -0,0 +1,135 @@
+# coding: utf-8
+"""按 lastUpdateTime 追加保存的列式快照库
+
+每次抓取的表写成一个 Feather（默认，不压缩，可内存映射读取）或 Parquet 文件，
+目录按数据类别和日期分区：
+
+    snapshots/<kind>/date=2020-11-25/20201125T100000.feather
+
+Excel 只作为可选导出保留。需要安装 pyarrow。
+"""
+
+import os
+import glob
+from datetime import datetime
+
+import pandas as pd
+
+STORE_DIR = 'snapshots'
+FORMATS = ('feather', 'parquet')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_STAMP_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def _pyarrow():
+    try:
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('快照库需要 pyarrow：pip install pyarrow')
+    return pyarrow
+
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, TIME_FORMAT)
+
+
+class SnapshotStore:
+    """按数据类别（如 china、foreign）分区的快照库"""
+
+    def __init__(self, root=STORE_DIR, fmt='feather'):
+        if fmt not in FORMATS:
+            raise ValueError('fmt 必须是 {} 之一'.format(FORMATS))
+        self.root = root
+        self.fmt = fmt
+
+    def path(self, kind, last_update_time):
+        stamp = _parse_time(last_update_time)
+        return os.path.join(self.root, kind, 'date={:%Y-%m-%d}'.format(stamp),
+                            '{}.{}'.format(stamp.strftime(_STAMP_FORMAT), self.fmt))
+
+    def columns(self, path):
+        """快照文件中的列名（只读取 schema）"""
+        pa = _pyarrow()
+        if self.fmt == 'feather':
+            with pa.ipc.open_file(path) as reader:
+                return reader.schema.names
+        return pa.parquet.read_schema(path).names
+
+    def write(self, kind, frame, last_update_time, overwrite=False):
+        """追加一份快照，返回其路径；同一 lastUpdateTime 已有内容相同的快照时不重复写入
+
+        快照只按 lastUpdateTime 命名，同名快照的内容不同（数据在同一时间戳下被修订，
+        或旧版本代码写出的列不同，如缺少 continent）时会被替换，而不是一直留在库中。
+        """
+        pa = _pyarrow()
+        path = self.path(kind, last_update_time)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if not overwrite and os.path.exists(path) and self._same(path, table):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())  # 回填时多个进程可能写同一份快照
+        if self.fmt == 'feather':
+            pa.feather.write_feather(table, tmp, compression='uncompressed')
+        else:
+            pa.parquet.write_table(table, tmp)
+        os.replace(tmp, path)
+        return path
+
+    def _same(self, path, table):
+        """path 处的快照与 table 的列和数据是否都相同"""
+        if self.columns(path) != table.schema.names:
+            return False
+        return self._read_table(path, None, True).equals(table)
+
+    def snapshots(self, kind):
+        """返回 [(lastUpdateTime, 路径)]，按时间升序"""
+        result = []
+        pattern = os.path.join(self.root, kind, 'date=*', '*.' + self.fmt)
+        for path in glob.glob(pattern):
+            stamp = os.path.splitext(os.path.basename(path))[0]
+            result.append((datetime.strptime(stamp, _STAMP_FORMAT), path))
+        return sorted(result)
+
+    def _read_table(self, path, columns, memory_map):
+        pa = _pyarrow()
+        if self.fmt == 'feather':
+            return pa.feather.read_table(path, columns=columns, memory_map=memory_map)
+        return pa.parquet.read_table(path, columns=columns, memory_map=memory_map)
+
+    def read(self, kind, last_update_time=None, columns=None, memory_map=True):
+        """读取一份快照（默认最新），columns 指定只读取的列"""
+        if last_update_time is None:
+            snapshots = self.snapshots(kind)
+            if not snapshots:
+                return None
+            path = snapshots[-1][1]
+        else:
+            path = self.path(kind, last_update_time)
+            if not os.path.exists(path):
+                return None
+        return self._read_table(path, columns, memory_map).to_pandas()
+
+    def read_range(self, kind, start=None, end=None, columns=None, memory_map=True):
+        """读取时间区间 [start, end] 内的所有快照，附加 lastUpdateTime 列"""
+        start = _parse_time(start) if start is not None else None
+        end = _parse_time(end) if end is not None else None
+        frames = []
+        for stamp, path in self.snapshots(kind):
+            if (start and stamp < start) or (end and stamp > end):
+                continue
+            frame = self._read_table(path, columns, memory_map).to_pandas()
+            frame['lastUpdateTime'] = stamp
+            frames.append(frame)
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
+
+def export_excel(frame, path):
+    """可选的 Excel 导出（需要 openpyxl）"""
+    frame.to_excel(path, index=False)
+    return path
@@ -0,0 +1,237 @@
+# coding: utf-8
+"""getOnsInfo 响应的流式解析
+
+接口返回 ``{"ret": 0, "data": "<转义后的 JSON 字符串>"}``。原来的做法先解析外层，
+再 json.loads 内层字符串，完整响应文本和两棵对象树会同时驻留内存。
+
+这里按块读取响应体：外层只增量反转义 ``data`` 字符串，内层只扫描结构字符，
+遇到目标数组（如 areaTree[0].children）的元素时单独解析并逐个产出，
+任意时刻只持有一个省份/国家的记录。lastUpdateTime 等少数成员可以通过
+captured 顺带取出。
+"""
+
+import re
+import sys
+import gzip
+import json
+import codecs
+from itertools import chain
+
+CHUNK_SIZE = 64 * 1024
+
+# feed 名称 -> 要逐条产出的数组路径
+RECORD_PATHS = {
+    'disease_h5': ('areaTree', 0, 'children'),
+    'disease_foreign': ('foreignList',),
+}
+
+# 可以顺带取出的成员路径，作为 captured 的键传入
+LAST_UPDATE_TIME = ('lastUpdateTime',)
+CHINA_TOTAL = ('areaTree', 0, 'total')
+
+_WRAPPED = re.compile(r'\s*\{\s*"(?:ret|data)"\s*:')
+_DATA_KEY = re.compile(r'"data"\s*:\s*"')
+_SPACE = re.compile(r'\s*')
+# 普通字符的连续片段由单个字符类一次匹配，只在转义处进入重复组（3.11 起为占有量词）；
+# 逐字符的 (?:a|b)* 会为块中每个字符保存回溯状态，峰值内存是块大小的上百倍
+_POSSESSIVE = '+' if sys.version_info >= (3, 11) else ''
+# 可以完整解码的转义字符串前缀：高代理项必须与随后的低代理项成对出现
+_ESCAPED = re.compile(
+    r'[^"\\]*(?:'
+    r'(?:\\u[dD][89abAB][0-9a-fA-F]{2}\\u[0-9a-fA-F]{4}'
+    r'|\\u(?![dD][89abAB])[0-9a-fA-F]{4}'
+    r'|\\[^u])[^"\\]*)*' + _POSSESSIVE)
+# 内层 JSON 的结构记号；未闭合的字符串以 \Z 结尾，表示需要更多数据
+_TOKEN = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*' + _POSSESSIVE + r'(?:"|\\?\Z)|[{}\[\],:]')
+_decoder = json.JSONDecoder()
+
+
+def iter_data_text(chunks):
+    """由外层响应体的 bytes 块，逐段产出内层 data 字符串（已反转义）"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    started = False
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        if not started:
+            match = _DATA_KEY.search(pending)
+            if match is None:
+                pending = pending[-16:]
+                continue
+            pending = pending[match.end():]
+            started = True
+        end = _ESCAPED.match(pending).end()
+        if end:
+            yield json.loads('"' + pending[:end] + '"')
+        finished = end < len(pending) and pending[end] == '"'
+        pending = pending[end:]
+        if finished:
+            return
+    raise ValueError('响应中未找到完整的 data 字段')
+
+
+class _ItemScanner:
+    """在内层 JSON 文本中定位 paths 指向的数组，逐个解析其中的对象元素
+
+    路径之外只扫描结构记号；进入目标数组后，每个元素交给 raw_decode
+    一次性解析，数据不完整时保留该元素的文本等待下一块。captured 的键为
+    要顺带取出的对象成员路径（如 ('lastUpdateTime',)），读到时整体解析并写入。
+    """
+
+    def __init__(self, paths, captured=None):
+        self.paths = {tuple(path) for path in paths}
+        self.captured = {} if captured is None else captured
+        self.buf = ''
+        self.stack = []  # 每层为 [类型, 正在解析的子项键名或下标, 最近读到的字符串]
+        self.pending = None  # buf 开头尚未读完的目标元素（'item'）或成员值（'value'）及其路径
+
+    def _path(self):
+        return tuple(frame[1] for frame in self.stack)
+
+    def _target(self):
+        """当前所在的目标数组路径，不在目标数组中时返回 None"""
+        if not self.stack or self.stack[-1][0] != 'arr':
+            return None
+        path = self._path()[:-1]
+        return path if path in self.paths else None
+
+    def feed(self, text):
+        """读入一段文本，返回其中读完的 [(数组路径, 元素)]"""
+        self.buf += text
+        items = []
+        pos = 0
+        while True:
+            if self.pending is not None:
+                kind, path = self.pending
+                pos = _SPACE.match(self.buf, pos).end()
+                try:
+                    value, end = _decoder.raw_decode(self.buf, pos)
+                except ValueError:
+                    break
+                if kind == 'value':
+                    if end == len(self.buf):  # 数字可能还没有读完
+                        break
+                    self.captured[path] = value
+                else:
+                    items.append((path, value))
+                pos = end
+                self.pending = None
+                continue
+            match = _TOKEN.search(self.buf, pos)
+            if match is None:
+                pos = len(self.buf)
+                break
+            token = match.group()
+            if token[0] == '"':
+                if not _closed(token):
+                    pos = match.start()
+                    break
+                if self.stack and self.stack[-1][0] == 'obj':
+                    self.stack[-1][2] = token
+                pos = match.end()
+                continue
+            if token == '{':
+                path = self._target()
+                if path is not None:
+                    pos = match.start()
+                    self.pending = ('item', path)
+                    continue
+            pos = match.end()
+            if token == ':':
+                frame = self.stack[-1]
+                frame[1] = json.loads(frame[2])
+                path = self._path()
+                if path in self.captured:
+                    self.pending = ('value', path)
+            elif token == ',':
+                frame = self.stack[-1]
+                if frame[0] == 'arr':
+                    frame[1] += 1
+            elif token in '{[':
+                self.stack.append(['obj', None, None] if token == '{' else ['arr', 0, None])
+            else:
+                self.stack.pop()
+        self.buf = self.buf[pos:]
+        return items
+
+    def close(self):
+        if self.pending is not None:
+            raise ValueError('data 字段在数组元素中途结束')
+
+
+def _closed(token):
+    """字符串记号是否以未转义的引号结束"""
+    if len(token) < 2 or token[-1] != '"':
+        return False
+    backslashes = len(token) - 1 - len(token[:-1].rstrip('\\'))
+    return backslashes % 2 == 0
+
+
+def iter_tagged_items(text_chunks, paths, captured=None):
+    """从内层 JSON 文本块中逐个产出 (数组路径, 元素)，路径为 paths 之一"""
+    scanner = _ItemScanner(paths, captured)
+    for text in text_chunks:
+        yield from scanner.feed(text)
+    scanner.close()
+
+
+def iter_items(text_chunks, path, captured=None):
+    """从内层 JSON 文本块中逐个产出 path 所指数组的元素"""
+    for _, item in iter_tagged_items(text_chunks, [path], captured):
+        yield item
+
+
+def iter_text(chunks):
+    """由 bytes 块逐段产出内层 JSON 文本
+
+    接口原样的响应体（{"ret": ..., "data": "..."}）交给 iter_data_text 反转义，
+    已解出的 data 直接按 UTF-8 增量解码。
+    """
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= 64:
+            break
+    if _WRAPPED.match(head.decode('utf-8', 'ignore')):
+        yield from iter_data_text(chain([head], chunks))
+        return
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chain([head], chunks):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def iter_payload_records(chunks, name, captured=None):
+    """由原始响应体 bytes 块逐条产出某个 feed 的省份/国家记录"""
+    return iter_items(iter_data_text(chunks), RECORD_PATHS[name], captured)
+
+
+def iter_feed_records(chunks, captured=None):
+    """由响应体或已解出的 data 的 bytes 块逐条产出 (feed 名称, 记录)
+
+    不需要事先知道是哪个 feed：读到 RECORD_PATHS 中哪个数组，就按哪个 feed 产出。
+    """
+    feeds = {path: name for name, path in RECORD_PATHS.items()}
+    for path, item in iter_tagged_items(iter_text(chunks), feeds, captured):
+        yield feeds[path], item
+
+
+def iter_file_chunks(path, chunk_size=CHUNK_SIZE):
+    """按块读取归档文件（.gz 结尾时先解压）"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        yield from iter(lambda: f.read(chunk_size), b'')
+
+
+def iter_records(name, session=None, base_url=None, timeout=None, chunk_size=CHUNK_SIZE,
+                 captured=None):
+    """流式抓取单个 feed，逐条产出记录（disease_h5 为省份，disease_foreign 为国家）"""
+    from fetch import BASE_URL, TIMEOUT, feed_url, get_session
+
+    session = session or get_session()
+    url = feed_url(name, base_url or BASE_URL)
+    with session.get(url=url, timeout=timeout or TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        yield from iter_payload_records(response.iter_content(chunk_size), name, captured)
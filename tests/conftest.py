@@ -0,0 +1,25 @@
+# coding: utf-8
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.stubs import make_domestic, make_oversea, wrap_payload  # noqa: E402
+
+
+@pytest.fixture
+def domestic():
+    return make_domestic(n_provinces=4, n_cities=3)
+
+
+@pytest.fixture
+def oversea():
+    return make_oversea(n_countries=8)
+
+
+@pytest.fixture
+def payloads(domestic, oversea):
+    oversea = dict(oversea, lastUpdateTime=domestic['lastUpdateTime'])
+    return {'disease_h5': wrap_payload(domestic), 'disease_foreign': wrap_payload(oversea)}
@@ -0,0 +1,132 @@
+# coding: utf-8
+"""测试与基准共用的合成数据和本地 getOnsInfo 桩服务器"""
+
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# ## 合成数据
+
+def make_domestic(n_provinces=34, n_cities=10):
+    """生成 disease_h5 结构的合成数据"""
+    provinces = []
+    for p in range(n_provinces):
+        cities = []
+        for c in range(n_cities):
+            confirm = 100 + (p * 31 + c * 7) % 900
+            cities.append({
+                'name': '城市{}_{}'.format(p, c),
+                'total': {'confirm': confirm, 'heal': confirm // 2, 'dead': confirm // 50},
+            })
+        confirm = sum(city['total']['confirm'] for city in cities)
+        heal = sum(city['total']['heal'] for city in cities)
+        dead = sum(city['total']['dead'] for city in cities)
+        provinces.append({
+            'name': '省份{}'.format(p),
+            'total': {'confirm': confirm, 'heal': heal, 'dead': dead},
+            'children': cities,
+        })
+    total = {key: sum(p['total'][key] for p in provinces) for key in ('confirm', 'heal', 'dead')}
+    return {
+        'lastUpdateTime': '2020-11-25 10:00:00',
+        'areaTree': [{'name': '中国', 'total': total, 'children': provinces}],
+    }
+
+
+def make_oversea(n_countries=200):
+    """生成 disease_foreign 结构的合成数据"""
+    foreign = []
+    for i in range(n_countries):
+        confirm = 1000 + (i * 7919) % 500000
+        heal = confirm // 2
+        dead = confirm // 40
+        foreign.append({
+            'name': '国家{}'.format(i),
+            'continent': '大洲{}'.format(i % 6),
+            'confirm': confirm,
+            'heal': heal,
+            'dead': dead,
+            'nowConfirm': confirm - heal - dead,
+        })
+    return {'foreignList': foreign}
+
+
+def wrap_payload(data):
+    """包装成接口原样返回的 {'ret': 0, 'data': '<json 字符串>'}"""
+    return json.dumps({'ret': 0, 'data': json.dumps(data, ensure_ascii=False)},
+                      ensure_ascii=False).encode('utf-8')
+
+
+# ## 本地桩服务器
+
+class StubServer:
+    """在后台线程运行的本地 getOnsInfo 桩服务器
+
+    ``payloads`` 为 {feed 名称: 响应体 bytes}，``latency`` 模拟网络延迟（秒），
+    ``etag`` 为 True 时支持 If-None-Match 条件请求，``failures`` 为
+    {feed 名称: 次数}，该 feed 的前若干次请求返回 503（负数表示一直失败）。
+    """
+
+    def __init__(self, payloads, latency=0.0, etag=False, failures=None):
+        self.payloads = payloads
+        self.latency = latency
+        self.etag = etag
+        self.failures = dict(failures or {})
+        self.requests = 0
+        self.counts = {}  # feed 名称 -> 请求次数
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.requests += 1
+                name = parse_qs(urlparse(self.path).query).get('name', [''])[0]
+                stub.counts[name] = stub.counts.get(name, 0) + 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                failures = stub.failures.get(name, 0)
+                if failures < 0 or stub.counts[name] <= failures:
+                    self.send_error(503)
+                    return
+                body = stub.payloads.get(name)
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+                if stub.etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if stub.etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}/g2/getOnsInfo?name={{}}'.format(host, port)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
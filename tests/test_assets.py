@@ -0,0 +1,65 @@
+# coding: utf-8
+import os
+
+import pytest
+
+pytest.importorskip('pyecharts')
+
+from pyecharts.datasets import FILENAMES  # noqa: E402
+
+import assets  # noqa: E402
+from render import ChartSpec, render_charts  # noqa: E402
+
+
+@pytest.fixture
+def source(tmp_path):
+    """本地 pyecharts-assets 目录中的占位脚本"""
+    root = tmp_path / 'source'
+    (root / 'maps').mkdir(parents=True)
+    (root / 'echarts.min.js').write_bytes(b'/* echarts */')
+    (root / 'maps' / 'world.js').write_bytes(b'/* world */')
+    return str(root)
+
+
+def test_vendor_from_local_source(source, tmp_path):
+    root = str(tmp_path / 'assets')
+    files = assets.vendor_assets(('echarts', 'world'), root=root, source=source)
+    assert set(files) == {'echarts', 'world'}
+    for filename in files.values():
+        assert os.path.exists(os.path.join(root, filename))
+    # 已有的依赖不再读取来源
+    assert assets.vendor_assets(('echarts', 'world'), root=root, source='/nonexistent') == files
+
+
+def test_missing_source_raises_oserror(tmp_path):
+    with pytest.raises(OSError):
+        assets.vendor_assets(('echarts',), root=str(tmp_path / 'assets'),
+                             source=str(tmp_path / 'missing'))
+
+
+def test_install_restores_filenames(source, tmp_path):
+    root = str(tmp_path / 'assets')
+    files = assets.vendor_assets(('echarts', 'world'), root=root, source=source)
+    saved = {dep: FILENAMES[dep] for dep in ('echarts', 'world')}
+    restore = assets.install(root)
+    assert FILENAMES['echarts'] == [os.path.splitext(files['echarts'])[0], 'js']
+    restore()
+    assert {dep: FILENAMES[dep] for dep in saved} == saved
+
+
+def test_in_process_render_leaves_globals_untouched(source, tmp_path):
+    root = str(tmp_path / 'assets')
+    assets.vendor_assets(('echarts', 'world'), root=root, source=source)
+    saved = dict(FILENAMES)
+    spec = ChartSpec('map', str(tmp_path / 'out' / 'world.html'), 'map', [('China', 1)],
+                     maptype='world', pieces=[{'min': 1}])
+    render_charts([spec], processes=1, asset_root=root)
+    with open(spec.path, encoding='utf-8') as f:
+        html = f.read()
+    assert '../assets/' in html
+    assert dict(FILENAMES) == saved
+
+
+def test_js_host_for(tmp_path):
+    assert assets.js_host_for(str(tmp_path / 'charts' / 'a.html'), str(tmp_path / 'assets')) \
+        == '../assets/'
@@ -0,0 +1,84 @@
+# coding: utf-8
+import gzip
+import json
+
+from backfill import (FileResult, backfill, detect_feed, extract_generic, ingest_world,
+                      _pair_world)
+from store import SnapshotStore
+from tests.stubs import wrap_payload
+
+TOTAL = {'confirm': 10, 'heal': 5, 'dead': 1}
+
+
+def result(feed, last_update_time, china_total=None):
+    return FileResult(feed + '.json', feed, last_update_time, 1, china_total, None)
+
+
+def test_pair_world_uses_the_latest_earlier_domestic_snapshot():
+    morning, evening = dict(TOTAL, confirm=1), dict(TOTAL, confirm=2)
+    results = [
+        result('disease_foreign', '2020-11-24 08:00:00'),  # 早于所有国内快照，不配对
+        result('disease_h5', '2020-11-25 09:00:00', morning),
+        result('disease_h5', '2020-11-25 18:00:00', evening),
+        result('disease_foreign', '2020-11-25 12:00:00'),
+        result('disease_foreign', '2020-11-25 18:00:00'),
+    ]
+    assert _pair_world(results) == [('2020-11-25 12:00:00', morning),
+                                    ('2020-11-25 18:00:00', evening)]
+
+
+def test_generic_feed_falls_back_to_the_file_name():
+    data = {'lastUpdateTime': '2020-03-01 10:00:00', 'rows': [{'a': 1}, {'a': 2}],
+            'count': 2, 'empty': []}
+    assert detect_feed(data, 'archive/disease_other-20200301T100000.json') == 'disease_other'
+    assert detect_feed({'areaTree': []}, 'archive/x.json') == 'disease_h5'
+    frames = extract_generic('disease_other', data)
+    assert list(frames) == ['disease_other.rows']
+    assert frames['disease_other.rows']['a'].tolist() == [1, 2]
+
+
+def test_ingest_world_reports_errors(tmp_path):
+    world = ingest_world('2020-11-25 10:00:00', TOTAL, str(tmp_path))
+    assert world.feed == 'world' and world.rows == 0 and 'KeyError' in world.error
+
+
+def write_archive(archive, domestic, oversea):
+    archive.mkdir()
+    (archive / 'disease_h5.json').write_bytes(wrap_payload(domestic))
+    foreign = dict(oversea, lastUpdateTime='2020-11-25 12:00:00')
+    with gzip.open(str(archive / 'disease_foreign.json.gz'), 'wb') as f:
+        f.write(wrap_payload(foreign))
+
+
+def test_backfill_in_process(domestic, oversea, tmp_path):
+    archive = tmp_path / 'archive'
+    write_archive(archive, domestic, oversea)
+    (archive / 'broken.json').write_bytes(wrap_payload(domestic)[:100])
+    (archive / 'disease_other-1.json').write_text(json.dumps({'rows': [{'a': 1}]}))
+
+    progress = []
+    report = backfill(str(archive), str(tmp_path / 'snapshots'), processes=1,
+                      progress=lambda done, total: progress.append((done, total)))
+    assert report.files == 4 and progress[-1] == (4, 4)
+    assert sorted(path.rsplit('/', 1)[1] for path, _ in report.errors) == [
+        'broken.json', 'disease_other-1.json']
+    assert report.worlds == 1
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+    world = store.read('world_enriched')
+    assert len(world) == len(oversea['foreignList']) + 1
+    assert [stamp for stamp, _ in store.snapshots('world')] == [
+        stamp for stamp, _ in store.snapshots('foreign')]
+
+
+def test_world_errors_are_reported(domestic, oversea, tmp_path, monkeypatch):
+    import countries
+
+    def broken():
+        raise OSError('country_names.json')
+
+    monkeypatch.setattr(countries, 'load_country_index', broken)
+    write_archive(tmp_path / 'archive', domestic, oversea)
+    report = backfill(str(tmp_path / 'archive'), str(tmp_path / 'snapshots'), processes=1)
+    assert report.worlds == 0
+    assert [(path.rsplit('/', 1)[1], error) for path, error in report.errors] == [
+        ('disease_foreign.json.gz', 'OSError: country_names.json')]
@@ -0,0 +1,59 @@
+# coding: utf-8
+import itertools
+
+import numpy as np
+import pytest
+
+import binning
+
+
+def test_nice():
+    assert binning.nice([4873, 99, 1, 0, 125000]).tolist() == [4800, 99, 1, 0, 120000]
+
+
+@pytest.mark.parametrize('method', binning.METHODS)
+def test_pieces_are_contiguous(method):
+    values = np.random.default_rng(1).lognormal(5, 2, 300).astype(int)
+    values[:20] = 0
+    pieces = binning.pieces(values, method)
+    assert pieces[-1] == {'max': 0, 'label': '0', 'color': binning.ZERO_COLOR}
+    ranges = pieces[-2::-1]  # 由小到大
+    assert ranges[0]['min'] == 1 and 'max' not in ranges[-1]
+    for lo, hi in zip(ranges, ranges[1:]):
+        assert hi['min'] == lo['max'] + 1
+    assert len(ranges) <= binning.N_BINS
+
+
+def test_all_zero_and_unknown_method():
+    assert binning.breaks(np.zeros(5)) == (1,)
+    with pytest.raises(ValueError):
+        binning.breaks([1, 2, 3], 'kmeans')
+
+
+def test_breaks_are_cached_by_content():
+    values = np.arange(100)
+    first = binning.breaks(values, 'log')
+    assert binning.breaks(values.copy(), 'log') is first
+    assert binning.breaks(values, 'log', n_bins=3) != first
+
+
+def test_fisher_jenks_matches_brute_force():
+    values = np.array([1.0, 1.2, 1.3, 4.0, 4.2, 7.5, 8.0, 8.1, 15.0])
+    weights = np.array([1, 2, 1, 1, 3, 1, 1, 2, 1], dtype=float)
+
+    def cost(starts):
+        total = 0.0
+        for a, b in zip((0,) + starts, starts + (len(values),)):
+            x, w = values[a:b], weights[a:b]
+            total += (w * (x - np.average(x, weights=w)) ** 2).sum()
+        return total
+
+    best = min(itertools.combinations(range(1, len(values)), 3), key=cost)
+    assert tuple(binning._fisher_jenks(values, weights, 4).tolist()) == best
+
+
+def test_palette_interpolates():
+    assert binning.palette(len(binning.COLORS)) == binning.COLORS
+    colors = binning.palette(3)
+    assert colors[0] == binning.COLORS[0] and colors[-1] == binning.COLORS[-1].lower()
+
@@ -0,0 +1,59 @@
+# coding: utf-8
+import json
+
+from cache import ResponseCache
+from tests.stubs import wrap_payload
+
+
+def parse(body):
+    return json.loads(json.loads(body)['data'])
+
+
+def expire(cache, name):
+    meta = cache.meta(name)
+    meta['stored_at'] -= cache.ttl + 1
+    cache._write_meta(name, meta)
+
+
+def test_expired_entry_is_kept_for_offline_builds(domestic, tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.store('disease_h5', wrap_payload(domestic), parse, headers={'ETag': '"v1"'})
+    assert cache.conditional_headers('disease_h5') == {'If-None-Match': '"v1"'}
+    expire(cache, 'disease_h5')
+    assert cache.meta('disease_h5') is not None
+    assert cache.conditional_headers('disease_h5') == {}
+    assert ResponseCache(str(tmp_path), ttl=60).load('disease_h5', parse) == domestic
+
+
+def test_expired_entry_is_revalidated_in_full(domestic, tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    body = wrap_payload(domestic)
+    assert cache.store('disease_h5', body, parse) == (domestic, True)
+    assert cache.store('disease_h5', body, parse) == (domestic, False)
+    expire(cache, 'disease_h5')
+    assert cache.store('disease_h5', body, parse) == (domestic, True)
+    assert not cache.expired(cache.meta('disease_h5'))
+    assert cache.stats['misses'] == 2 and cache.stats['hits'] == 1
+
+
+def test_size_limit_evicts_least_recently_validated(domestic, oversea, tmp_path):
+    h5, foreign = wrap_payload(domestic), wrap_payload(oversea)
+    cache = ResponseCache(str(tmp_path), max_bytes=len(h5) + len(foreign) - 1)
+    cache.store('disease_h5', h5, parse)
+    cache.store('disease_foreign', foreign, parse)
+    assert cache.meta('disease_h5') is None
+    assert cache.load('disease_foreign', parse) == oversea
+    assert cache.stats['evictions'] == 1
+
+
+def test_entry_larger_than_the_limit_is_kept(domestic, tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=1)
+    cache.store('disease_h5', wrap_payload(domestic), parse)
+    assert cache.load('disease_h5', parse) == domestic
+    assert cache.stats['evictions'] == 0
+
+
+def test_metrics_text(domestic, tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.store('disease_h5', wrap_payload(domestic), parse)
+    assert 'covid_cache_misses_total 1\n' in cache.metrics_text()
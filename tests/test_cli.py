@@ -0,0 +1,58 @@
+# coding: utf-8
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cli_help_does_not_import_numpy():
+    code = ("import sys, demo\n"
+            "try:\n    demo.main(['--help'])\nexcept SystemExit:\n    pass\n"
+            "sys.exit('numpy' in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_all_runs_the_pipeline_end_to_end(payloads, tmp_path, monkeypatch, capsys):
+    """demo.main(['all'])：桩服务器代替接口，快照库与各项输出都写在 tmp_path 下"""
+    for module in ('pyecharts', 'matplotlib', 'wordcloud'):
+        pytest.importorskip(module)
+    import wordcloud.wordcloud
+
+    import clouds
+    import demo
+    import fetch
+    from store import SnapshotStore
+    from tests.stubs import StubServer
+
+    # wordcloud 自带的字体只有拉丁字母，中文词画成方框，不影响流程
+    font = os.path.join(os.path.dirname(wordcloud.wordcloud.__file__), 'DroidSansMono.ttf')
+    monkeypatch.setenv(clouds.FONT_ENV, font)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(demo, '_rankings', {})
+    clouds.get_service.cache_clear()
+    stages = ['fetch', 'build', 'enrich', 'render-maps', 'render-squares', 'wordcloud']
+    try:
+        with StubServer(payloads) as stub:
+            monkeypatch.setattr(fetch, 'BASE_URL', stub.base_url)
+            # 分组词云在 spawn 启动的进程池中生成，工作进程重新导入模块而不运行 main
+            assert demo.main(['all', '--online-assets']) == 0
+            first = capsys.readouterr().out
+            assert demo.main(['all', '--online-assets']) == 0
+            second = capsys.readouterr().out
+    finally:
+        clouds.get_service.cache_clear()
+
+    assert all('{:<16}已运行'.format(name) in first for name in stages)
+    for path in demo.MAP_OUTPUTS + demo.SQUARE_OUTPUTS + demo.WORDCLOUD_OUTPUTS:
+        assert (tmp_path / path).exists(), path
+    # 4 个省份、6 个合成大洲与中国所在的亚洲，各两个尺寸
+    assert len(os.listdir(str(tmp_path / demo.CLOUD_DIR))) == 2 * (4 + 6 + 1)
+    world = SnapshotStore(demo.STORE_DIR).read('world_enriched')
+    assert world['country'].tolist()[-1] == '中国' and 'deadRate' in world
+    # 数据没有变化：只有 fetch 重新请求，其余阶段跳过
+    assert '{:<16}已运行'.format('fetch') in second
+    assert all('{:<16}未变化，跳过'.format(name) in second for name in stages[1:])
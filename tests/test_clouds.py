@@ -0,0 +1,78 @@
+# coding: utf-8
+import os
+
+import pytest
+
+pytest.importorskip('wordcloud')
+
+import wordcloud.wordcloud  # noqa: E402
+
+import clouds  # noqa: E402
+from clouds import (CloudJob, CloudOutput, WordCloudService, find_font, quantize,  # noqa: E402
+                    render_batch)
+
+# wordcloud 自带的字体只有拉丁字母，测试只用英文词
+FONT = os.path.join(os.path.dirname(wordcloud.wordcloud.__file__), 'DroidSansMono.ttf')
+WORDS = {'alpha': 500, 'beta': 300, 'gamma': 120, 'delta': 40, 'epsilon': 7}
+
+
+@pytest.fixture
+def service(tmp_path):
+    return WordCloudService(FONT, cache_dir=str(tmp_path / 'cache'))
+
+
+def test_missing_cjk_font_is_an_error(monkeypatch, tmp_path):
+    monkeypatch.delenv(clouds.FONT_ENV, raising=False)
+    monkeypatch.setattr(clouds, 'FONT_DIR', str(tmp_path))
+    monkeypatch.setattr(clouds, 'FONT_CANDIDATES', [])
+    with pytest.raises(FileNotFoundError, match=clouds.FONT_ENV):
+        find_font()
+    monkeypatch.setenv(clouds.FONT_ENV, FONT)
+    assert find_font() == FONT
+
+
+def test_quantize_absorbs_small_changes():
+    nudged = {word: count * 1.004 for word, count in WORDS.items()}
+    assert quantize(nudged) == quantize(WORDS)
+    assert quantize(dict(WORDS, alpha=1000)) != quantize(WORDS)
+    with pytest.raises(ValueError):
+        quantize({'alpha': 0})
+
+
+def test_layout_is_cached_in_memory_and_on_disk(service, tmp_path):
+    first = service.layout(WORDS, 200, 120)
+    assert service.layout({word: count * 1.004 for word, count in WORDS.items()}, 200, 120) is first
+    assert service.stats == {'hits': 1, 'disk_hits': 0, 'misses': 1}
+    other = WordCloudService(FONT, cache_dir=str(tmp_path / 'cache'))
+    assert other.layout(WORDS, 200, 120) == first
+    assert other.stats == {'hits': 0, 'disk_hits': 1, 'misses': 0}
+
+
+def test_sizes_with_one_aspect_ratio_share_a_layout(service, tmp_path):
+    from PIL import Image
+
+    outputs = [CloudOutput(str(tmp_path / 'small.png'), 200, 120),
+               CloudOutput(str(tmp_path / 'large.png'), 400, 240)]
+    assert service.render(WORDS, outputs) == [output.path for output in outputs]
+    assert service.stats['misses'] == 1
+    assert Image.open(outputs[1].path).size == (400, 240)
+
+
+def test_render_batch_in_process(tmp_path):
+    jobs = [CloudJob(name, WORDS, [CloudOutput(str(tmp_path / '{}.png'.format(name)), 200, 120)])
+            for name in ('a', 'b')]
+    results = list(render_batch(jobs, processes=1, font_path=FONT, cache_dir=None))
+    assert [result.name for result in results] == ['a', 'b']
+    assert all(os.path.exists(path) for result in results for path in result.paths)
+
+
+def test_render_batch_pool_from_a_thread(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    jobs = [CloudJob(name, WORDS, [CloudOutput(str(tmp_path / '{}.png'.format(name)), 200, 120)])
+            for name in ('a', 'b', 'c')]
+    with ThreadPoolExecutor(1) as threads:
+        results = threads.submit(lambda: list(render_batch(
+            jobs, processes=2, font_path=FONT, cache_dir=None, max_tasks_per_child=1))).result()
+    assert sorted(result.name for result in results) == ['a', 'b', 'c']
+    assert all(os.path.exists(path) for result in results for path in result.paths)
@@ -0,0 +1,45 @@
+# coding: utf-8
+import pandas as pd
+
+from countries import CountryIndex
+
+
+def make_index():
+    return CountryIndex({'美国': 'United States', '英国': 'United Kingdom'},
+                        aliases={'美利坚': '美国'})
+
+
+def test_translate_keeps_every_row():
+    frame = pd.DataFrame({'country': ['美国', ' 英 国', '美利坚', '火星']})
+    result, report = make_index().translate(frame)
+    assert result['country'].tolist() == frame['country'].tolist()
+    assert result['英文'].tolist()[:3] == ['United States', 'United Kingdom', 'United States']
+    assert pd.isna(result['英文'].iloc[3])
+    assert report == {'matched': 3, 'fuzzy': 0, 'fuzzy_names': {}, 'unmatched': 1,
+                      'unmatched_names': ['火星']}
+
+
+def test_stats_do_not_accumulate_across_calls():
+    index = make_index()
+    frame = pd.DataFrame({'country': ['美国', '火星', '火星']})
+    _, first = index.translate(frame)
+    _, second = index.translate(frame)
+    assert first == second == {'matched': 1, 'fuzzy': 0, 'fuzzy_names': {}, 'unmatched': 2,
+                               'unmatched_names': ['火星']}
+
+
+def test_short_names_are_not_fuzzy_matched():
+    index = CountryIndex({'刚果（布）': 'Congo', '刚果（金）': 'Dem. Rep. Congo'})
+    result, report = index.translate(pd.DataFrame({'country': ['刚果', '刚果（金）']}))
+    assert pd.isna(result['英文'].iloc[0]) and result['英文'].iloc[1] == 'Dem. Rep. Congo'
+    assert report['fuzzy'] == 0 and report['unmatched_names'] == ['刚果']
+
+
+def test_fuzzy_matches_are_listed():
+    index = CountryIndex({'阿拉伯联合酋长国': 'United Arab Emirates'})
+    frame = pd.DataFrame({'country': ['阿拉伯联合酋长', '阿拉伯联合酋长']})
+    result, report = index.translate(frame)
+    assert result['英文'].tolist() == ['United Arab Emirates'] * 2
+    assert report['fuzzy'] == 2 and report['matched'] == 2
+    assert report['fuzzy_names'] == {'阿拉伯联合酋长': '阿拉伯联合酋长国'}
+
@@ -0,0 +1,68 @@
+# coding: utf-8
+import argparse
+
+import pytest
+import requests
+
+import demo
+import fetch
+from cache import ResponseCache
+from fetch import parse_body
+from history import HistoryEngine
+from store import SnapshotStore
+from tests.stubs import StubServer, wrap_payload
+
+ARGS = argparse.Namespace(feed=[], excel=False)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def cache_feeds(domestic, oversea):
+    cache = ResponseCache(demo.CACHE_DIR)
+    cache.store('disease_h5', wrap_payload(domestic), parse_body)
+    cache.store('disease_foreign', wrap_payload(oversea), parse_body)
+
+
+@pytest.mark.parametrize('foreign_time', [None, '2020-11-25 12:00:00'])
+def test_foreign_only_update_is_stored(workdir, domestic, oversea, foreign_time):
+    if foreign_time is not None:
+        oversea = dict(oversea, lastUpdateTime='2020-11-25 11:00:00')
+    cache_feeds(domestic, oversea)
+    first = demo.build(ARGS)
+
+    oversea = dict(oversea, foreignList=[dict(oversea['foreignList'][0], confirm=6001)]
+                   + oversea['foreignList'][1:])
+    if foreign_time is not None:
+        oversea['lastUpdateTime'] = foreign_time
+    cache_feeds(domestic, oversea)
+    assert demo.build(ARGS) != first
+
+    store = SnapshotStore(demo.STORE_DIR)
+    for kind in ('foreign', 'world'):
+        assert store.read(kind).set_index('country').loc['国家0', 'confirm'] == 6001
+    history = HistoryEngine.load(demo.HISTORY_FILE)
+    assert history.deltas('foreign', '国家0')['confirm'].tolist() == [6001 - 1000]
+    assert demo.build(ARGS) == demo.build(ARGS)
+
+
+def test_failing_extra_feed_is_skipped(workdir, payloads, monkeypatch, capsys):
+    args = argparse.Namespace(feed=['disease_other'], excel=False)
+    with StubServer(payloads) as stub:  # disease_other 返回 404
+        monkeypatch.setattr(fetch, 'BASE_URL', stub.base_url)
+        fingerprint = demo.fetch(args)
+        assert stub.counts['disease_other'] == 1
+    assert '跳过 feed disease_other：HTTPError' in capsys.readouterr().out
+    assert fingerprint and demo.build(args)
+    assert SnapshotStore(demo.STORE_DIR).read('world') is not None
+
+
+def test_failing_required_feed_fails_the_stage(workdir, payloads, monkeypatch):
+    args = argparse.Namespace(feed=[], excel=False)
+    with StubServer(dict(payloads, disease_foreign=None)) as stub:
+        monkeypatch.setattr(fetch, 'BASE_URL', stub.base_url)
+        with pytest.raises(requests.HTTPError):
+            demo.fetch(args)
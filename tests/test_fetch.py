@@ -0,0 +1,96 @@
+# coding: utf-8
+import pytest
+import requests
+
+from tests.stubs import StubServer
+from cache import ResponseCache
+from fetch import fetch_result, fetch_results
+
+FAST = {'backoff': 0}
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as session:
+        yield session
+
+
+def test_fetch_results_parses_every_feed(payloads, domestic, session):
+    with StubServer(payloads) as stub:
+        results = fetch_results(payloads, session=session, base_url=stub.base_url)
+    assert set(results) == set(payloads)
+    assert results['disease_h5'].data == domestic
+    assert all(result.changed for result in results.values())
+
+
+def test_etag_not_modified_reuses_cache(payloads, domestic, session, tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    with StubServer(payloads, etag=True) as stub:
+        first = fetch_result('disease_h5', session, cache, stub.base_url)
+        second = fetch_result('disease_h5', session, cache, stub.base_url)
+    assert first.changed and not second.changed
+    assert second.data == domestic
+    assert cache.meta('disease_h5')['etag']
+    assert cache.stats['not_modified'] == 1 and cache.stats['misses'] == 1
+
+
+def test_same_body_without_etag_is_unchanged(payloads, session, tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    with StubServer(payloads) as stub:
+        fetch_result('disease_h5', session, cache, stub.base_url)
+        result = fetch_result('disease_h5', session, cache, stub.base_url)
+    assert not result.changed
+    assert cache.stats['not_modified'] == 0 and cache.stats['hits'] == 1
+
+
+def test_transient_errors_are_retried(payloads, domestic, session):
+    with StubServer(payloads, failures={'disease_h5': 2}) as stub:
+        result = fetch_result('disease_h5', session, base_url=stub.base_url, retries=2, **FAST)
+        assert stub.counts['disease_h5'] == 3
+    assert result.data == domestic
+
+
+def test_gives_up_after_retries(payloads, session):
+    with StubServer(payloads, failures={'disease_h5': -1}) as stub:
+        with pytest.raises(requests.HTTPError):
+            fetch_result('disease_h5', session, base_url=stub.base_url, retries=2, **FAST)
+        assert stub.counts['disease_h5'] == 3
+
+
+@pytest.mark.parametrize('fetch', ['sync', 'async'])
+def test_client_errors_are_not_retried(payloads, session, fetch):
+    with StubServer(payloads) as stub:
+        with pytest.raises(requests.HTTPError) as error:
+            if fetch == 'sync':
+                fetch_result('disease_other', session, base_url=stub.base_url, retries=3, **FAST)
+            else:
+                fetch_results(['disease_other'], session=session, base_url=stub.base_url,
+                              retries=3, **FAST)
+        assert error.value.response.status_code == 404
+        assert stub.counts['disease_other'] == 1
+
+
+def test_timeout_is_retried(payloads, session):
+    with StubServer(payloads, latency=0.3) as stub:
+        with pytest.raises(requests.Timeout):
+            fetch_result('disease_h5', session, base_url=stub.base_url, timeout=0.05,
+                         retries=1, **FAST)
+        assert stub.counts['disease_h5'] == 2
+
+
+def test_one_failing_feed_does_not_stop_the_others(payloads, session, tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    with StubServer(payloads, failures={'disease_foreign': -1}) as stub:
+        with pytest.raises(requests.HTTPError):
+            fetch_results(payloads, session=session, cache=cache, base_url=stub.base_url,
+                          retries=1, **FAST)
+        assert stub.counts['disease_foreign'] == 2
+    assert cache.meta('disease_h5') is not None
+    assert cache.meta('disease_foreign') is None
+
+
+def test_one_feed_recovers_while_the_other_succeeds(payloads, oversea, session):
+    with StubServer(payloads, failures={'disease_foreign': 1}) as stub:
+        results = fetch_results(payloads, session=session, base_url=stub.base_url, **FAST)
+        assert stub.counts == {'disease_h5': 1, 'disease_foreign': 2}
+    assert results['disease_foreign'].data['foreignList'] == oversea['foreignList']
@@ -0,0 +1,45 @@
+# coding: utf-8
+import pandas as pd
+
+from history import HistoryEngine
+from store import SnapshotStore
+
+T1 = '2020-11-25 10:00:00'
+T2 = '2020-11-26 09:30:00'
+
+
+def provinces(confirm):
+    return pd.DataFrame({'province': ['北京', '广东'], 'confirm': confirm,
+                         'heal': [1, 2], 'dead': [0, 1]})
+
+
+def test_history_deltas_and_rolling(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+    store.write('china', provinces([10, 20]), T1)
+    store.write('china', provinces([15, 20]), T2)
+    engine = HistoryEngine.from_store(store, kinds=('china',))
+    assert engine.regions('china') == ['北京']
+    assert engine.deltas('china', '北京')['confirm'].tolist() == [5]
+    rolling = engine.rolling('china', '北京', 7)
+    assert len(rolling) == 7 and set(rolling['confirm']) == {5}
+
+    delta = engine.ingest('china', provinces([18, 25]), '2020-11-27 08:00:00')
+    assert delta.set_index('province')['confirm'].to_dict() == {'北京': 3, '广东': 5}
+    assert engine.ingest('china', provinces([0, 0]), T1).empty  # 早于已写入的快照
+    assert engine.rolling('china', '北京', 7, start='2020-11-27', end='2020-11-27')[
+        'confirm'].tolist() == [8]
+
+    path = str(tmp_path / 'history.json')
+    engine.save(path)
+    restored = HistoryEngine.load(path)
+    pd.testing.assert_frame_equal(restored.rolling('china', '北京', 14),
+                                  engine.rolling('china', '北京', 14))
+
+
+def test_first_snapshot_is_a_baseline():
+    engine = HistoryEngine()
+    assert engine.ingest('foreign', provinces([10, 20]).rename(columns={'province': 'country'}),
+                         T1).empty
+    delta = engine.ingest('foreign', provinces([10, 26]).rename(columns={'province': 'country'}),
+                          T2)
+    assert delta['country'].tolist() == ['广东'] and delta['confirm'].tolist() == [6]
@@ -0,0 +1,92 @@
+# coding: utf-8
+import pytest
+
+from pipeline import Pipeline, Stage
+
+
+def make_pipeline(tmp_path, calls, data=None, params=None, fail=()):
+    """fetch -> build -> render，每个阶段把自己的名字记入 calls"""
+    data = data if data is not None else {'value': 1}
+    output = tmp_path / 'out.txt'
+
+    def stage(name, fingerprint):
+        def run():
+            calls.append(name)
+            if name in fail:
+                raise RuntimeError(name)
+            if name == 'render':
+                output.write_text('done')
+            return fingerprint()
+        return run
+
+    return Pipeline([
+        Stage('fetch', stage('fetch', lambda: data['value']), volatile=True),
+        Stage('build', stage('build', lambda: data['value'] * 2), deps=('fetch',)),
+        Stage('render', stage('render', lambda: None), deps=('build',),
+              params=params or {}, outputs=[str(output)]),
+    ], state_file=str(tmp_path / 'state.json'))
+
+
+def test_unchanged_inputs_are_skipped(tmp_path):
+    calls = []
+    assert set(make_pipeline(tmp_path, calls).run().values()) == {'ran'}
+    calls.clear()
+    status = make_pipeline(tmp_path, calls).run()
+    assert calls == ['fetch'] and status == {'fetch': 'ran', 'build': 'skipped',
+                                             'render': 'skipped'}
+
+
+def test_changed_fingerprint_reruns_downstream(tmp_path):
+    make_pipeline(tmp_path, []).run()
+    calls = []
+    make_pipeline(tmp_path, calls, data={'value': 2}).run()
+    assert calls == ['fetch', 'build', 'render']
+
+
+def test_changed_params_and_missing_outputs_rerun_the_stage(tmp_path):
+    make_pipeline(tmp_path, []).run()
+    calls = []
+    make_pipeline(tmp_path, calls, params={'bins': 5}).run(['render'])
+    assert calls == ['render']
+    (tmp_path / 'out.txt').unlink()
+    calls.clear()
+    make_pipeline(tmp_path, calls, params={'bins': 5}).run(['render'])
+    assert calls == ['render']
+
+
+def test_volatile_stage_runs_only_when_named(tmp_path):
+    make_pipeline(tmp_path, []).run()
+    calls = []
+    status = make_pipeline(tmp_path, calls, data={'value': 2}).run(['render'])
+    assert calls == [] and status['fetch'] == 'skipped'
+    calls.clear()
+    make_pipeline(tmp_path, calls).run(force=True)
+    assert calls == ['fetch', 'build', 'render']
+
+
+def test_failure_stops_downstream_and_is_retried(tmp_path):
+    calls = []
+    with pytest.raises(RuntimeError):
+        make_pipeline(tmp_path, calls, fail={'build'}).run()
+    assert calls == ['fetch', 'build']
+    calls.clear()
+    status = make_pipeline(tmp_path, calls).run(['render'])
+    assert calls == ['build', 'render'] and status['fetch'] == 'skipped'
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError):
+        Pipeline([Stage('build', lambda: None, deps=('fetch',))], state_file='unused.json')
+
+
+def test_callable_params_are_only_evaluated_when_selected(tmp_path):
+    def params():
+        raise FileNotFoundError('font')
+
+    pipeline = Pipeline([
+        Stage('build', lambda: 1),
+        Stage('wordcloud', lambda: None, deps=('build',), params=params),
+    ], state_file=str(tmp_path / 'state.json'))
+    assert pipeline.run(['build']) == {'build': 'ran'}
+    with pytest.raises(FileNotFoundError):
+        pipeline.run(['wordcloud'])
@@ -0,0 +1,105 @@
+# coding: utf-8
+from datetime import datetime, timedelta
+
+import pytest
+
+import poller
+from poller import EXIT_RSS, AdaptiveInterval, Poller
+
+T0 = datetime(2020, 11, 25, 10, 0, 0)
+
+
+class FakeEvent:
+    """代替 Poller._stop：wait 只记录等待的秒数，不真正休眠"""
+
+    def __init__(self):
+        self.waits = []
+        self._set = False
+
+    def is_set(self):
+        return self._set
+
+    def set(self):
+        self._set = True
+
+    def wait(self, seconds):
+        self.waits.append(seconds)
+        return self._set
+
+
+def after(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+
+def make_poller(cycle, max_rss=None, monkeypatch=None, rss=0):
+    if monkeypatch is not None:
+        monkeypatch.setattr(poller, 'current_rss', lambda: rss)
+    p = Poller(cycle, AdaptiveInterval(minimum=60, maximum=1800), max_rss)
+    p._stop = FakeEvent()
+    p.log = lambda message: None
+    return p
+
+
+def test_interval_is_a_quarter_of_the_average_gap():
+    interval = AdaptiveInterval(minimum=60, maximum=1800, alpha=0.3)
+    assert interval.update(T0) == 60  # 还没有间隔，取下限
+    assert interval.update(after(1000)) == 250
+    # 指数滑动平均：0.3 * 2000 + 0.7 * 1000
+    assert interval.update(after(3000)) == pytest.approx(1300 / 4)
+
+
+def test_interval_backs_off_and_recovers():
+    interval = AdaptiveInterval(minimum=60, maximum=1800)
+    interval.update(T0)
+    interval.update(after(1000))
+    assert interval.update(after(1000)) == pytest.approx(250 * 1.5)  # 没有变化
+    assert interval.failed() == pytest.approx(250 * 1.5 ** 2)
+    assert interval.update(after(2000)) == pytest.approx(0.3 * 1000 / 4 + 0.7 * 250)
+
+
+def test_interval_is_clamped():
+    short = AdaptiveInterval(minimum=60, maximum=1800)
+    short.update(T0)
+    assert short.update(after(40)) == 60
+    long = AdaptiveInterval(minimum=60, maximum=1800)
+    long.update(T0)
+    long.update(after(100000))
+    assert long.current == 1800
+    for _ in range(20):
+        assert long.failed() == 1800
+
+
+def test_stop_ends_the_loop(monkeypatch):
+    times = iter([T0, after(1000), after(2000)])
+
+    def cycle():
+        if p.cycles == 3:
+            p.stop()
+        return next(times).strftime(poller.TIME_FORMAT)
+
+    p = make_poller(cycle, monkeypatch=monkeypatch)
+    assert p.run() == 0
+    # 停止后的最后一次等待立即返回
+    assert p.cycles == 3 and p._stop.waits == [60, 250, 250]
+
+
+def test_failures_keep_polling(monkeypatch):
+    def cycle():
+        if p.cycles == 1:
+            raise RuntimeError('network')
+        if p.cycles == 3:
+            p.stop()
+        return T0
+
+    p = make_poller(cycle, monkeypatch=monkeypatch)
+    assert p.run() == 0
+    assert p.cycles == 3
+    # 出错与没有变化都按倍数退避
+    assert p._stop.waits == [60 * 1.5, 60, 60 * 1.5]
+
+
+def test_max_rss_exits_with_its_code(monkeypatch):
+    p = make_poller(lambda: T0, max_rss=100 * 2 ** 20, monkeypatch=monkeypatch,
+                    rss=200 * 2 ** 20)
+    assert p.run() == EXIT_RSS
+    assert p.cycles == 1 and p._stop.waits == []
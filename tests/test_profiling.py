@@ -0,0 +1,92 @@
+# coding: utf-8
+import os
+import json
+import pstats
+
+import pytest
+
+import profiling
+
+
+def test_gauges_are_written_with_stage_metrics(tmp_path):
+    profiler = profiling.Profiler()
+    with profiler.stage('enrich'):
+        profiler.gauge('country_names', 5, result='unmatched')
+    profiler.gauge('country_names', 2, result='unmatched')
+    text = profiler.metrics_text()
+    assert '# TYPE covid_country_names gauge' in text
+    assert 'covid_country_names{result="unmatched"} 2' in text
+    assert 'covid_stage_seconds{stage="enrich"}' in text
+
+    path = profiler.write_metrics(str(tmp_path / 'metrics.json'))
+    with open(path, encoding='utf-8') as f:
+        gauges = json.load(f)['gauges']
+    assert gauges == {'country_names': [{'result': 'unmatched', 'value': 2}]}
+
+
+def test_disabled_profiler_ignores_gauges():
+    profiler = profiling.Profiler(enabled=False)
+    profiler.gauge('country_names', 1, result='matched')
+    assert profiler.gauges == {}
+
+
+def test_process_peak_rss_is_written_once(tmp_path):
+    profiler = profiling.Profiler()
+    for name in ('build', 'render'):
+        with profiler.stage(name):
+            pass
+    assert all('peak_rss_bytes' not in entry for entry in profiler.stats.values())
+    if profiling.current_rss() is not None:
+        assert all(isinstance(entry['rss_delta_bytes'], int)
+                   for entry in profiler.stats.values())
+    text = profiler.metrics_text()
+    peaks = [line for line in text.splitlines() if line.startswith('covid_process_peak')]
+    assert len(peaks) == (profiling.peak_rss() is not None)
+
+    path = profiler.write_metrics(str(tmp_path / 'metrics.json'))
+    with open(path, encoding='utf-8') as f:
+        assert 'process_peak_rss_bytes' in json.load(f)
+
+
+def test_nested_stages_are_recorded_under_their_own_labels():
+    profiler = profiling.Profiler()
+    with profiler.stage('build'):
+        with profiler.stage('build.excel'):
+            assert profiler._local.depth == 2
+        with profiler.stage('build.excel'):
+            pass
+    assert profiler._local.depth == 0
+    assert profiler.stats['build.excel']['runs'] == 2 and profiler.stats['build']['runs'] == 1
+    text = profiler.metrics_text()
+    assert 'covid_stage_runs_total{stage="build.excel"} 2' in text
+    assert 'covid_stage_seconds{stage="build"}' in text
+
+
+def test_cprofile_dumps_only_outer_stages(tmp_path):
+    profiler = profiling.Profiler(mode='cprofile', out_dir=str(tmp_path))
+    with profiler.stage('build'):
+        with profiler.stage('build.excel'):
+            sum(range(1000))
+    assert os.listdir(str(tmp_path)) == ['build.prof']
+    assert pstats.Stats(str(tmp_path / 'build.prof')).total_calls > 0
+
+
+def test_tracemalloc_records_the_traced_peak(tmp_path):
+    import tracemalloc
+
+    profiler = profiling.Profiler(mode='tracemalloc', out_dir=str(tmp_path))
+    try:
+        with profiler.stage('enrich'):
+            data = bytearray(2 ** 20)
+        del data
+    finally:
+        tracemalloc.stop()
+    assert profiler.stats['enrich']['traced_peak_bytes'] >= 2 ** 20
+    lines = (tmp_path / 'enrich.tracemalloc.txt').read_text(encoding='utf-8').splitlines()
+    assert 0 < len(lines) <= profiling.TOP_LINES
+    assert 'covid_stage_traced_peak_bytes{stage="enrich"}' in profiler.metrics_text()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        profiling.Profiler(mode='perf')
@@ -0,0 +1,51 @@
+# coding: utf-8
+import numpy as np
+import pandas as pd
+import pytest
+
+from query import Query
+
+
+@pytest.fixture
+def query():
+    return Query(pd.DataFrame({
+        'country': ['甲', '乙', '丙', '丁', '戊'],
+        '英文': ['A', None, 'C', 'D', None],
+        'continent': ['亚洲', '欧洲', '亚洲', '非洲', '欧洲'],
+        'confirm': [50, 90, 50, 10, 70],
+        'deadRate': [0.02, np.nan, 0.05, 0.01, 0.03],
+    }))
+
+
+def test_sort_is_stable_with_nan_last(query):
+    assert query.sort('confirm', ascending=False)['country'].tolist() == [
+        '乙', '戊', '甲', '丙', '丁']
+    assert query.sort('deadRate')['country'].tolist() == ['丁', '甲', '戊', '丙', '乙']
+    assert query.sort('deadRate', ascending=False)['country'].tolist()[-1] == '乙'
+
+
+def test_where_combines_masks_and_keeps_order(query):
+    view = query.where(query['confirm'] >= 50, query['continent'] != '欧洲')
+    assert view['country'].tolist() == ['甲', '丙']
+    assert view.sort('deadRate', ascending=False)['country'].tolist() == ['丙', '甲']
+    assert view.where() is view
+
+
+def test_top_and_head(query):
+    top = query.top('confirm', 3)
+    assert top['country'].tolist() == ['乙', '戊', '甲']
+    assert top.head(1)['confirm'].tolist() == [90]
+    assert len(query.top('confirm', 10)) == len(query)
+
+
+def test_labels_pairs_and_frequencies(query):
+    top = query.top('confirm', 3)
+    assert top.labels('英文', fallback='country') == ['乙', '戊', 'A']
+    assert top.pairs('country', 'deadRate', '.2f')[1] == ('戊', '0.03')
+    assert dict(top.frequencies('country', 'confirm').items()) == {'乙': 90, '戊': 70, '甲': 50}
+
+
+def test_groups_in_first_seen_order(query):
+    groups = [(name, view['country'].tolist()) for name, view in
+              query.sort('confirm').groups('continent')]
+    assert groups == [('非洲', ['丁']), ('亚洲', ['甲', '丙']), ('欧洲', ['戊', '乙'])]
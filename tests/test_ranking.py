@@ -0,0 +1,82 @@
+# coding: utf-8
+import numpy as np
+import pandas as pd
+import pytest
+
+from query import Query
+from ranking import RankingIndex
+
+
+def cities():
+    return pd.DataFrame({
+        'province': ['上海', '上海', '广东', '广东', '四川', '四川'],
+        'city': ['境外输入', '浦东', '境外输入', '广州', '地区待确认', '境外输入'],
+        'confirm': [30, 10, 30, 50, 0, 20],
+        'nowConfirm': [3, 1, 3, 5, 0, 2],
+    })
+
+
+def reference(frame, column, ascending=False):
+    """不借助索引的排序：数值相同按行号，NaN 在最后"""
+    return Query(frame).order(column, ascending).tolist()
+
+
+@pytest.mark.parametrize('key', ['city', ('province', 'city')])
+def test_duplicate_city_names_each_get_a_row(key):
+    frame = cities()
+    ranking = RankingIndex()
+    ranking.update(frame, key)
+    query = Query(frame, ranking)
+    assert len(ranking) == len(frame)
+    assert query.sort('confirm')['city'].tolist() == [
+        '地区待确认', '浦东', '境外输入', '境外输入', '境外输入', '广州']
+    assert query.top('confirm', 3)['province'].tolist() == ['广东', '上海', '广东']
+    assert len(query.top('confirm', 10)) == len(frame)
+    for column in ('confirm', 'nowConfirm'):
+        for ascending in (True, False):
+            assert ranking.top_rows(column, ascending=ascending).tolist() == reference(
+                frame, column, ascending)
+
+
+def test_ties_follow_row_order_after_reordering():
+    ranking = RankingIndex()
+    frame = cities()
+    ranking.update(frame, ('province', 'city'))
+    ranking.top('confirm')
+    reordered = frame.iloc[::-1].reset_index(drop=True)
+    ranking.update(reordered, ('province', 'city'))
+    assert ranking.top_rows('confirm').tolist() == reference(reordered, 'confirm')
+
+
+def test_incremental_updates_match_a_fresh_sort():
+    rng = np.random.default_rng(0)
+    names = ['地区{}'.format(i) for i in range(200)]
+    ranking = RankingIndex(rebuild_fraction=0.5)
+    frame = pd.DataFrame({'country': names, 'confirm': rng.integers(0, 50, len(names)),
+                          'deadRate': rng.random(len(names))})
+    for step in range(20):
+        ranking.update(frame, 'country')
+        for column in ('confirm', 'deadRate'):
+            for ascending in (True, False):
+                assert ranking.top_rows(column, ascending=ascending).tolist() == reference(
+                    frame, column, ascending), (step, column, ascending)
+        frame = frame.copy()
+        changed = rng.choice(len(frame), 10, replace=False)
+        frame.loc[changed, 'confirm'] = rng.integers(0, 50, len(changed))
+        frame.loc[changed[:3], 'deadRate'] = np.nan
+        if step % 4 == 3:  # 增减地区
+            frame = pd.concat([frame.iloc[5:], pd.DataFrame({
+                'country': ['新{}'.format(step)], 'confirm': [25], 'deadRate': [0.5]})],
+                ignore_index=True)
+    assert ranking.stats['rebuilds'] < ranking.stats['updates']
+
+
+def test_rank():
+    ranking = RankingIndex()
+    ranking.update(cities(), ('province', 'city'))
+    assert ranking.rank('confirm', ('广东', '广州')) == 0
+    assert ranking.rank('confirm', ('广东', '境外输入')) == 2
+    assert ranking.rank('confirm', ('四川', '地区待确认'), ascending=True) == 0
+    ranking.update(cities().iloc[:4], ('province', 'city'))
+    with pytest.raises(KeyError):
+        ranking.rank('confirm', ('四川', '境外输入'))
@@ -0,0 +1,29 @@
+# coding: utf-8
+import numpy as np
+import pandas as pd
+
+from rates import RATES, rate_metrics, safe_divide
+
+
+def test_zero_denominator_gives_zero():
+    np.testing.assert_array_equal(safe_divide([1, 0, 3], [2, 0, 0]), [0.5, 0.0, 0.0])
+
+
+def test_nan_inputs_stay_nan():
+    out = safe_divide([np.nan, 1.0, 2.0], [4.0, np.nan, 0.0])
+    assert np.isnan(out[0]) and np.isnan(out[1]) and out[2] == 0.0
+
+
+def test_scalar_broadcast():
+    np.testing.assert_array_equal(safe_divide([2, 4], 4), [0.5, 1.0])
+
+
+def test_rate_columns_and_dtypes():
+    frame = pd.DataFrame({'country': ['甲', '乙'], 'confirm': [200, 0], 'heal': [100, 0],
+                          'dead': [10, 0], 'nowConfirm': [90, 0]})
+    out = rate_metrics(frame)
+    assert out.columns.tolist() == frame.columns.tolist() + list(RATES)
+    assert (out[list(RATES)].dtypes == np.float64).all()
+    assert out.loc[0, ['deadRate', 'healRate', 'activeRate']].tolist() == [0.05, 0.5, 0.45]
+    assert out.loc[1, list(RATES)].tolist() == [0.0, 0.0, 0.0]
+    assert 'deadRate' not in frame.columns  # 不修改原表
@@ -0,0 +1,39 @@
+# coding: utf-8
+import pandas as pd
+
+from extract import extract_domestic
+from regions import RegionIndex
+
+
+def test_frames_match_the_extractors(domestic):
+    tree = domestic['areaTree']
+    index = RegionIndex(tree)
+    provinces, cities = extract_domestic(tree[0]['children'])
+    pd.testing.assert_frame_equal(index.frame('province'), provinces.to_frame('province'))
+    pd.testing.assert_frame_equal(index.expand_all().frame('city'),
+                                  cities.to_frame('city', 'province'))
+
+
+def test_cities_expand_lazily(domestic):
+    index = RegionIndex(domestic['areaTree'])
+    assert len(index) == 1 + 4
+    node = index.find('省份2', '城市2_1')
+    assert len(index) == 1 + 4 + 3
+    assert index.path(node) == ('中国', '省份2', '城市2_1')
+    assert index.name(index.rollup(node, 'province')) == '省份2'
+
+
+def test_stats_of_one_province(domestic):
+    index = RegionIndex(domestic['areaTree'])
+    stats = index.stats('city', parent='省份1')
+    assert stats.names() == ['城市1_0', '城市1_1', '城市1_2']
+    assert stats.groups() == ['省份1'] * 3
+    province = index.totals(index.find('省份1'))
+    assert int(stats.column('confirm').sum()) == province['confirm']
+
+
+def test_negative_node(domestic):
+    index = RegionIndex(domestic['areaTree'])
+    assert index[-1].names() == [index.name(len(index) - 1)]
+    assert index[0].names() == ['中国']
+    assert len(index[:]) == len(index) and index[-2:].names()[-1] == index[-1].names()[0]
@@ -0,0 +1,65 @@
+# coding: utf-8
+import numpy as np
+
+from extract import extract_domestic, extract_world
+import regionstats
+from regionstats import FIELDS, RegionStats
+
+
+def test_from_records_keeps_every_field(oversea):
+    stats = RegionStats.from_records(oversea['foreignList'], group='continent')
+    frame = stats.to_frame('country', 'continent')
+    assert frame.columns.tolist() == ['continent', 'country'] + list(FIELDS)
+    keys = [('continent', 'continent'), ('country', 'name')] + list(zip(FIELDS, FIELDS))
+    for column, key in keys:
+        assert frame[column].tolist() == [c[key] for c in oversea['foreignList']]
+
+
+def test_now_confirm_is_derived_when_missing():
+    records = [{'name': 'A', 'confirm': 10, 'heal': 3, 'dead': 1}]
+    stats = RegionStats.from_records(records)
+    assert stats.column('nowConfirm').tolist() == [6]
+
+
+def test_domestic_now_confirm_is_derived(domestic):
+    provinces, cities = extract_domestic(domestic['areaTree'][0]['children'])
+    for stats in (provinces, cities):
+        assert (stats.column('nowConfirm') == stats.column('confirm') - stats.column('heal')
+                - stats.column('dead')).all()
+    assert cities.groups()[:3] == ['省份0'] * 3 and provinces.table is cities.table
+
+
+def test_slices_and_frames_share_counts(oversea, domestic):
+    world = extract_world(oversea['foreignList'], domestic['areaTree'])
+    foreign = world[:-1]
+    assert len(foreign) == len(world) - 1 and world.names()[-1] == '中国'
+    assert np.shares_memory(foreign.counts, world.counts)
+    frame = world.to_frame('country')
+    assert np.shares_memory(frame['confirm'].to_numpy(), world.counts)
+    assert world.find('中国') == len(world) - 1 and world.find('火星') == -1
+
+
+def test_integer_keys_select_one_row(oversea):
+    stats = RegionStats.from_records(oversea['foreignList'][:3])
+    assert stats[-1].names() == ['国家2'] and stats[0].names() == ['国家0']
+
+
+def test_name_tables_are_not_shared():
+    a = RegionStats.from_records([{'name': 'A', 'confirm': 1, 'heal': 0, 'dead': 0}])
+    b = RegionStats.from_records([{'name': 'B', 'confirm': 1, 'heal': 0, 'dead': 0}])
+    assert a.table is not b.table and len(a.table) == len(b.table) == 1
+
+
+def test_from_records_consumes_a_stream(monkeypatch):
+    monkeypatch.setattr(regionstats, 'CHUNK', 1)  # 每条记录一批
+
+    def records():
+        yield {'name': 'A', 'continent': '亚洲', 'nowConfirm': 2, 'confirm': 10, 'heal': 3,
+               'dead': 1}
+        yield {'name': 'B', 'continent': '欧洲', 'confirm': 10, 'heal': 3, 'dead': 1}
+
+    stats = RegionStats.from_records(records(), group='continent')
+    assert stats.names() == ['A', 'B']
+    assert stats.column('nowConfirm').tolist() == [2, 6]
+    assert stats.to_frame('country', 'continent')['continent'].tolist() == ['亚洲', '欧洲']
+    assert len(RegionStats.from_records(iter([]))) == 0
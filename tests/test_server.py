@@ -0,0 +1,126 @@
+# coding: utf-8
+import json
+import socket
+import asyncio
+import threading
+import http.client
+
+import pandas as pd
+import pytest
+
+from query import Query
+from server import ApiServer, Dataset
+from store import SnapshotStore
+
+T = '2020-11-25 10:00:00'
+
+
+@pytest.fixture
+def server(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+    store.write('china_enriched', pd.DataFrame({
+        'province': ['北京', '广东', '湖北'], 'nowConfirm': [5, 30, 0],
+        'deadRate': [0.01, 0.002, 0.06]}), T)
+    store.write('world_enriched', pd.DataFrame({
+        'country': ['中国', '美国'], 'nowConfirm': [35, 900], 'deadRate': [0.05, float('nan')]}),
+        T)
+    chart = tmp_path / 'world.html'
+    chart.write_text('<html></html>', encoding='utf-8')
+
+    api = ApiServer(store.root, [str(chart)], port=0, reload_seconds=0)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    async def run():
+        await api.start()
+        started.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(run()),
+                                              loop.run_forever()), daemon=True)
+    thread.start()
+    assert started.wait(10)
+    yield api
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+def request(server, method, path, body=None, headers=None, connection=None):
+    connection = connection or http.client.HTTPConnection(server.host, server.port, timeout=5)
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    return response, response.read()
+
+
+def test_init_has_no_reloader():
+    assert ApiServer(port=0)._reloader is None
+
+
+def test_top_and_filter(server):
+    response, body = request(server, 'GET', '/api/china/top?metric=nowConfirm&n=2')
+    assert response.status == 200
+    assert [row['province'] for row in json.loads(body)] == ['广东', '北京']
+    _, body = request(server, 'GET', '/api/china/filter?metric=deadRate&min=0.005')
+    assert [row['province'] for row in json.loads(body)] == ['北京', '湖北']
+    _, body = request(server, 'GET', '/api/world/region/%E7%BE%8E%E5%9B%BD')
+    assert json.loads(body) == {'country': '美国', 'nowConfirm': 900, 'deadRate': None}
+
+
+def test_dataset_ranks_like_the_charts():
+    frame = pd.DataFrame({'country': ['甲', '乙', '丙', '丁'], 'deadRate': [0.02, None, 0.05, 0.02],
+                          'confirm': [3, 1, 3, 2]})
+    dataset = Dataset(frame, 'country')
+    for metric in ('deadRate', 'confirm'):
+        expected = Query(frame).top(metric, 4).labels('country')
+        assert [row['country'] for row in dataset.top(metric, 4)] == expected
+    assert [row['country'] for row in dataset.top('deadRate', 4)] == ['丙', '甲', '丁', '乙']
+    assert [row['country'] for row in dataset.filter('deadRate')] == ['甲', '丁', '丙']
+
+
+def test_errors(server):
+    assert request(server, 'GET', '/api/china/top?metric=nope')[0].status == 400
+    assert request(server, 'GET', '/api/china/top?n=x')[0].status == 400
+    assert request(server, 'GET', '/api/mars/top')[0].status == 404
+    response, body = request(server, 'GET', '/api/china/region/%E7%81%AB%E6%98%9F')
+    assert response.status == 404 and 'error' in json.loads(body)
+
+
+def test_etag_and_head(server):
+    response, body = request(server, 'GET', '/charts/world.html')
+    assert response.status == 200 and body == b'<html></html>'
+    etag = response.getheader('ETag')
+    response, body = request(server, 'GET', '/charts/world.html', headers={'If-None-Match': etag})
+    assert response.status == 304 and body == b''
+    response, body = request(server, 'HEAD', '/charts/world.html')
+    assert response.status == 200 and body == b''
+    assert response.getheader('Content-Length') == str(len('<html></html>'))
+
+
+def test_post_gets_a_complete_405(server):
+    response, body = request(server, 'POST', '/api/china/top', body=b'{"n": 1}',
+                             headers={'Content-Type': 'application/json'})
+    assert response.status == 405
+    assert response.getheader('Allow') == 'GET, HEAD'
+    assert len(body) == int(response.getheader('Content-Length')) > 0
+    assert response.getheader('Connection') == 'close'
+
+
+def test_get_body_is_drained_on_keep_alive(server):
+    connection = http.client.HTTPConnection(server.host, server.port, timeout=5)
+    response, _ = request(server, 'GET', '/healthz', body=b'ignored',
+                          connection=connection)
+    assert response.status == 200
+    response, body = request(server, 'GET', '/healthz', connection=connection)
+    assert response.status == 200 and body == b'ok'
+
+
+def test_pipelined_requests_on_one_socket(server):
+    with socket.create_connection((server.host, server.port), timeout=5) as sock:
+        sock.sendall(b'GET /healthz HTTP/1.1\r\nHost: x\r\n\r\n'
+                     b'GET /healthz HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+        data = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    assert data.count(b'HTTP/1.1 200 OK') == 2
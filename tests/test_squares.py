@@ -0,0 +1,49 @@
+# coding: utf-8
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('matplotlib')
+
+from squares import render_squares  # noqa: E402
+
+CONFIRM = np.array([0x29, 0x64, 0x8c]) / 255
+
+
+def confirm_pixels(path):
+    """第二行左右两格中累计确诊颜色的像素数（图例在第一行右上角）"""
+    import matplotlib.image
+
+    image = matplotlib.image.imread(path)[..., :3]
+    mask = (np.abs(image - CONFIRM) < 0.02).all(axis=-1)
+    mask = mask[mask.shape[0] // 2:]
+    half = mask.shape[1] // 2
+    return mask[:, :half].sum(), mask[:, half:].sum()
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'country': ['A', 'B', 'C', 'D'], 'confirm': [10000, 8000, 5000, 100],
+                         'heal': 0, 'dead': 0})
+
+
+def test_shared_scale_shrinks_smaller_regions(frame, tmp_path):
+    path = str(tmp_path / 'shared.png')
+    render_squares(frame, path, 'country', cols=2, cell_inches=1.5)
+    big, small = confirm_pixels(path)
+    assert small < big / 100
+
+
+def test_row_scale_fills_every_cell(frame, tmp_path):
+    path = str(tmp_path / 'row.png')
+    render_squares(frame, path, 'country', cols=2, scale='row', cell_inches=1.5)
+    big, small = confirm_pixels(path)
+    assert big > 0 and abs(big - small) <= big * 0.05
+
+
+def test_array_scale_and_labels(frame, tmp_path):
+    path = str(tmp_path / 'array.svg')
+    render_squares(frame, path, 'country', cols=2, scale=[10000, 10000, 5000, 200],
+                   labels=['甲', '乙', '丙', '丁'])
+    with open(path, encoding='utf-8') as f:
+        assert '<svg' in f.read(200)
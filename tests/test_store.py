@@ -0,0 +1,59 @@
+# coding: utf-8
+import os
+
+import pandas as pd
+import pytest
+
+from store import SnapshotStore
+
+T1 = '2020-11-25 10:00:00'
+T2 = '2020-11-26 09:30:00'
+
+
+def provinces(confirm):
+    return pd.DataFrame({'province': ['北京', '广东'], 'confirm': confirm,
+                         'heal': [1, 2], 'dead': [0, 1]})
+
+
+@pytest.fixture(params=['feather', 'parquet'])
+def store(request, tmp_path):
+    return SnapshotStore(str(tmp_path), request.param)
+
+
+def test_write_is_partitioned_by_date(store):
+    path = store.write('china', provinces([10, 20]), T1)
+    assert os.path.relpath(path, store.root) == os.path.join(
+        'china', 'date=2020-11-25', '20201125T100000.' + store.fmt)
+    pd.testing.assert_frame_equal(store.read('china'), provinces([10, 20]))
+
+
+def test_same_content_is_not_rewritten(store):
+    path = store.write('china', provinces([10, 20]), T1)
+    mtime = os.stat(path).st_mtime_ns
+    store.write('china', provinces([10, 20]), T1)
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_revised_content_at_the_same_time_is_replaced(store):
+    store.write('china', provinces([10, 20]), T1)
+    store.write('china', provinces([11, 21]), T1)
+    assert store.read('china')['confirm'].tolist() == [11, 21]
+
+
+def test_snapshot_with_old_columns_is_replaced(store):
+    old = provinces([10, 20]).drop(columns='dead')
+    store.write('world_enriched', old, T1)
+    store.write('world_enriched', provinces([10, 20]).assign(continent='亚洲'), T1)
+    frame = store.read('world_enriched')
+    assert 'continent' in frame.columns and 'dead' in frame.columns
+
+
+def test_read_range(store):
+    store.write('china', provinces([10, 20]), T1)
+    store.write('china', provinces([15, 20]), T2)
+    assert [stamp.day for stamp, _ in store.snapshots('china')] == [25, 26]
+    frame = store.read_range('china', start=T2)
+    assert frame['confirm'].tolist() == [15, 20]
+    assert store.read('china', columns=['confirm'], last_update_time=T1).columns.tolist() == [
+        'confirm']
+
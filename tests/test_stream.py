@@ -0,0 +1,63 @@
+# coding: utf-8
+import gzip
+import json
+
+import pandas as pd
+import pytest
+
+from extract import extract_countries, extract_domestic
+from stream import (CHINA_TOTAL, LAST_UPDATE_TIME, iter_feed_records, iter_file_chunks,
+                    iter_payload_records)
+from tests.stubs import wrap_payload
+
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 4096])
+def test_chunked_records_match_full_parse(domestic, oversea, size):
+    oversea['foreignList'][0]['name'] = '国家"\\😀'  # 转义与代理对会被切在块边界上
+    provinces = list(iter_payload_records(chunked(wrap_payload(domestic), size), 'disease_h5'))
+    countries = list(iter_payload_records(chunked(wrap_payload(oversea), size),
+                                          'disease_foreign'))
+    assert provinces == domestic['areaTree'][0]['children']
+    assert countries == oversea['foreignList']
+
+
+def test_captured_members(domestic):
+    captured = dict.fromkeys([LAST_UPDATE_TIME, CHINA_TOTAL])
+    records = iter_payload_records(chunked(wrap_payload(domestic), 5), 'disease_h5', captured)
+    assert len(list(records)) == 4
+    assert captured[LAST_UPDATE_TIME] == domestic['lastUpdateTime']
+    assert captured[CHINA_TOTAL] == domestic['areaTree'][0]['total']
+
+
+def test_truncated_body_raises(domestic):
+    body = wrap_payload(domestic)
+    with pytest.raises(ValueError):
+        list(iter_payload_records(chunked(body[:len(body) // 2], 64), 'disease_h5'))
+
+
+def test_feed_records_from_decoded_and_gzipped_files(domestic, oversea, tmp_path):
+    decoded = tmp_path / 'disease_h5.json'
+    decoded.write_text(json.dumps(domestic, ensure_ascii=False), encoding='utf-8')
+    wrapped = tmp_path / 'foreign.json.gz'
+    with gzip.open(str(wrapped), 'wb') as f:
+        f.write(wrap_payload(oversea))
+    feeds = {name for name, _ in iter_feed_records(iter_file_chunks(str(decoded), 100))}
+    assert feeds == {'disease_h5'}
+    records = [r for _, r in iter_feed_records(iter_file_chunks(str(wrapped), 100))]
+    assert records == oversea['foreignList']
+
+
+def test_streamed_records_extract_like_full_parse(domestic, oversea):
+    body = chunked(wrap_payload(domestic), 64)
+    streamed = extract_domestic(iter_payload_records(body, 'disease_h5'))
+    full = extract_domestic(domestic['areaTree'][0]['children'])
+    for level, (a, b) in zip([('province',), ('city', 'province')], zip(streamed, full)):
+        pd.testing.assert_frame_equal(a.to_frame(*level), b.to_frame(*level))
+    countries = iter_payload_records(chunked(wrap_payload(oversea), 64), 'disease_foreign')
+    pd.testing.assert_frame_equal(
+        extract_countries(countries).to_frame('country', 'continent'),
+        extract_countries(oversea['foreignList']).to_frame('country', 'continent'))